@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資源清單 - 記錄每個發布檔案（EPUB、最佳化 EPUB、直書 EPUB、封裝清單、字型子集、封面與縮圖）的 SHA-256 與大小
+
+APP 將 catalog/assets.json 與本機已下載的檔案比對，只下載雜湊不同的檔案。
+啟用指紋命名時另外輸出以內容雜湊命名的副本（例如 covers/<書籍ID>.<雜湊前 8 碼>.jpg），
+內容改變時網址也會改變，可以設定為永久快取。
+"""
+
+import json
+import os
+import posixpath
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from atomic_io import atomic_output, atomic_write_json
+from build_cache import file_fingerprint, fingerprint_matches
+
+# assets.json 格式改變時遞增
+ASSET_MANIFEST_VERSION = 1
+
+# 指紋檔名中使用的雜湊長度
+FINGERPRINT_LENGTH = 8
+
+FINGERPRINTED_NAME_PATTERN = re.compile(r'^.+\.[0-9a-f]{%d}\.[^.]+$' % FINGERPRINT_LENGTH)
+
+# 各類資源在書籍資料中的 (網址, SHA-256, 大小) 欄位
+ASSET_FIELDS = {
+    "epub": ("epubUrl", "epubSha256", "epubBytes"),
+    "optimized": ("optimizedEpubUrl", "optimizedSha256", "optimizedBytes"),
+    "vertical": ("verticalEpubUrl", "verticalSha256", "verticalBytes"),
+    "package": ("packageUrl", "packageSha256", "packageBytes"),
+    "font": ("fontUrl", "fontSha256", "fontBytes"),
+    "cover": ("coverUrl", "coverSha256", "coverBytes"),
+    "thumbnail": ("url", "sha256", "bytes"),
+}
+
+
+def fingerprinted_name(name: str, sha256: str) -> str:
+    """在副檔名前加上內容雜湊：abc.jpg → abc.1a2b3c4d.jpg"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{sha256[:FINGERPRINT_LENGTH]}{ext}"
+
+
+class AssetHasher:
+    def __init__(self, state_file: Path, load: bool = True):
+        """
+        計算檔案的 SHA-256，大小與修改時間未變的檔案沿用上次的結果
+
+        Args:
+            state_file: 記錄各檔案指紋的狀態檔（例如 catalog/.build-cache/assets.json）
+            load: 是否讀取既有的狀態檔
+        """
+        self.state_file = Path(state_file)
+        self.files: Dict[str, Dict] = {}
+        self.hashed = 0
+        self._lock = threading.Lock()
+        if load:
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('version') == ASSET_MANIFEST_VERSION:
+                    self.files = state.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    def hash(self, path: Path) -> Dict:
+        """回傳 {"sha256", "bytes"}"""
+        key = str(path)
+        fingerprint = self.files.get(key)
+        if fingerprint is None or not fingerprint_matches(path, fingerprint):
+            fingerprint = file_fingerprint(path)
+            with self._lock:
+                self.files[key] = fingerprint
+                self.hashed += 1
+        return {"sha256": fingerprint['sha256'], "bytes": fingerprint['size']}
+
+    def save(self, used: Iterable[Path]) -> None:
+        """儲存狀態檔，只保留本次用到的檔案"""
+        used_keys = {str(path) for path in used}
+        self.files = {key: value for key, value in self.files.items() if key in used_keys}
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.state_file, {"version": ASSET_MANIFEST_VERSION, "files": self.files},
+                          compact=True)
+
+
+def publish_fingerprinted(source: Path, target: Path) -> None:
+    """複製為指紋檔名（檔名已包含內容雜湊，目標已存在時直接沿用）"""
+    if target.exists() and target.stat().st_size == source.stat().st_size:
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(source, 'rb') as src, atomic_output(target) as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def prune_fingerprinted(directories: Iterable[Path], keep: Set[str]) -> int:
+    """
+    刪除目錄中不再被引用的指紋副本，回傳刪除數量
+
+    keep 為要保留的檔名，應包含目前與上一版清單引用的檔案（以及原始檔案），
+    仍在使用上一版目錄的 APP 不會立即找不到檔案。
+    """
+    removed = 0
+    for directory in set(directories):
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            if (path.is_file() and FINGERPRINTED_NAME_PATTERN.match(path.name)
+                    and path.name not in keep):
+                path.unlink()
+                removed += 1
+    return removed
+
+
+def load_asset_manifest(manifest_file: Path) -> Dict:
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == ASSET_MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": ASSET_MANIFEST_VERSION, "assets": {}}
+
+
+def build_asset_manifest(entries: Dict[str, Dict], fingerprinted: bool) -> Dict:
+    """
+    Args:
+        entries: {原始網址: {"url", "kind", "book", "sha256", "bytes"}}
+
+    Returns:
+        assets.json 的內容（依原始網址排序）
+    """
+    return {
+        "version": ASSET_MANIFEST_VERSION,
+        "fingerprinted": fingerprinted,
+        "total_assets": len(entries),
+        "total_bytes": sum(entry['bytes'] for entry in entries.values()),
+        "assets": dict(sorted(entries.items())),
+    }
+
+
+def published_record(book_info: Dict) -> Dict:
+    """
+    複製書籍資料（含縮圖資訊）供發布使用
+
+    發布階段寫入的欄位與指紋網址只會出現在副本上，
+    建置快取與監看模式保留的書籍資料維持來源網址，重複發布時不會再次加上指紋。
+    """
+    record = dict(book_info)
+    if 'coverThumbnails' in record:
+        record['coverThumbnails'] = [dict(thumbnail) for thumbnail in record['coverThumbnails']]
+    return record
+
+
+def apply_asset(record: Dict, kind: str, entry: Dict) -> None:
+    """將雜湊、大小與（指紋）網址寫回書籍資料或縮圖資訊"""
+    url_field, sha_field, bytes_field = ASSET_FIELDS[kind]
+    record[url_field] = entry['url']
+    record[sha_field] = entry['sha256']
+    record[bytes_field] = entry['bytes']
+
+
+def published_url(url: str, sha256: str, url_dir: Optional[str] = None) -> str:
+    """指紋副本的網址（url_dir 為副本所在目錄的網址，None 表示與原始檔案相同）"""
+    directory = posixpath.dirname(url) if url_dir is None else url_dir
+    return posixpath.join(directory, fingerprinted_name(posixpath.basename(url), sha256))
+
+
+def changed_assets(old_manifest: Dict, new_manifest: Dict) -> List[str]:
+    """與上一版清單相比內容有變動（或新增）的原始網址"""
+    old_assets = old_manifest.get('assets', {})
+    return [url for url, entry in new_manifest['assets'].items()
+            if old_assets.get(url, {}).get('sha256') != entry['sha256']]
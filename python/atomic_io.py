@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原子寫入 - 先寫入同目錄下的暫存檔，完成後再以 rename 取代目標檔案
+
+讀取端（APP、網頁伺服器）只會看到完整的舊檔案或完整的新檔案，
+寫到一半中斷時也不會留下截斷的輸出。
+"""
+
+import contextlib
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+def temp_path(path: Path) -> Path:
+    """目標檔案對應的暫存檔路徑（同目錄、隱藏檔、含行程 ID 避免並行衝突）"""
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+@contextlib.contextmanager
+def atomic_output(path: Path) -> Iterator[BinaryIO]:
+    """
+    以二進位模式開啟暫存檔供寫入，區塊正常結束時才取代目標檔案
+
+    發生例外時刪除暫存檔，目標檔案維持原狀。
+    """
+    path = Path(path)
+    temp_file = temp_path(path)
+    try:
+        with open(temp_file, 'wb') as f:
+            yield f
+        os.replace(temp_file, path)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    with atomic_output(path) as f:
+        f.write(data)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: Path, data, compact: bool = False) -> None:
+    """以 UTF-8 寫入 JSON（compact 為最精簡格式，否則縮排 2 格）"""
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    atomic_write_text(path, text)
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+效能基準測試 - 以合成的 EPUB 語料量測 EPUBProcessor 各階段的時間與記憶體
+
+語料由固定的亂數種子產生，相同參數每次得到相同的檔案；
+結果輸出為 JSON，可與先前儲存的基準結果比較：
+
+    python benchmark.py --books 1000 --output bench.json
+    python benchmark.py --books 1000 --baseline bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from epub_processor import EPUBProcessor
+
+# 結果格式版本，欄位改變時遞增
+BENCHMARK_VERSION = 1
+
+COVER_FORMATS = ('png', 'jpeg')
+COVER_STYLES = ('epub2', 'epub3', 'name', 'mixed')
+
+CONTAINER_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+CHAPTER_XHTML = '''<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>{title}</title></head>
+<body><h1>{title}</h1><p>{text}</p></body></html>
+'''
+
+# 產生章節文字用的常用字
+SAMPLE_CHARS = '天地玄黃宇宙洪荒日月盈昃辰宿列張寒來暑往秋收冬藏閏餘成歲律呂調陽雲騰致雨露結為霜'
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (struct.pack('>I', len(data)) + chunk_type + data
+            + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def make_cover_image(fmt: str, size: int, rng: random.Random) -> bytes:
+    """
+    產生指定大小的封面圖片位元組
+
+    PNG 為 1x1 的有效圖片，以私有輔助區塊補足大小；JPEG 只有正確的檔頭與
+    SOF 區段，以註解區段補足大小。兩者都以亂數填充，壓縮率接近真實圖片。
+    """
+    def noise(length: int) -> bytes:
+        return rng.getrandbits(8 * length).to_bytes(length, 'little') if length > 0 else b''
+
+    if fmt == 'png':
+        ihdr = _png_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+        idat = _png_chunk(b'IDAT', zlib.compress(b'\x00\xff\xff\xff'))
+        iend = _png_chunk(b'IEND', b'')
+        head = b'\x89PNG\r\n\x1a\n' + ihdr
+        padding = max(0, size - len(head) - len(idat) - len(iend) - 12)
+        return head + _png_chunk(b'prVt', noise(padding)) + idat + iend
+
+    if fmt == 'jpeg':
+        sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 1, 1, 1) + b'\x01\x11\x00'
+        body = bytearray(b'\xff\xd8' + sof)
+        remaining = size - len(body) - 2
+        while remaining > 4:
+            length = min(remaining - 2, 65535)
+            body += b'\xff\xfe' + struct.pack('>H', length) + noise(length - 2)
+            remaining -= length + 2
+        return bytes(body) + b'\xff\xd9'
+
+    raise ValueError(f"不支援的封面格式: {fmt}")
+
+
+def make_opf(book_index: int, chapters: int, cover_style: str, cover_ext: str) -> str:
+    """產生 content.opf，依 cover_style 以 EPUB2 meta、EPUB3 properties 或檔名宣告封面"""
+    cover_meta = '<meta name="cover" content="cover-image"/>' if cover_style == 'epub2' else ''
+    cover_properties = ' properties="cover-image"' if cover_style == 'epub3' else ''
+    cover_id = 'cover-image' if cover_style != 'name' else 'img-front'
+    cover_href = f"Images/cover.{cover_ext}" if cover_style != 'name' else f"Images/cover_front.{cover_ext}"
+    media_type = 'image/png' if cover_ext == 'png' else 'image/jpeg'
+
+    manifest = [f'<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                f'<item id="{cover_id}" href="{cover_href}" media-type="{media_type}"{cover_properties}/>']
+    itemrefs = []
+    for chapter in range(chapters):
+        manifest.append(f'<item id="ch{chapter:04d}" href="Text/ch{chapter:04d}.xhtml" '
+                        f'media-type="application/xhtml+xml"/>')
+        itemrefs.append(f'<itemref idref="ch{chapter:04d}"/>')
+
+    items = '\n    '.join(manifest)
+    return f'''<?xml version="1.0" encoding="utf-8"?>
+<package version="3.0" unique-identifier="BookId" xmlns="http://www.idpf.org/2007/opf">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="BookId">urn:uuid:00000000-0000-4000-8000-{book_index:012d}</dc:identifier>
+    <dc:title>合成書籍 {book_index:05d}</dc:title>
+    <dc:creator>作者 {book_index % 97}</dc:creator>
+    <dc:language>zh-Hant</dc:language>
+    <dc:publisher>基準測試出版社</dc:publisher>
+    <dc:date>2025-01-01</dc:date>
+    <dc:description>第 {book_index} 本合成書籍，共 {chapters} 章。</dc:description>
+    {cover_meta}
+  </metadata>
+  <manifest>
+    {items}
+  </manifest>
+  <spine>
+    {''.join(itemrefs)}
+  </spine>
+</package>
+'''
+
+
+def write_synthetic_epub(epub_file: Path, book_index: int, chapters: int,
+                         cover_bytes: int, cover_format: str, cover_style: str,
+                         rng: random.Random) -> None:
+    """寫入一本合成 EPUB"""
+    cover_ext = 'png' if cover_format == 'png' else 'jpg'
+    cover_name = f"cover_front.{cover_ext}" if cover_style == 'name' else f"cover.{cover_ext}"
+
+    with zipfile.ZipFile(epub_file, 'w') as epub_zip:
+        epub_zip.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        epub_zip.writestr('META-INF/container.xml', CONTAINER_XML, compress_type=zipfile.ZIP_DEFLATED)
+        epub_zip.writestr('OEBPS/content.opf', make_opf(book_index, chapters, cover_style, cover_ext),
+                          compress_type=zipfile.ZIP_DEFLATED)
+        nav_items = ''.join(f'<li><a href="Text/ch{chapter:04d}.xhtml">第 {chapter + 1} 章</a></li>'
+                            for chapter in range(chapters))
+        epub_zip.writestr('OEBPS/nav.xhtml',
+                          f'<html xmlns="http://www.w3.org/1999/xhtml" '
+                          f'xmlns:epub="http://www.idpf.org/2007/ops"><body>'
+                          f'<nav epub:type="toc"><ol>{nav_items}</ol></nav></body></html>',
+                          compress_type=zipfile.ZIP_DEFLATED)
+        for chapter in range(chapters):
+            text = ''.join(rng.choice(SAMPLE_CHARS) for _ in range(200))
+            epub_zip.writestr(f'OEBPS/Text/ch{chapter:04d}.xhtml',
+                              CHAPTER_XHTML.format(title=f"第 {chapter + 1} 章", text=text),
+                              compress_type=zipfile.ZIP_DEFLATED)
+        epub_zip.writestr(f'OEBPS/Images/{cover_name}',
+                          make_cover_image(cover_format, cover_bytes, rng),
+                          compress_type=zipfile.ZIP_DEFLATED)
+
+
+def write_broken_epub(epub_file: Path, kind: str, rng: random.Random) -> None:
+    """寫入損壞的 EPUB：非 zip 檔、缺少 container.xml，或被截斷的 zip"""
+    if kind == 'garbage':
+        epub_file.write_bytes(rng.getrandbits(8 * 4096).to_bytes(4096, 'little'))
+    elif kind == 'no-container':
+        with zipfile.ZipFile(epub_file, 'w') as epub_zip:
+            epub_zip.writestr('mimetype', 'application/epub+zip')
+            epub_zip.writestr('OEBPS/content.opf', make_opf(0, 1, 'epub3', 'png'))
+    else:
+        write_synthetic_epub(epub_file, 0, 2, 2048, 'png', 'epub3', rng)
+        data = epub_file.read_bytes()
+        epub_file.write_bytes(data[:len(data) // 2])
+
+
+def generate_corpus(corpus_dir: Path, books: int = 100, chapters: int = 20,
+                    cover_bytes: int = 200 * 1024, cover_format: str = 'png',
+                    cover_style: str = 'mixed', broken: int = 0, seed: int = 0) -> Dict:
+    """
+    產生合成 EPUB 語料；目錄中已有相同參數產生的語料時直接沿用
+
+    Args:
+        corpus_dir: 語料輸出目錄
+        books: 正常書籍數量
+        chapters: 每本書的章節數（決定 OPF manifest 與 spine 的大小）
+        cover_bytes: 封面圖片大小（位元組）
+        cover_format: 封面格式（png、jpeg）
+        cover_style: 封面宣告方式（epub2、epub3、name，mixed 為三者輪替）
+        broken: 額外加入的損壞檔案數量
+        seed: 亂數種子
+
+    Returns:
+        語料參數
+    """
+    if cover_format not in COVER_FORMATS:
+        raise ValueError(f"不支援的封面格式: {cover_format}")
+    if cover_style not in COVER_STYLES:
+        raise ValueError(f"不支援的封面宣告方式: {cover_style}")
+
+    params = {"books": books, "chapters": chapters, "cover_bytes": cover_bytes,
+              "cover_format": cover_format, "cover_style": cover_style,
+              "broken": broken, "seed": seed}
+    manifest_file = corpus_dir / "corpus.json"
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            if json.load(f) == params:
+                return params
+    except (OSError, ValueError):
+        pass
+
+    if corpus_dir.exists():
+        shutil.rmtree(corpus_dir)
+    corpus_dir.mkdir(parents=True)
+
+    rng = random.Random(seed)
+    styles = ('epub2', 'epub3', 'name')
+    for index in range(books):
+        style = styles[index % len(styles)] if cover_style == 'mixed' else cover_style
+        write_synthetic_epub(corpus_dir / f"book{index:05d}.epub", index, chapters,
+                             cover_bytes, cover_format, style, rng)
+    kinds = ('garbage', 'no-container', 'truncated')
+    for index in range(broken):
+        write_broken_epub(corpus_dir / f"broken{index:04d}.epub", kinds[index % len(kinds)], rng)
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+    return params
+
+
+@contextlib.contextmanager
+def _quiet():
+    """隱藏處理器逐本輸出的訊息，避免終端機輸出影響計時"""
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _measure(func: Callable[[], object], repeat: int) -> Dict:
+    """執行 repeat 次取最快時間，另以 tracemalloc 執行一次量測記憶體峰值"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {"best_s": timings[0], "median_s": timings[len(timings) // 2],
+            "peak_kb": peak / 1024}
+
+
+class ProcessorBenchmark:
+    def __init__(self, corpus_dir: Path, work_dir: Path, repeat: int = 3, workers: int = 1):
+        """
+        初始化基準測試
+
+        Args:
+            corpus_dir: 合成語料目錄
+            work_dir: 封面與目錄輸出的暫存目錄
+            repeat: 每個階段重複次數（取最快的一次）
+            workers: 端對端執行時的並行行程數
+        """
+        self.corpus_dir = Path(corpus_dir)
+        self.work_dir = Path(work_dir)
+        self.repeat = repeat
+        self.workers = workers
+        self.epub_files = sorted(self.corpus_dir.glob("*.epub"))
+
+    def _processor(self, name: str, **options) -> EPUBProcessor:
+        output_dir = self.work_dir / name
+        if output_dir.exists():
+            shutil.rmtree(output_dir)
+        output_dir.mkdir(parents=True)
+        return EPUBProcessor(self.corpus_dir, output_dir / "covers", output_dir / "catalog",
+                             **options)
+
+    def _stage_inputs(self, processor: EPUBProcessor) -> List[Dict]:
+        """預先讀出各階段的輸入，讓每個階段只量測自己的工作"""
+        inputs = []
+        with _quiet():
+            for epub_file in self.epub_files:
+                try:
+                    with zipfile.ZipFile(epub_file, 'r') as epub_zip:
+                        opf_path = processor.get_container_path(epub_zip)
+                        if not opf_path:
+                            continue
+                        opf_content = epub_zip.read(opf_path)
+                        metadata = processor.parse_opf_metadata(opf_content)
+                        cover_href = processor.find_cover_item(opf_content, metadata.get('cover_id'))
+                except (zipfile.BadZipFile, KeyError, OSError):
+                    continue
+                inputs.append({"file": epub_file, "opf_path": opf_path,
+                               "opf_content": opf_content, "metadata": metadata,
+                               "cover_href": cover_href})
+        return inputs
+
+    def run(self) -> Dict:
+        """執行所有階段，回傳各階段的時間與記憶體"""
+        processor = self._processor("stages", use_cache=False)
+        inputs = self._stage_inputs(processor)
+        zips = {}
+        covers_dir = processor.covers_dir
+
+        def open_zips():
+            for item in inputs:
+                zips[item['file']] = zipfile.ZipFile(item['file'], 'r')
+
+        def close_zips():
+            for epub_zip in zips.values():
+                epub_zip.close()
+            zips.clear()
+
+        def get_container_path():
+            for item in inputs:
+                processor.get_container_path(zips[item['file']])
+
+        def parse_opf_metadata():
+            for item in inputs:
+                processor.parse_opf_metadata(item['opf_content'])
+
+        def find_cover_item():
+            for item in inputs:
+                processor.find_cover_item(item['opf_content'], item['metadata'].get('cover_id'))
+
+        def extract_cover_image():
+            for item in inputs:
+                if item['cover_href']:
+                    processor.extract_cover_image(zips[item['file']], item['opf_path'],
+                                                  item['cover_href'],
+                                                  covers_dir / f"{item['file'].stem}.img")
+
+        stages = {}
+        open_zips()
+        try:
+            with _quiet():
+                for name, func in (("get_container_path", get_container_path),
+                                   ("parse_opf_metadata", parse_opf_metadata),
+                                   ("find_cover_item", find_cover_item),
+                                   ("extract_cover_image", extract_cover_image)):
+                    stages[name] = _measure(func, self.repeat)
+                    stages[name]["calls"] = len(inputs)
+        finally:
+            close_zips()
+
+        with _quiet():
+            books = processor.process_all_epubs()
+
+        def generate_catalog():
+            # 每次以空的目錄輸出，避免版本號與增量更新檔案累積
+            shutil.rmtree(processor.catalog_dir)
+            processor.catalog_dir.mkdir()
+            processor.generate_catalog(books)
+
+        def run_cold():
+            self._processor("run", workers=self.workers, use_cache=False).run()
+
+        cached = self._processor("run-cached", workers=self.workers)
+        with _quiet():
+            cached.run()
+            stages["generate_catalog"] = _measure(generate_catalog, self.repeat)
+            stages["generate_catalog"]["calls"] = 1
+            stages["run"] = _measure(run_cold, self.repeat)
+            stages["run"]["calls"] = 1
+            stages["run_cached"] = _measure(cached.run, self.repeat)
+            stages["run_cached"]["calls"] = 1
+
+        for result in stages.values():
+            result["per_call_ms"] = result["best_s"] * 1000 / max(1, result["calls"])
+        return {"files": len(self.epub_files), "valid_books": len(books), "stages": stages}
+
+
+def compare_results(current: Dict, baseline: Dict) -> List[Dict]:
+    """比較兩次結果中各階段的最快時間與記憶體峰值（比例 > 1 表示變慢 / 變大）"""
+    rows = []
+    for name, result in current['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if base is None:
+            continue
+        rows.append({
+            "stage": name,
+            "best_s": result['best_s'],
+            "baseline_s": base['best_s'],
+            "time_ratio": result['best_s'] / base['best_s'] if base['best_s'] else float('inf'),
+            "peak_kb": result['peak_kb'],
+            "baseline_peak_kb": base['peak_kb'],
+            "memory_ratio": result['peak_kb'] / base['peak_kb'] if base['peak_kb'] else float('inf'),
+        })
+    return rows
+
+
+def format_results(result: Dict, comparison: Optional[List[Dict]] = None) -> str:
+    """將基準測試結果排版成表格"""
+    lines = [f"{'階段':<22}{'最快 (s)':>12}{'中位數 (s)':>12}{'每次 (ms)':>12}{'記憶體 (KB)':>14}"]
+    for name, stage in result['stages'].items():
+        lines.append(f"{name:<22}{stage['best_s']:>12.4f}{stage['median_s']:>12.4f}"
+                     f"{stage['per_call_ms']:>12.3f}{stage['peak_kb']:>14,.0f}")
+    if comparison:
+        lines.append("")
+        lines.append(f"{'與基準比較':<22}{'時間':>12}{'記憶體':>12}")
+        for row in comparison:
+            lines.append(f"{row['stage']:<22}{row['time_ratio']:>12.2f}x{row['memory_ratio']:>11.2f}x")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="以合成 EPUB 語料量測 EPUBProcessor 的效能")
+    parser.add_argument("--books", type=int, default=100, help="書籍數量（預設 100，最多 10000）")
+    parser.add_argument("--chapters", type=int, default=20, help="每本書的章節數，決定 OPF 大小（預設 20）")
+    parser.add_argument("--cover-kb", type=int, default=200, help="封面大小 KB（預設 200）")
+    parser.add_argument("--cover-format", choices=COVER_FORMATS, default='png', help="封面格式")
+    parser.add_argument("--cover-style", choices=COVER_STYLES, default='mixed',
+                        help="封面宣告方式：epub2 meta、epub3 properties、檔名，或 mixed 輪替")
+    parser.add_argument("--broken", type=int, default=0, help="額外加入的損壞檔案數量")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--repeat", type=int, default=3, help="每個階段重複次數，取最快的一次")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="端對端執行時的並行行程數")
+    parser.add_argument("--corpus-dir", type=Path,
+                        help="語料目錄（預設為暫存目錄；指定時可在多次執行間沿用）")
+    parser.add_argument("--output", type=Path, help="將結果寫入 JSON 檔案")
+    parser.add_argument("--baseline", type=Path, help="與先前儲存的 JSON 結果比較")
+    parser.add_argument("--max-slowdown", type=float, default=0,
+                        help="任一階段比基準慢超過此比例（例如 0.2）時以非零狀態結束")
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.books <= 10000:
+        parser.error("--books 必須介於 1 到 10000")
+
+    with tempfile.TemporaryDirectory(prefix="epub-bench-") as temp_dir:
+        corpus_dir = args.corpus_dir or Path(temp_dir) / "corpus"
+        print(f"產生語料: {corpus_dir}")
+        corpus = generate_corpus(corpus_dir, books=args.books, chapters=args.chapters,
+                                 cover_bytes=args.cover_kb * 1024, cover_format=args.cover_format,
+                                 cover_style=args.cover_style, broken=args.broken, seed=args.seed)
+
+        benchmark = ProcessorBenchmark(corpus_dir, Path(temp_dir) / "work",
+                                       repeat=args.repeat, workers=args.jobs)
+        result = {
+            "benchmark_version": BENCHMARK_VERSION,
+            "environment": {"python": platform.python_version(),
+                            "platform": platform.platform(),
+                            "cpu_count": os.cpu_count()},
+            "corpus": corpus,
+            "repeat": args.repeat,
+            "workers": args.jobs,
+        }
+        result.update(benchmark.run())
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus') != result['corpus']:
+            print("⚠ 基準結果使用的語料參數不同，比較結果僅供參考")
+        comparison = compare_results(result, baseline)
+        result["comparison"] = comparison
+
+    print(format_results(result, comparison))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✓ 結果已寫入 {args.output}")
+
+    if comparison and args.max_slowdown > 0:
+        slower = [row['stage'] for row in comparison if row['time_ratio'] > 1 + args.max_slowdown]
+        if slower:
+            print(f"✗ 以下階段比基準慢超過 {args.max_slowdown:.0%}: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
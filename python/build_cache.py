@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+建置快取 - 記錄每個 EPUB 的指紋與處理結果，讓未變更的書籍免於重新處理；
+檢查點日誌讓中斷的執行可以從上次完成的書籍繼續
+"""
+
+import json
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from atomic_io import atomic_write_json
+
+# 快取格式或處理邏輯改變時遞增，舊快取會被整個捨棄
+CACHE_VERSION = 2
+
+
+def file_sha256(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """以串流方式計算檔案的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path: Path) -> Dict:
+    """計算檔案指紋（大小、修改時間、SHA-256）"""
+    stat = file_path.stat()
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(file_path)
+    }
+
+
+def fingerprint_matches(file_path: Path, fingerprint: Dict) -> bool:
+    """
+    檢查檔案是否仍符合先前記錄的指紋
+
+    大小與修改時間相同時直接視為相符；修改時間不同時比對內容雜湊，
+    內容未變（例如只是被複製或 touch）時更新指紋中的修改時間。
+    """
+    stat = file_path.stat()
+    if stat.st_size != fingerprint.get('size'):
+        return False
+    if stat.st_mtime_ns != fingerprint.get('mtime_ns'):
+        if file_sha256(file_path) != fingerprint.get('sha256'):
+            return False
+        fingerprint['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+class BuildCache:
+    def __init__(self, cache_dir: Path, covers_dir: Path, load: bool = True,
+                 settings: Optional[Dict] = None):
+        """
+        初始化建置快取
+
+        Args:
+            cache_dir: 快取目錄（例如 catalog/.build-cache）
+            covers_dir: 封面圖片目錄，用於確認快取的封面仍然存在
+            load: 是否讀取既有的快取檔案（False 時從空快取開始）
+            settings: 影響處理結果的設定（例如資源限制），與快取檔案中記錄的不同時整個捨棄
+        """
+        self.cache_dir = Path(cache_dir)
+        self.covers_dir = Path(covers_dir)
+        self.cache_file = self.cache_dir / "epubs.json"
+        self.settings = settings or {}
+        self.entries: Dict[str, Dict] = {}
+        if load:
+            self.load()
+
+    def load(self) -> None:
+        """讀取快取檔案，格式不符或損壞時以空快取開始"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION and data.get('settings', {}) == self.settings:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self) -> None:
+        """寫回快取檔案"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.cache_file, {"version": CACHE_VERSION, "settings": self.settings,
+                                            "entries": self.entries})
+
+    def lookup(self, epub_file: Path) -> Optional[Dict]:
+        """查詢 EPUB 的快取結果，檔案指紋不符或封面已遺失時視為未命中"""
+        entry = self.entries.get(epub_file.name)
+        if entry is None:
+            return None
+
+        cover = entry.get('cover')
+        if cover and not (self.covers_dir / cover).exists():
+            return None
+
+        if not fingerprint_matches(epub_file, entry):
+            return None
+
+        return entry['book_info']
+
+    def store(self, epub_file: Path, book_info: Dict) -> Dict:
+        """記錄 EPUB 的指紋與處理結果，回傳快取項目"""
+        cover_url = book_info.get('coverUrl', '')
+        entry = file_fingerprint(epub_file)
+        entry.update({
+            "cover": Path(cover_url).name if cover_url else "",
+            "book_info": book_info
+        })
+        self.entries[epub_file.name] = entry
+        return entry
+
+    def prune(self, existing_names: Iterable[str]) -> int:
+        """移除已不存在之 EPUB 的快取項目，回傳移除數量"""
+        existing = set(existing_names)
+        stale = [name for name in self.entries if name not in existing]
+        for name in stale:
+            del self.entries[name]
+        return len(stale)
+
+
+class BuildJournal:
+    def __init__(self, cache_dir: Path):
+        """
+        初始化檢查點日誌
+
+        執行期間每處理完一本書就附加一行記錄（與快取項目格式相同），
+        執行中斷時下次可從日誌恢復已完成的書籍；正常結束後刪除日誌。
+
+        Args:
+            cache_dir: 快取目錄（例如 catalog/.build-cache）
+        """
+        self.journal_file = Path(cache_dir) / "journal.jsonl"
+        self._file = None
+
+    def replay(self) -> Dict[str, Dict]:
+        """讀取上次中斷時留下的日誌，回傳 {EPUB 檔名: 快取項目}（忽略寫到一半的最後一行）"""
+        entries: Dict[str, Dict] = {}
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        entries[record['name']] = record['entry']
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+        return entries
+
+    def append(self, name: str, entry: Dict) -> None:
+        """記錄一本已完成的書籍（立即寫出，行程被終止時也不會遺失）"""
+        if self._file is None:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        self._file.write(json.dumps({"name": name, "entry": entry}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def clear(self) -> None:
+        """執行正常完成（結果已寫入快取）後刪除日誌"""
+        self.close()
+        try:
+            self.journal_file.unlink()
+        except FileNotFoundError:
+            pass
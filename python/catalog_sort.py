@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目錄排序與分面索引 - 預先計算每本書的排序鍵、各排序方式的書籍順序，
+以及作者、語言、主題對應書籍 ID 的分面索引
+
+APP 開啟書庫時直接依 sort.json 中預先排好的 ID 列表顯示，
+不必在裝置上做中文排序。
+
+排序鍵：
+    zhuyin / pinyin  書名讀音（需要 pypinyin），注音依ㄅㄆㄇㄈ順序排序
+    strokes          書名第一個中文字的筆畫數（需要 Unihan 資料庫的 kTotalStrokes）
+    author           正規化的作者名稱（全形轉半形、合併空白、去除「著」「講述」等字樣）
+
+使用方式:
+    python catalog_sort.py --unihan Unihan.zip 論語   # 查詢單一書名的排序鍵
+"""
+
+import argparse
+import io
+import re
+import sys
+import unicodedata
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from search_index import CJK_PATTERN
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pypinyin 為可選依賴，未安裝時不輸出讀音排序
+    lazy_pinyin = None
+
+# sort.json 格式改變時遞增
+SORT_INDEX_VERSION = 1
+
+# 作者名稱後的著作方式（整段為著作方式時直接移除）
+AUTHOR_ROLE_PATTERN = re.compile(
+    r'(?:恭錄|講述|體述|著述|敘述|譯述|編纂|編著|編輯|譯註)$')
+
+# 單字的著作方式；「自述」等本身是名稱的一部分，不移除
+AUTHOR_SINGLE_ROLE_PATTERN = re.compile(r'(?<!自)[述著譯編撰輯]$')
+
+# 書名開頭不列入排序的標點與符號（例如《》、「」、括號）
+LEADING_PUNCTUATION_PATTERN = re.compile(r'^[\W_]+')
+
+SUBJECT_SEPARATOR_PATTERN = re.compile(r'\s*[,;，；、/]\s*')
+
+CJK_CHAR_PATTERN = re.compile(CJK_PATTERN.pattern[:-1])
+
+# 沒有讀音或筆畫資料的書籍排在最後
+MISSING_STROKES = 10 ** 4
+
+
+def pypinyin_available() -> bool:
+    return lazy_pinyin is not None
+
+
+def normalize_author(author: str) -> str:
+    """
+    正規化作者名稱作為排序與分面的依據
+
+    NFKC（全形轉半形）、換行與全形空白合併為單一空白，
+    每段名稱去除結尾的著作方式（「淨空法師講述」→「淨空法師」），只有著作方式的段落直接移除。
+    單字的著作方式（述、著、譯等）只在剩下至少兩個字時移除（「見月老人自述」、「王著」維持原樣）。
+    """
+    text = ' '.join(unicodedata.normalize('NFKC', author or '').split())
+    parts = []
+    for part in text.split(' '):
+        name = AUTHOR_ROLE_PATTERN.sub('', part)
+        if name == part:
+            name = AUTHOR_SINGLE_ROLE_PATTERN.sub('', part)
+            if len(name) == 1:
+                name = part
+        if name:
+            parts.append(name)
+    return ' '.join(parts) or text
+
+
+def sort_title(title: str) -> str:
+    """NFKC 正規化並移除開頭的標點，作為書名排序的依據"""
+    text = unicodedata.normalize('NFKC', title or '').strip()
+    return LEADING_PUNCTUATION_PATTERN.sub('', text) or text
+
+
+def split_subjects(subject: str) -> List[str]:
+    subjects = []
+    for item in SUBJECT_SEPARATOR_PATTERN.split(unicodedata.normalize('NFKC', subject or '')):
+        item = item.strip()
+        if item and item not in subjects:
+            subjects.append(item)
+    return subjects
+
+
+def _parse_unihan_lines(lines: Iterable[str], strokes: Dict[str, int]) -> None:
+    for line in lines:
+        if not line.startswith('U+'):
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) >= 3 and fields[1] == 'kTotalStrokes':
+            # 有多個值時第一個為大陸字形，最後一個為臺灣字形
+            strokes[chr(int(fields[0][2:], 16))] = int(fields[2].split()[-1])
+
+
+def load_unihan_strokes(path: Path) -> Dict[str, int]:
+    """
+    讀取 Unihan 資料庫的總筆畫數（kTotalStrokes）
+
+    Args:
+        path: Unihan.zip，或其中包含 kTotalStrokes 的文字檔（Unihan_IRGSources.txt）
+
+    Returns:
+        {字元: 筆畫數}
+    """
+    path = Path(path)
+    strokes: Dict[str, int] = {}
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.endswith('.txt'):
+                    with archive.open(name) as f:
+                        _parse_unihan_lines(io.TextIOWrapper(f, encoding='utf-8'), strokes)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            _parse_unihan_lines(f, strokes)
+    return strokes
+
+
+class SortKeyBuilder:
+    def __init__(self, unihan_file: Optional[Path] = None):
+        """
+        初始化排序鍵產生器
+
+        Args:
+            unihan_file: Unihan 資料庫檔案（None 表示不計算筆畫數）
+        """
+        self.strokes = load_unihan_strokes(unihan_file) if unihan_file else {}
+
+    @property
+    def has_readings(self) -> bool:
+        return pypinyin_available()
+
+    @property
+    def has_strokes(self) -> bool:
+        return bool(self.strokes)
+
+    def reading(self, text: str, zhuyin: bool = True) -> Optional[str]:
+        """書名或作者的讀音（注音或數字標調的拼音），各音節以空白分隔；沒有 pypinyin 時為 None"""
+        if lazy_pinyin is None:
+            return None
+        style = Style.BOPOMOFO if zhuyin else Style.TONE3
+        syllables = lazy_pinyin(text, style=style, neutral_tone_with_five=True)
+        return ' '.join(syllable.strip().lower() for syllable in syllables if syllable.strip())
+
+    def first_char_strokes(self, text: str) -> Optional[int]:
+        """第一個中文字的筆畫數；沒有中文字或筆畫資料時為 None"""
+        match = CJK_CHAR_PATTERN.search(text)
+        if match is None:
+            return None
+        return self.strokes.get(match.group())
+
+    def book_keys(self, book: Dict) -> Dict:
+        """
+        單本書的排序鍵
+
+        Returns:
+            {"zhuyin", "pinyin", "strokes", "author"}，無法計算的項目為 None
+        """
+        title = sort_title(book.get('title', ''))
+        return {
+            "zhuyin": self.reading(title, zhuyin=True),
+            "pinyin": self.reading(title, zhuyin=False),
+            "strokes": self.first_char_strokes(title),
+            "author": normalize_author(book.get('author', '')),
+        }
+
+
+def _title_order(book: Dict) -> Tuple:
+    keys = book['sortKeys']
+    # 有讀音時依注音，否則依正規化書名的字碼順序
+    return (keys['zhuyin'] or sort_title(book.get('title', '')), book['id'])
+
+
+def _author_order(builder: SortKeyBuilder, author: str) -> Tuple:
+    return (builder.reading(author) or author, author)
+
+
+def sort_orders(books: List[Dict], builder: SortKeyBuilder) -> Dict[str, List[str]]:
+    """
+    各排序方式（皆為遞增，遞減時由 APP 反向顯示）的書籍 ID 順序
+
+    title 一律輸出；zhuyin、pinyin 需要 pypinyin，strokes 需要 Unihan 筆畫資料。
+    """
+    def ids(key) -> List[str]:
+        return [book['id'] for book in sorted(books, key=key)]
+
+    author_orders = {}
+    for book in books:
+        author = book['sortKeys']['author']
+        if author not in author_orders:
+            author_orders[author] = _author_order(builder, author)
+
+    orders = {"title": ids(lambda book: (sort_title(book.get('title', '')), book['id']))}
+    if builder.has_readings:
+        orders["zhuyin"] = ids(_title_order)
+        orders["pinyin"] = ids(lambda book: (book['sortKeys']['pinyin'], book['id']))
+    if builder.has_strokes:
+        orders["strokes"] = ids(lambda book: (
+            book['sortKeys']['strokes'] if book['sortKeys']['strokes'] is not None
+            else MISSING_STROKES,) + _title_order(book))
+    orders["author"] = ids(lambda book: author_orders[book['sortKeys']['author']]
+                           + _title_order(book))
+    # 沒有日期的書籍排在最後
+    orders["date"] = ids(lambda book: (not book.get('date'), book.get('date', ''))
+                         + _title_order(book))
+    return orders
+
+
+def build_facets(books: List[Dict], builder: SortKeyBuilder) -> Dict[str, Dict[str, List[str]]]:
+    """
+    作者、語言、主題對應的書籍 ID（各值內依書名排序）
+
+    作者依正規化名稱分組並依讀音排序；主題取自 OPF 的 dc:subject，以逗號、頓號等分隔。
+    """
+    authors: Dict[str, List[str]] = {}
+    languages: Dict[str, List[str]] = {}
+    subjects: Dict[str, List[str]] = {}
+    for book in sorted(books, key=_title_order):
+        authors.setdefault(book['sortKeys']['author'], []).append(book['id'])
+        languages.setdefault(book.get('language', ''), []).append(book['id'])
+        for subject in split_subjects(book.get('metadata', {}).get('subject', '')):
+            subjects.setdefault(subject, []).append(book['id'])
+
+    def ordered(facet: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        return {value: facet[value]
+                for value in sorted(facet, key=lambda value: _author_order(builder, value))}
+
+    return {
+        "author": ordered(authors),
+        "language": dict(sorted(languages.items())),
+        "subject": ordered(subjects),
+    }
+
+
+def build_sort_index(books: List[Dict], builder: SortKeyBuilder) -> Dict:
+    """
+    為每本書加上 sortKeys 欄位，並產生 sort.json 的內容
+
+    Returns:
+        {"version", "readings", "strokes", "orders": {排序方式: [書籍 ID]},
+         "facets": {"author" | "language" | "subject": {值: [書籍 ID]}}}
+    """
+    for book in books:
+        book['sortKeys'] = builder.book_keys(book)
+    return {
+        "version": SORT_INDEX_VERSION,
+        "readings": builder.has_readings,
+        "strokes": builder.has_strokes,
+        "orders": sort_orders(books, builder),
+        "facets": build_facets(books, builder),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列查詢：python catalog_sort.py 書名"""
+    parser = argparse.ArgumentParser(description="顯示書名的讀音與筆畫排序鍵")
+    parser.add_argument("title", help="書名")
+    parser.add_argument("--author", default="", help="作者（顯示正規化結果）")
+    parser.add_argument("--unihan", type=Path, metavar="FILE",
+                        help="Unihan.zip 或 Unihan_IRGSources.txt（計算筆畫數）")
+    args = parser.parse_args(argv)
+
+    if not pypinyin_available():
+        print("✗ 未安裝 pypinyin，無法計算讀音")
+    keys = SortKeyBuilder(args.unihan).book_keys({"title": args.title, "author": args.author})
+    for key, value in keys.items():
+        print(f"  {key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 目錄 - 將 books.json 的內容輸出為正規化的 books.sqlite，附 FTS5 全文檢索
+
+APP 與工具可以直接以索引查詢（依書名、作者、語言、日期排序或篩選），
+不必把整份 books.json 讀進記憶體。書名、作者與簡介另外建立 FTS5 索引，
+中文逐字切分，查詢時以片語比對，效果等同子字串搜尋。
+
+使用方式:
+    python catalog_sqlite.py 論語                  # 查詢 catalog/books.sqlite
+    python catalog_sqlite.py --db books.sqlite 印光 --limit 5
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from atomic_io import temp_path
+from search_index import CJK_PATTERN, normalize_text
+
+# 資料表結構改變時遞增，記錄在 PRAGMA user_version
+SQLITE_SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE catalog_metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE authors (
+    author_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE languages (
+    language_id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE books (
+    book_key INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    author_id INTEGER NOT NULL REFERENCES authors (author_id),
+    language_id INTEGER NOT NULL REFERENCES languages (language_id),
+    description TEXT NOT NULL,
+    publisher TEXT NOT NULL,
+    date TEXT NOT NULL,
+    epub_url TEXT NOT NULL,
+    toc_url TEXT,
+    optimized_epub_url TEXT,
+    optimized_bytes INTEGER
+);
+
+-- 原始封面（is_original = 1）與各尺寸、格式的縮圖
+CREATE TABLE covers (
+    book_key INTEGER NOT NULL REFERENCES books (book_key),
+    url TEXT NOT NULL,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER,
+    is_original INTEGER NOT NULL
+);
+"""
+
+# 常用排序與篩選欄位的索引，在資料寫入後才建立
+INDEXES = """
+CREATE INDEX books_position ON books (position);
+CREATE INDEX books_title ON books (title);
+CREATE INDEX books_author_title ON books (author_id, title);
+CREATE INDEX books_language_title ON books (language_id, title);
+CREATE INDEX books_date ON books (date);
+CREATE INDEX covers_book ON covers (book_key, is_original);
+"""
+
+# 不儲存原文的 FTS5 索引（rowid 即 books.book_key），只用於查詢
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE books_fts USING fts5 (
+    title, author, description,
+    content = '', tokenize = 'unicode61'
+);
+"""
+
+CJK_CHAR_PATTERN = re.compile(CJK_PATTERN.pattern[:-1])
+
+
+def fts_text(text: str) -> str:
+    """正規化並在每個中文字之間加上空白，讓 unicode61 斷詞器逐字建立索引"""
+    return CJK_CHAR_PATTERN.sub(lambda match: f" {match.group()} ", normalize_text(text))
+
+
+def fts_query(query: str) -> Optional[str]:
+    """
+    將使用者輸入轉為 FTS5 查詢：每個以空白分隔的詞為一個片語，各詞之間為 AND
+
+    Returns:
+        FTS5 MATCH 字串；沒有可查詢的字詞時為 None
+    """
+    phrases = []
+    for term in query.split():
+        tokens = re.findall(r'\w+', fts_text(term))
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' '.join(phrases) or None
+
+
+def fts5_available() -> bool:
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE t USING fts5 (a)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _execute_statements(cursor: sqlite3.Cursor, script: str) -> None:
+    # executescript 會先提交目前的交易，因此逐一執行
+    for statement in script.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def _lookup_id(cache: Dict[str, int], cursor: sqlite3.Cursor, table: str,
+               column: str, value: str) -> int:
+    if value not in cache:
+        cursor.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (value,))
+        cache[value] = cursor.lastrowid
+    return cache[value]
+
+
+def _cover_format(url: str) -> Optional[str]:
+    _, ext = os.path.splitext(url.lower())
+    return {'.jpg': 'jpeg', '.jpeg': 'jpeg'}.get(ext, ext[1:] or None)
+
+
+def write_catalog_sqlite(db_path: Path, catalog: Dict) -> Dict:
+    """
+    將目錄寫入 SQLite 資料庫
+
+    在暫存檔中以單一交易批次寫入（不使用 WAL 與回滾日誌），建立索引後 VACUUM，
+    最後以 rename 取代目標檔案。
+
+    Returns:
+        {"url", "bytes", "sha256", "fts"}，供記錄在目錄 metadata 中
+    """
+    db_path = Path(db_path)
+    temp_file = temp_path(db_path)
+    if temp_file.exists():
+        temp_file.unlink()
+    use_fts = fts5_available()
+
+    conn = sqlite3.connect(str(temp_file), isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        _execute_statements(cursor, SCHEMA)
+        if use_fts:
+            cursor.execute(FTS_SCHEMA)
+
+        metadata = catalog.get('metadata', {})
+        cursor.executemany(
+            "INSERT INTO catalog_metadata (key, value) VALUES (?, ?)",
+            [(key, str(metadata[key])) for key in ('title', 'description', 'generated_at',
+                                                   'total_books', 'version') if key in metadata])
+
+        authors: Dict[str, int] = {}
+        languages: Dict[str, int] = {}
+        for position, book in enumerate(catalog.get('books', [])):
+            author_id = _lookup_id(authors, cursor, "authors", "name", book.get('author', ''))
+            language_id = _lookup_id(languages, cursor, "languages", "code",
+                                     book.get('language', ''))
+            cursor.execute(
+                "INSERT INTO books (id, position, title, author_id, language_id, description,"
+                " publisher, date, epub_url, toc_url, optimized_epub_url, optimized_bytes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (book['id'], position, book.get('title', ''), author_id, language_id,
+                 book.get('description', ''), book.get('publisher', ''), book.get('date', ''),
+                 book.get('epubUrl', ''), book.get('tocUrl'), book.get('optimizedEpubUrl'),
+                 book.get('optimizedBytes')))
+            book_key = cursor.lastrowid
+
+            covers = []
+            if book.get('coverUrl'):
+                covers.append((book_key, book['coverUrl'], _cover_format(book['coverUrl']),
+                               None, None, None, 1))
+            for thumbnail in book.get('coverThumbnails', []):
+                covers.append((book_key, thumbnail['url'], thumbnail.get('format'),
+                               thumbnail.get('width'), thumbnail.get('height'),
+                               thumbnail.get('bytes'), 0))
+            cursor.executemany(
+                "INSERT INTO covers (book_key, url, format, width, height, bytes, is_original)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", covers)
+
+            if use_fts:
+                cursor.execute(
+                    "INSERT INTO books_fts (rowid, title, author, description) VALUES (?, ?, ?, ?)",
+                    (book_key, fts_text(book.get('title', '')), fts_text(book.get('author', '')),
+                     fts_text(book.get('description', ''))))
+
+        _execute_statements(cursor, INDEXES)
+        if use_fts:
+            # 合併 FTS5 的索引區段，查詢時只需讀取一個 b-tree
+            cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('optimize')")
+        cursor.execute("ANALYZE")
+        cursor.execute("COMMIT")
+        conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        temp_file.unlink()
+        raise
+    conn.close()
+
+    payload = temp_file.read_bytes()
+    os.replace(temp_file, db_path)
+    return {
+        "url": db_path.name,
+        "bytes": len(payload),
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "fts": use_fts,
+    }
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    """目錄是否建立了 FTS5 索引，且目前的 SQLite 可以查詢"""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone()
+    return row is not None and fts5_available()
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def search_books(db_path: Path, query: str, limit: int = 20) -> List[Dict]:
+    """
+    以 FTS5 查詢書名、作者與簡介，依相關程度排序
+
+    建置環境沒有 FTS5 時目錄不含 books_fts，改以 LIKE 逐詞比對書名、作者與簡介，依目錄順序排列。
+    """
+    match = fts_query(query)
+    if match is None:
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if _has_fts(conn):
+            rows = conn.execute(
+                "SELECT books.id, books.title, authors.name FROM books_fts"
+                " JOIN books ON books.book_key = books_fts.rowid"
+                " JOIN authors USING (author_id)"
+                " WHERE books_fts MATCH ? ORDER BY books_fts.rank LIMIT ?",
+                (match, limit)).fetchall()
+        else:
+            terms = query.split()
+            conditions = ' AND '.join(
+                "(books.title LIKE ? ESCAPE '\\' OR authors.name LIKE ? ESCAPE '\\'"
+                " OR books.description LIKE ? ESCAPE '\\')" for _ in terms)
+            params = [pattern for term in terms for pattern in (_like_pattern(term),) * 3]
+            rows = conn.execute(
+                "SELECT books.id, books.title, authors.name FROM books"
+                " JOIN authors USING (author_id)"
+                f" WHERE {conditions} ORDER BY books.position LIMIT ?",
+                params + [limit]).fetchall()
+    finally:
+        conn.close()
+    return [{"id": book_id, "title": title, "author": author} for book_id, title, author in rows]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列查詢：python catalog_sqlite.py 關鍵字"""
+    parser = argparse.ArgumentParser(description="查詢 SQLite 目錄的書名、作者與簡介")
+    parser.add_argument("query", help="查詢字詞（以空白分隔多個詞時須全部符合）")
+    parser.add_argument("--db", type=Path,
+                        default=Path(__file__).parent.parent / "catalog" / "books.sqlite",
+                        help="SQLite 目錄檔案（預設 catalog/books.sqlite）")
+    parser.add_argument("--limit", type=int, default=20, help="最多列出幾筆結果")
+    args = parser.parse_args(argv)
+
+    results = search_books(args.db, args.query, args.limit)
+    print(f"「{args.query}」找到 {len(results)} 本書")
+    for result in results:
+        print(f"  {result['id']}  {result['title']} - {result['author']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目錄輸出 - 分頁目錄、版本號與增量更新檔案、預先壓縮與二進位編碼
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from atomic_io import atomic_write_bytes
+
+try:
+    import brotli
+except ImportError:  # brotli 為可選依賴
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack 為可選依賴
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # cbor2 為可選依賴
+    cbor2 = None
+
+# 分頁目錄格式版本，結構改變時遞增
+SHARD_SCHEMA_VERSION = 1
+
+COMPACT_SEPARATORS = (',', ':')
+
+DELTA_FILE_PATTERN = re.compile(r'^books\.delta\.(\d+)-(\d+)\.json$')
+
+
+def compact_book_record(book_info: Dict) -> Dict:
+    """移除僅供調試用的完整 metadata，得到給 APP 使用的精簡書籍資料"""
+    return {key: value for key, value in book_info.items() if key != 'metadata'}
+
+
+def write_json(file_path: Path, data, compact: bool = False) -> int:
+    """以原子方式寫入 JSON 檔案，回傳寫入的位元組數"""
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=COMPACT_SEPARATORS)
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    payload = text.encode('utf-8')
+    atomic_write_bytes(file_path, payload)
+    return len(payload)
+
+
+def write_sharded_catalog(catalog_dir: Path, catalog_metadata: Dict,
+                          books: List[Dict], page_size: int) -> Dict:
+    """
+    輸出分頁目錄：根索引 index.json、固定大小的分頁 pages/books.NNNN.json，
+    以及獨立的調試用 metadata 檔案 books.metadata.json
+
+    Args:
+        catalog_dir: 目錄檔案輸出目錄
+        catalog_metadata: books.json 中的 metadata 區段（標題、描述、生成日期等）
+        books: 書籍資料列表
+        page_size: 每個分頁的書籍數量
+
+    Returns:
+        根索引內容
+    """
+    if page_size <= 0:
+        raise ValueError("page_size 必須大於 0")
+
+    pages_dir = catalog_dir / "pages"
+    pages_dir.mkdir(parents=True, exist_ok=True)
+
+    records = [compact_book_record(book_info) for book_info in books]
+    pages = [records[start:start + page_size] for start in range(0, len(records), page_size)]
+
+    shards = []
+    for number, page_books in enumerate(pages, 1):
+        filename = f"books.{number:04d}.json"
+        size = write_json(pages_dir / filename, {"page": number, "books": page_books},
+                          compact=True)
+        shards.append({
+            "url": f"pages/{filename}",
+            "count": len(page_books),
+            "first_id": page_books[0]['id'],
+            "last_id": page_books[-1]['id'],
+            "bytes": size
+        })
+
+    # 書籍數量減少時，移除多出來的舊分頁
+    current = {Path(shard['url']).name for shard in shards}
+    for old_page in pages_dir.glob("books.*.json"):
+        if old_page.name not in current:
+            old_page.unlink()
+
+    debug_metadata = {book_info['id']: book_info.get('metadata', {}) for book_info in books}
+    write_json(catalog_dir / "books.metadata.json", debug_metadata)
+
+    index = dict(catalog_metadata)
+    index.update({
+        "schema_version": SHARD_SCHEMA_VERSION,
+        "total_books": len(records),
+        "page_size": page_size,
+        "total_pages": len(shards),
+        "shards": shards,
+        "metadata_url": "books.metadata.json"
+    })
+    write_json(catalog_dir / "index.json", index, compact=True)
+    return index
+
+
+def load_catalog(catalog_file: Path) -> Optional[Dict]:
+    """讀取既有的 books.json，不存在或損壞時回傳 None"""
+    try:
+        with open(catalog_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def diff_books(old_books: List[Dict], new_books: List[Dict]) -> Dict:
+    """
+    比較前後兩版的書籍資料（不含調試用 metadata）
+
+    Returns:
+        {"added": [書籍資料], "updated": [{"id", "changes"}], "removed": [書籍 ID]}，
+        updated 的 changes 只包含有變動的欄位，被移除的欄位值為 None
+    """
+    old_records = {book['id']: compact_book_record(book) for book in old_books}
+    new_records = {book['id']: compact_book_record(book) for book in new_books}
+
+    added = [record for book_id, record in new_records.items() if book_id not in old_records]
+    removed = [book_id for book_id in old_records if book_id not in new_records]
+
+    updated = []
+    for book_id, record in new_records.items():
+        old_record = old_records.get(book_id)
+        if old_record is None or old_record == record:
+            continue
+        changes = {key: value for key, value in record.items() if old_record.get(key) != value}
+        for key in old_record:
+            if key not in record:
+                changes[key] = None
+        updated.append({"id": book_id, "changes": changes})
+
+    return {"added": added, "updated": updated, "removed": removed}
+
+
+def write_catalog_delta(catalog_dir: Path, from_version: int, to_version: int,
+                        changes: Dict) -> Path:
+    """輸出 books.delta.<from>-<to>.json 增量更新檔案"""
+    delta = {
+        "from_version": from_version,
+        "to_version": to_version,
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "changes": changes,
+        "summary": {
+            "added_count": len(changes['added']),
+            "updated_count": len(changes['updated']),
+            "removed_count": len(changes['removed'])
+        }
+    }
+    delta_file = catalog_dir / f"books.delta.{from_version}-{to_version}.json"
+    write_json(delta_file, delta, compact=True)
+    return delta_file
+
+
+def list_catalog_deltas(catalog_dir: Path) -> List[Dict]:
+    """列出目錄中的增量更新檔案，依目標版本排序"""
+    deltas = []
+    for delta_file in catalog_dir.glob("books.delta.*.json"):
+        match = DELTA_FILE_PATTERN.match(delta_file.name)
+        if match:
+            deltas.append({
+                "from_version": int(match.group(1)),
+                "to_version": int(match.group(2)),
+                "url": delta_file.name,
+                "bytes": delta_file.stat().st_size
+            })
+    return sorted(deltas, key=lambda delta: (delta['to_version'], delta['from_version']))
+
+
+def prune_catalog_deltas(catalog_dir: Path, keep: int) -> List[Dict]:
+    """只保留最近 keep 個增量更新檔案，回傳保留的列表"""
+    deltas = list_catalog_deltas(catalog_dir)
+    expired = deltas[:-keep] if keep > 0 else deltas
+    for delta in expired:
+        (catalog_dir / delta['url']).unlink()
+    return deltas[len(expired):]
+
+
+def gzip_compress(data: bytes) -> bytes:
+    """以最高壓縮等級 gzip 壓縮（固定 mtime，相同內容產生相同輸出）"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def catalog_encoders() -> List[Tuple[str, str, Callable, Callable]]:
+    """
+    列出可用的目錄編碼方式：(名稱, 檔名, 編碼函數, 解碼函數)
+
+    brotli、MessagePack 與 CBOR 需要安裝對應套件，未安裝時略過。
+    """
+    def to_min_json(catalog: Dict) -> bytes:
+        return json.dumps(catalog, ensure_ascii=False,
+                          separators=COMPACT_SEPARATORS).encode('utf-8')
+
+    def from_json(payload: bytes) -> Dict:
+        return json.loads(payload.decode('utf-8'))
+
+    encoders = [
+        ("json", "books.json",
+         lambda catalog: json.dumps(catalog, ensure_ascii=False, indent=2).encode('utf-8'),
+         from_json),
+        ("min.json", "books.min.json", to_min_json, from_json),
+        ("min.json.gz", "books.min.json.gz",
+         lambda catalog: gzip_compress(to_min_json(catalog)),
+         lambda payload: from_json(gzip.decompress(payload))),
+    ]
+    if brotli is not None:
+        encoders.append(
+            ("min.json.br", "books.min.json.br",
+             lambda catalog: brotli.compress(to_min_json(catalog), quality=11),
+             lambda payload: from_json(brotli.decompress(payload))))
+    if msgpack is not None:
+        encoders.append(
+            ("msgpack", "books.msgpack",
+             lambda catalog: msgpack.packb(catalog, use_bin_type=True),
+             lambda payload: msgpack.unpackb(payload, raw=False)))
+    elif cbor2 is not None:
+        encoders.append(("cbor", "books.cbor", cbor2.dumps, cbor2.loads))
+    return encoders
+
+
+def write_catalog_encodings(catalog_dir: Path, catalog: Dict) -> Dict:
+    """
+    輸出與 books.json 內容相同的精簡 JSON、gzip / brotli 預先壓縮檔與二進位編碼
+
+    Returns:
+        {名稱: {"url", "bytes", "sha256"}}，供記錄在目錄 metadata 中
+    """
+    encodings = {}
+    for name, filename, encode, _ in catalog_encoders():
+        if name == "json":
+            continue  # books.json 本身由呼叫端寫入
+        payload = encode(catalog)
+        atomic_write_bytes(catalog_dir / filename, payload)
+        encodings[name] = {
+            "url": filename,
+            "bytes": len(payload),
+            "sha256": hashlib.sha256(payload).hexdigest()
+        }
+    return encodings
+
+
+def encoding_report(catalog: Dict, repeat: int = 20) -> List[Dict]:
+    """比較各編碼方式的大小與解碼時間（取 repeat 次中最快的一次）"""
+    report = []
+    for name, _, encode, decode in catalog_encoders():
+        payload = encode(catalog)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decode(payload)
+            best = min(best, time.perf_counter() - start)
+        report.append({"encoding": name, "bytes": len(payload), "decode_ms": best * 1000})
+    return report
+
+
+def format_encoding_report(report: List[Dict]) -> str:
+    """將編碼比較結果排版成表格"""
+    baseline = report[0]['bytes'] if report else 1
+    lines = [f"{'編碼':<14}{'大小 (bytes)':>14}{'比例':>8}{'解碼 (ms)':>12}"]
+    for row in sorted(report, key=lambda row: row['bytes']):
+        lines.append(f"{row['encoding']:<14}{row['bytes']:>14,}"
+                     f"{row['bytes'] / baseline:>8.1%}{row['decode_ms']:>12.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+封面備援查找 - OPF 沒有標示封面（或標示的檔案不存在）時，為每張圖片評分選出最可能的封面
+
+只讀取圖片檔頭取得尺寸（PNG IHDR、JPEG SOF、GIF 與 WebP 檔頭），不解碼圖片，
+通常每張圖片只需解壓縮前幾百個位元組，圖片很多的書籍也很快。
+"""
+
+import posixpath
+import re
+import struct
+import urllib.parse
+import zipfile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from epub_archive import IMAGE_EXTENSIONS, EPUBArchive, normalize_member_name
+from resource_limits import LimitExceeded
+
+# 先讀取的檔頭長度；JPEG 的 SOF 在 EXIF 等區段之後時才繼續讀取，最多讀到 PROBE_MAX_BYTES
+PROBE_BYTES = 512
+PROBE_MAX_BYTES = 128 * 1024
+
+# 帶有尺寸資訊的 JPEG SOF 標記（排除 DHT、JPG、DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# 第一個 spine 文件中的圖片引用（<img src>、SVG <image xlink:href>），依出現順序
+IMAGE_REFERENCE_PATTERN = re.compile(
+    r'''<(?:\w+:)?(?:img|image)\b[^>]*?\b(?:src|xlink:href|href)\s*=\s*["']([^"']+)["']''',
+    re.IGNORECASE)
+
+COVER_NAME_HINTS = ('cover', '封面', 'front')
+
+# 短邊小於此值的圖片視為圖示或裝飾，不列入候選
+MIN_COVER_SIDE = 100
+
+# 評分權重
+SCORE_FIRST_PAGE = 50
+SCORE_NAME_HINT = 30
+SCORE_PORTRAIT = 20
+SCORE_NEAR_PORTRAIT = 8
+SCORE_LANDSCAPE = -10
+SCORE_LARGE = 10
+SCORE_MAX_BYTES = 10
+LARGE_COVER_WIDTH = 400
+BYTES_PER_POINT = 50 * 1024
+
+
+def _probe_jpeg(data: bytearray, f: BinaryIO, max_bytes: int) -> Optional[Tuple[int, int]]:
+    """依序略過 JPEG 區段直到 SOF，回傳 (寬, 高)"""
+    pos = 2
+    while True:
+        while len(data) < pos + 9:
+            if len(data) >= max_bytes:
+                return None
+            chunk = f.read(min(PROBE_BYTES * 8, max_bytes - len(data)))
+            if not chunk:
+                return None
+            data.extend(chunk)
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 填充位元組
+            pos += 1
+        elif marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from('>HH', data, pos + 5)
+            return width, height
+        elif marker in (0xD9, 0xDA):
+            # 影像結束或開始壓縮資料，之後不會再有 SOF
+            return None
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+        else:
+            pos += 2 + struct.unpack_from('>H', data, pos + 2)[0]
+
+
+def probe_image(f: BinaryIO, max_bytes: int = PROBE_MAX_BYTES) -> Optional[Tuple[str, int, int]]:
+    """
+    只讀取檔頭取得圖片格式與尺寸
+
+    Returns:
+        (副檔名, 寬, 高)；無法辨識時為 None
+    """
+    header = f.read(PROBE_BYTES)
+    if header.startswith(b'\x89PNG\r\n\x1a\n') and header[12:16] == b'IHDR':
+        width, height = struct.unpack_from('>II', header, 16)
+        return '.png', width, height
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack_from('<HH', header, 6)
+        return '.gif', width, height
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP' and len(header) >= 30:
+        chunk = header[12:16]
+        if chunk == b'VP8X':
+            return ('.webp', 1 + int.from_bytes(header[24:27], 'little'),
+                    1 + int.from_bytes(header[27:30], 'little'))
+        if chunk == b'VP8L':
+            bits = int.from_bytes(header[21:25], 'little')
+            return '.webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8 ':
+            return ('.webp', int.from_bytes(header[26:28], 'little') & 0x3FFF,
+                    int.from_bytes(header[28:30], 'little') & 0x3FFF)
+        return None
+    if header.startswith(b'\xff\xd8'):
+        size = _probe_jpeg(bytearray(header), f, max_bytes)
+        if size is not None:
+            return ('.jpg',) + size
+    return None
+
+
+def _first_page_images(archive: EPUBArchive) -> List[str]:
+    """第一個 spine 文件中引用的圖片（正規化的 zip 成員名稱，依出現順序）"""
+    documents = archive.spine_documents()
+    if not documents:
+        return []
+    _, info = documents[0]
+    text = archive.read_member(info).decode('utf-8', errors='replace')
+    base_dir = posixpath.dirname(info.filename)
+    images = []
+    for ref in IMAGE_REFERENCE_PATTERN.findall(text):
+        parsed = urllib.parse.urlsplit(ref.strip())
+        if parsed.scheme or not parsed.path:
+            continue
+        name = normalize_member_name(posixpath.join(base_dir, parsed.path))
+        if name not in images:
+            images.append(name)
+    return images
+
+
+def _candidate_members(archive: EPUBArchive) -> List[zipfile.ZipInfo]:
+    """manifest 中的圖片，加上 zip 中未列在 manifest 的圖片檔"""
+    members = []
+    seen = set()
+    for item in archive.package.manifest:
+        if item['media_type'].startswith('image/') and item['media_type'] != 'image/svg+xml':
+            info = archive.resolve_href(item['href'])
+            if info is not None and info.filename not in seen:
+                seen.add(info.filename)
+                members.append(info)
+    for info in archive.zip.infolist():
+        _, ext = posixpath.splitext(info.filename.lower())
+        if ext in IMAGE_EXTENSIONS and info.filename not in seen and not info.is_dir():
+            seen.add(info.filename)
+            members.append(info)
+    return members
+
+
+def rank_cover_candidates(archive: EPUBArchive) -> List[Dict]:
+    """
+    為書中每張圖片評分，分數由高到低排序
+
+    評分依據：是否出現在第一個 spine 文件（越前面越高）、檔名是否含有 cover / 封面、
+    長寬比是否接近直式書封（高 / 寬 1.2 至 1.8）、尺寸與檔案大小。
+
+    Returns:
+        [{"member", "info", "ext", "width", "height", "score", "rule"}, ...]；
+        rule 為決定性的依據：'first_page'、'filename' 或 'probe'（只依尺寸與長寬比）
+    """
+    try:
+        first_page = _first_page_images(archive)
+    except LimitExceeded:
+        raise
+    except Exception:
+        # 第一個 spine 文件無法讀取時只依圖片本身評分
+        first_page = []
+    candidates = []
+    for info in _candidate_members(archive):
+        try:
+            with archive.open_member(info) as f:
+                probed = probe_image(f)
+        except LimitExceeded:
+            raise
+        except Exception:
+            # 無法讀取的圖片（例如壓縮資料損壞）不列入候選，繼續評分其他圖片
+            continue
+        if probed is None:
+            continue
+        ext, width, height = probed
+        if min(width, height) < MIN_COVER_SIDE:
+            continue
+
+        score = 0.0
+        rule = 'probe'
+        member = normalize_member_name(info.filename)
+        if member in first_page:
+            score += max(SCORE_FIRST_PAGE - 5 * first_page.index(member), SCORE_NAME_HINT + 1)
+            rule = 'first_page'
+        if any(hint in member.lower() for hint in COVER_NAME_HINTS):
+            score += SCORE_NAME_HINT
+            if rule == 'probe':
+                rule = 'filename'
+
+        aspect = height / width
+        if 1.2 <= aspect <= 1.8:
+            score += SCORE_PORTRAIT
+        elif 1.0 <= aspect <= 2.2:
+            score += SCORE_NEAR_PORTRAIT
+        elif aspect < 1.0:
+            score += SCORE_LANDSCAPE
+        if width >= LARGE_COVER_WIDTH:
+            score += SCORE_LARGE
+        score += min(SCORE_MAX_BYTES, info.file_size / BYTES_PER_POINT)
+
+        candidates.append({"member": info.filename, "info": info, "ext": ext,
+                           "width": width, "height": height,
+                           "score": round(score, 2), "rule": rule})
+
+    # 同分時保留 manifest / zip 中的先後順序
+    candidates.sort(key=lambda candidate: -candidate['score'])
+    return candidates
+
+
+def find_cover_fallback(archive: EPUBArchive) -> Optional[Dict]:
+    """回傳分數最高的封面候選（見 rank_cover_candidates），沒有可用圖片時為 None"""
+    candidates = rank_cover_candidates(archive)
+    return candidates[0] if candidates else None
+
+
+def select_cover(archive: EPUBArchive) -> Dict:
+    """
+    處理器使用的封面選擇：先依 OPF 標示的封面，找不到時改用備援評分
+
+    Returns:
+        {"href": OPF 標示的封面 href（沒有時為 None）, "href_missing": 標示的檔案是否不存在,
+         "info": 選出的 zip 成員（沒有時為 None）, "method": 選出封面的規則,
+         "candidate": 備援候選（使用備援規則時）}
+    """
+    package = archive.head
+    href, method = package.find_cover(package.metadata.get('cover_id'))
+    info = archive.resolve_href(href) if href else None
+    cover = {"href": href, "href_missing": bool(href) and info is None,
+             "info": info, "method": method, "candidate": None}
+    if info is None:
+        # 依圖片檔頭的尺寸、長寬比與在第一頁的位置評分，選出最可能的封面
+        candidate = find_cover_fallback(archive)
+        cover["candidate"] = candidate
+        if candidate is not None:
+            cover["info"], cover["method"] = candidate['info'], candidate['rule']
+        else:
+            cover["method"] = None
+    return cover
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+封面縮圖產生器 - 為每張封面產生固定寬度的 WebP / JPEG 縮圖
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from atomic_io import atomic_output, atomic_write_json
+from build_cache import file_sha256
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 為可選依賴
+    Image = None
+
+DEFAULT_WIDTHS = [160, 320, 640]
+DEFAULT_FORMATS = ['webp', 'jpeg']
+DEFAULT_QUALITY = 80
+
+# 輸出格式對應的 Pillow 格式名稱與副檔名
+FORMATS = {
+    'webp': ('WEBP', '.webp'),
+    'jpeg': ('JPEG', '.jpg'),
+}
+
+
+def pillow_available() -> bool:
+    return Image is not None
+
+
+class CoverThumbnailer:
+    def __init__(self, covers_dir: Path, state_dir: Path,
+                 widths: Sequence[int] = DEFAULT_WIDTHS,
+                 formats: Sequence[str] = DEFAULT_FORMATS,
+                 quality: int = DEFAULT_QUALITY):
+        """
+        初始化封面縮圖產生器
+
+        Args:
+            covers_dir: 封面圖片目錄，縮圖輸出至其下的 thumbs/
+            state_dir: 記錄來源封面雜湊的目錄，用於判斷是否需要重新產生
+            widths: 縮圖寬度（像素）
+            formats: 輸出格式（webp、jpeg）
+            quality: 壓縮品質（1-100）
+        """
+        unknown = [fmt for fmt in formats if fmt not in FORMATS]
+        if unknown:
+            raise ValueError(f"不支援的縮圖格式: {', '.join(unknown)}")
+
+        self.covers_dir = Path(covers_dir)
+        self.thumbs_dir = self.covers_dir / "thumbs"
+        self.state_dir = Path(state_dir)
+        self.widths = sorted(set(widths))
+        self.formats = list(formats)
+        self.quality = quality
+
+    def _settings(self) -> Dict:
+        return {"widths": self.widths, "formats": self.formats, "quality": self.quality}
+
+    def _load_state(self, state_file: Path) -> Optional[Dict]:
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def generate(self, book_id: str, cover_path: Path) -> List[Dict]:
+        """
+        為單張封面產生縮圖，來源封面與設定皆未變更時沿用既有縮圖
+
+        Returns:
+            縮圖資訊列表（url、format、width、height、bytes）
+        """
+        source_hash = file_sha256(cover_path)
+        state_file = self.state_dir / f"{book_id}.json"
+        state = self._load_state(state_file)
+
+        if (state and state.get('source_sha256') == source_hash
+                and state.get('settings') == self._settings()
+                and all((self.thumbs_dir / Path(d['url']).name).exists()
+                        for d in state.get('derivatives', []))):
+            return state['derivatives']
+
+        self.thumbs_dir.mkdir(parents=True, exist_ok=True)
+        derivatives = []
+
+        with Image.open(cover_path) as opened:
+            source = self._normalize_mode(opened)
+            # 不放大圖片：大於原圖的寬度一律以原圖寬度輸出（並去除重複）
+            widths = sorted({min(width, source.width) for width in self.widths})
+
+            for width in widths:
+                height = max(1, round(source.height * width / source.width))
+                resized = source.resize((width, height), Image.LANCZOS)
+
+                for fmt in self.formats:
+                    pil_format, ext = FORMATS[fmt]
+                    image = self._flatten(resized) if pil_format == 'JPEG' else resized
+
+                    filename = f"{book_id}.{width}{ext}"
+                    output_path = self.thumbs_dir / filename
+                    with atomic_output(output_path) as f:
+                        image.save(f, pil_format, quality=self.quality)
+
+                    derivatives.append({
+                        "url": f"covers/thumbs/{filename}",
+                        "format": fmt,
+                        "width": width,
+                        "height": height,
+                        "bytes": output_path.stat().st_size
+                    })
+
+        # 移除設定變更後不再使用的舊縮圖
+        if state:
+            current = {d['url'] for d in derivatives}
+            for old in state.get('derivatives', []):
+                if old['url'] not in current:
+                    try:
+                        (self.thumbs_dir / Path(old['url']).name).unlink()
+                    except FileNotFoundError:
+                        pass
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(state_file, {"source_sha256": source_hash, "settings": self._settings(),
+                                       "derivatives": derivatives})
+
+        return derivatives
+
+    @staticmethod
+    def _normalize_mode(image):
+        """將調色盤、灰階等模式轉為 RGB / RGBA，確保縮放品質"""
+        if image.mode in ('RGB', 'RGBA'):
+            return image.copy()
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        return image.convert('RGBA' if has_alpha else 'RGB')
+
+    @staticmethod
+    def _flatten(image):
+        """JPEG 不支援透明度，將圖片合成到白色背景上"""
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            return background
+        return image
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EPUB 封裝檢查 - 每個 EPUB 只開啟一次、每個成員只讀取一次
+"""
+
+import io
+import posixpath
+import shutil
+import struct
+from html.parser import HTMLParser
+import urllib.parse
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from atomic_io import atomic_output
+from resource_limits import ResourceBudget, ResourceLimits
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml 為可選依賴，未安裝時串流解析改用標準函式庫
+    lxml_etree = None
+
+# XML 命名空間
+NAMESPACES = {
+    'container': 'urn:oasis:names:tc:opendocument:xmlns:container',
+    'opf': 'http://www.idpf.org/2007/opf',
+    'dc': 'http://purl.org/dc/elements/1.1/'
+}
+
+# 需要保留的 Dublin Core 元數據欄位
+METADATA_TAGS = ['title', 'creator', 'subject', 'description',
+                 'publisher', 'date', 'language', 'identifier']
+
+EPUB_OPS_NAMESPACE = 'http://www.idpf.org/2007/ops'
+
+# zip 本地檔頭（local file header）的固定長度與格式
+LOCAL_HEADER_SIZE = 30
+LOCAL_HEADER_FORMAT = '<4s2B4HL2L2H'
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# 判斷圖片格式所需的檔頭長度
+SNIFF_BYTES = 16
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+
+# 串流解析 OPF 時每次讀取的位元組數
+OPF_CHUNK_SIZE = 16 * 1024
+
+
+def local_name(tag: str) -> str:
+    """移除 XML 標籤的命名空間前綴"""
+    return tag.split('}')[-1]
+
+
+def normalize_member_name(name: str) -> str:
+    """將 zip 成員名稱或 href 正規化（URL 解碼、統一分隔符號、解析 ./ 與 ../）"""
+    name = urllib.parse.unquote(name).replace('\\', '/')
+    name = posixpath.normpath(name).lstrip('/')
+    return '' if name == '.' else name
+
+
+def sniff_image_extension(header: bytes, fallback_name: str = '') -> str:
+    """根據檔頭判斷圖片格式，無法判斷時由檔名推測"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    elif header.startswith(b'\x89PNG'):
+        return '.png'
+    elif header.startswith(b'GIF'):
+        return '.gif'
+    elif header.startswith(b'RIFF') and b'WEBP' in header[:12]:
+        return '.webp'
+    _, ext = posixpath.splitext(fallback_name.lower())
+    return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+
+# 產生換行的區塊層級標籤，避免相鄰段落的文字黏在一起
+BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'td', 'th', 'section', 'article', 'blockquote',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'hr', 'dt', 'dd'}
+
+# 不屬於正文的標籤
+SKIPPED_TAGS = {'head', 'script', 'style', 'rt', 'rp'}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        tag = local_name(tag).lower()
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        if local_name(tag).lower() in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        tag = local_name(tag).lower()
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def xhtml_to_text(content: bytes) -> str:
+    """移除 XHTML 標記，取得正文文字（略過 head、script、style 與注音 ruby 文字）"""
+    extractor = _TextExtractor()
+    extractor.feed(content.decode('utf-8', errors='replace'))
+    extractor.close()
+    return ''.join(extractor.parts)
+
+
+class OPFPackage:
+    """一次解析 OPF 得到的 metadata、manifest 與 spine"""
+
+    def __init__(self, metadata: Dict, manifest: List[Dict], spine: List[str],
+                 toc_id: Optional[str] = None, partial: bool = False):
+        self.metadata = metadata
+        self.manifest = manifest
+        self.spine = spine
+        self.toc_id = toc_id
+        # 只解析到 manifest 結束（見 parse_opf_head），spine 與 toc_id 可能不完整
+        self.partial = partial
+        self.manifest_by_id: Dict[str, Dict] = {}
+        for item in manifest:
+            if item['id']:
+                self.manifest_by_id.setdefault(item['id'], item)
+
+    def find_cover(self, cover_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        在 manifest 中查找封面，回傳 (href, 查找方法)
+
+        查找方法依序為 'meta'（cover meta 指向的 id）、
+        'properties'（EPUB3 cover-image）與 'name'（圖片 id 或檔名含 cover）。
+        """
+        # 方法1: 通過 cover_id 查找
+        if cover_id:
+            item = self.manifest_by_id.get(cover_id)
+            if item is not None:
+                return item['href'], 'meta'
+
+        # 方法2: 查找 properties="cover-image" 的項目 (EPUB3)
+        for item in self.manifest:
+            if 'cover-image' in item['properties']:
+                return item['href'], 'properties'
+
+        # 方法3: 查找常見的封面檔案名稱或 ID
+        cover_patterns = ['cover', 'Cover', 'COVER']
+        for item in self.manifest:
+            if item['media_type'].startswith('image/'):
+                for pattern in cover_patterns:
+                    if pattern in item['id'] or pattern in item['href']:
+                        return item['href'], 'name'
+
+        return None, None
+
+
+def _read_metadata_entry(elem, metadata: Dict) -> None:
+    tag_name = local_name(elem.tag)
+    if tag_name in METADATA_TAGS:
+        if elem.text:
+            metadata[tag_name] = elem.text.strip()
+    elif tag_name == 'meta':
+        # 處理 meta 標籤
+        name = elem.get('name', '')
+        content = elem.get('content', '')
+        if name == 'cover' and content:
+            metadata['cover_id'] = content
+
+
+def _read_manifest_item(item) -> Dict:
+    return {
+        'id': item.get('id', ''),
+        'href': item.get('href', ''),
+        'media_type': item.get('media-type', ''),
+        'properties': item.get('properties', '')
+    }
+
+
+def parse_opf_package(opf_content: bytes) -> OPFPackage:
+    """解析 OPF 檔案，一次取得 metadata、manifest 與 spine"""
+    root = ET.fromstring(opf_content)
+    metadata: Dict = {}
+    manifest: List[Dict] = []
+    spine: List[str] = []
+    toc_id = None
+
+    for section in root:
+        section_name = local_name(section.tag)
+
+        if section_name == 'metadata':
+            for elem in section:
+                _read_metadata_entry(elem, metadata)
+
+        elif section_name == 'manifest':
+            for item in section:
+                if local_name(item.tag) == 'item':
+                    manifest.append(_read_manifest_item(item))
+
+        elif section_name == 'spine':
+            toc_id = section.get('toc')
+            for itemref in section:
+                if local_name(itemref.tag) == 'itemref' and itemref.get('idref'):
+                    spine.append(itemref.get('idref'))
+
+    return OPFPackage(metadata, manifest, spine, toc_id)
+
+
+def _pull_parser():
+    if lxml_etree is not None:
+        # 不展開外部實體、不連網，避免惡意 OPF
+        return lxml_etree.XMLPullParser(events=('start', 'end'), resolve_entities=False,
+                                        no_network=True)
+    return ET.XMLPullParser(events=('start', 'end'))
+
+
+def parse_opf_head(source: Union[bytes, BinaryIO]) -> OPFPackage:
+    """
+    串流解析 OPF，只取得 metadata 與 manifest
+
+    逐段讀取 source（OPF 內容或 zip 成員串流）並增量解析，處理完的元素立即清除，
+    metadata 與 manifest 都解析完畢後就停止讀取，不解析 spine 與 guide。
+    有安裝 lxml 時使用 lxml，否則使用標準函式庫。
+
+    Returns:
+        partial 為 True 的 OPFPackage（提前停止時 spine 為空）；
+        OPF 的區段順序不尋常而讀到檔尾時，結果與 parse_opf_package 相同
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    parser = _pull_parser()
+    metadata: Dict = {}
+    manifest: List[Dict] = []
+    spine: List[str] = []
+    toc_id = None
+    seen = set()
+    path = []
+
+    while not {'metadata', 'manifest'} <= seen:
+        chunk = source.read(OPF_CHUNK_SIZE)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        for event, elem in parser.read_events():
+            if event == 'start':
+                path.append(elem)
+                if len(path) == 2 and local_name(elem.tag) == 'spine':
+                    toc_id = elem.get('toc')
+                continue
+
+            path.pop()
+            if len(path) == 2:
+                section = local_name(path[1].tag)
+                if section == 'metadata':
+                    _read_metadata_entry(elem, metadata)
+                elif section == 'manifest' and local_name(elem.tag) == 'item':
+                    manifest.append(_read_manifest_item(elem))
+                elif (section == 'spine' and local_name(elem.tag) == 'itemref'
+                      and elem.get('idref')):
+                    spine.append(elem.get('idref'))
+            elif len(path) == 1:
+                seen.add(local_name(elem.tag))
+                if {'metadata', 'manifest'} <= seen:
+                    # 同一段資料中其餘的事件（spine、guide）不再處理
+                    break
+            else:
+                continue
+            # 已處理的元素從父元素移除，樹的大小不隨 manifest 項目數增加
+            elem.clear()
+            path[-1].remove(elem)
+        if not chunk and not {'metadata', 'manifest'} <= seen:
+            return OPFPackage(metadata, manifest, spine, toc_id)
+
+    return OPFPackage(metadata, manifest, spine, toc_id, partial=True)
+
+
+class EPUBArchive:
+    def __init__(self, epub_file: Path, limits: Optional[ResourceLimits] = None):
+        """
+        開啟 EPUB 並從 zip 中央目錄建立一次性的成員索引
+
+        Args:
+            epub_file: EPUB 檔案路徑
+            limits: 資源限制；超出時拋出 LimitExceeded（None 表示不限制）
+        """
+        self.epub_file = Path(epub_file)
+        self.budget: Optional[ResourceBudget] = None
+        if limits is not None:
+            limits.check_file(self.epub_file)
+        self.zip = zipfile.ZipFile(self.epub_file, 'r')
+        if limits is not None:
+            try:
+                limits.check_archive(self.zip.infolist())
+            except BaseException:
+                self.zip.close()
+                raise
+            self.budget = limits.budget()
+        self.members: Dict[str, zipfile.ZipInfo] = {}
+        self.members_casefold: Dict[str, zipfile.ZipInfo] = {}
+        for info in self.zip.infolist():
+            if info.is_dir():
+                continue
+            key = normalize_member_name(info.filename)
+            self.members.setdefault(key, info)
+            self.members_casefold.setdefault(key.lower(), info)
+
+        self._opf_path: Optional[str] = None
+        self._package: Optional[OPFPackage] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        self.zip.close()
+
+    def pause_clock(self) -> None:
+        """暫停處理時間限制的計時（等待其他書籍時不計入）"""
+        if self.budget is not None:
+            self.budget.pause()
+
+    def resume_clock(self) -> None:
+        if self.budget is not None:
+            self.budget.resume()
+
+    def get_member(self, name: str) -> Optional[zipfile.ZipInfo]:
+        """以正規化名稱查找 zip 成員（大小寫不符時仍可找到）"""
+        key = normalize_member_name(name)
+        info = self.members.get(key)
+        if info is None:
+            info = self.members_casefold.get(key.lower())
+        return info
+
+    def open_member(self, info: zipfile.ZipInfo) -> BinaryIO:
+        """以串流方式開啟成員（有資源限制時讀取量計入用量）"""
+        f = self.zip.open(info)
+        if self.budget is not None:
+            return self.budget.open(f, info)
+        return f
+
+    def read_member(self, info: zipfile.ZipInfo) -> bytes:
+        if self.budget is None:
+            return self.zip.read(info)
+        with self.open_member(info) as f:
+            return f.read()
+
+    @property
+    def opf_path(self) -> Optional[str]:
+        """從 META-INF/container.xml 獲取 content.opf 路徑"""
+        if self._opf_path is None:
+            info = self.get_member('META-INF/container.xml')
+            if info is None:
+                raise KeyError("There is no item named 'META-INF/container.xml' in the archive")
+            container_root = ET.fromstring(self.read_member(info))
+
+            # 查找 rootfile 元素（有無命名空間皆可）
+            for elem in container_root.iter():
+                if local_name(elem.tag) == 'rootfile' and elem.get('full-path'):
+                    self._opf_path = elem.get('full-path')
+                    break
+        return self._opf_path
+
+    @property
+    def opf_dir(self) -> str:
+        return posixpath.dirname(self.opf_path or '')
+
+    def opf_member(self) -> zipfile.ZipInfo:
+        info = self.get_member(self.opf_path) if self.opf_path else None
+        if info is None:
+            raise KeyError(f"There is no item named '{self.opf_path}' in the archive")
+        return info
+
+    def read_opf(self) -> bytes:
+        """讀取 OPF 原始內容"""
+        return self.read_member(self.opf_member())
+
+    def open_opf(self) -> BinaryIO:
+        """以串流方式開啟 OPF（供 parse_opf_head 使用）"""
+        return self.open_member(self.opf_member())
+
+    @property
+    def package(self) -> OPFPackage:
+        """讀取並解析 OPF（只解析一次；先前只串流解析了開頭時重新完整解析）"""
+        if self._package is None or self._package.partial:
+            self._package = parse_opf_package(self.read_opf())
+        return self._package
+
+    @property
+    def head(self) -> OPFPackage:
+        """OPF 的 metadata 與 manifest（尚未解析時只串流解析到 manifest 結束）"""
+        if self._package is None:
+            with self.open_opf() as f:
+                self._package = parse_opf_head(f)
+        return self._package
+
+    @package.setter
+    def package(self, package: OPFPackage) -> None:
+        # 由外部（例如在其他執行緒或行程中）解析好的 OPF
+        self._package = package
+
+    def resolve_href(self, href: str, base_dir: Optional[str] = None) -> Optional[zipfile.ZipInfo]:
+        """將相對 href 解析為 zip 成員（預設相對於 OPF 所在目錄）"""
+        if base_dir is None:
+            base_dir = self.opf_dir
+        candidates = [
+            posixpath.join(base_dir, href),
+            href,
+            f"OEBPS/{href}",
+            f"EPUB/{href}"
+        ]
+        for candidate in candidates:
+            info = self.get_member(candidate)
+            if info is not None:
+                return info
+        return None
+
+    def spine_documents(self) -> List[Tuple[Dict, zipfile.ZipInfo]]:
+        """依閱讀順序列出 spine 中的文件（manifest 項目與對應的 zip 成員）"""
+        documents = []
+        for idref in self.package.spine:
+            item = self.package.manifest_by_id.get(idref)
+            if item is None:
+                continue
+            info = self.resolve_href(item['href'])
+            if info is not None:
+                documents.append((item, info))
+        return documents
+
+    def data_offset(self, info: zipfile.ZipInfo) -> int:
+        """
+        計算成員壓縮資料在 EPUB 檔案中的起始位置
+
+        本地檔頭的 extra 欄位長度可能與中央目錄不同，因此需讀取本地檔頭。
+        """
+        with open(self.epub_file, 'rb') as f:
+            f.seek(info.header_offset)
+            header = f.read(LOCAL_HEADER_SIZE)
+        fields = struct.unpack(LOCAL_HEADER_FORMAT, header)
+        if fields[0] != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"本地檔頭損壞: {info.filename}")
+        filename_length, extra_length = fields[-2], fields[-1]
+        return info.header_offset + LOCAL_HEADER_SIZE + filename_length + extra_length
+
+    def _resolve_toc_href(self, href: str, base_dir: str) -> Tuple[Optional[str], str]:
+        """將目錄中的連結解析為 (zip 成員名稱, 錨點)"""
+        path, _, fragment = href.partition('#')
+        if not path:
+            return None, fragment
+        info = self.get_member(posixpath.join(base_dir, path))
+        return (info.filename if info is not None else None), fragment
+
+    def _parse_nav_list(self, ol, base_dir: str) -> List[Dict]:
+        entries = []
+        for li in ol:
+            if local_name(li.tag) != 'li':
+                continue
+            entry = {"title": "", "href": "", "member": None, "fragment": "", "children": []}
+            for child in li:
+                name = local_name(child.tag)
+                if name in ('a', 'span') and not entry['title']:
+                    entry['title'] = ' '.join(''.join(child.itertext()).split())
+                    href = child.get('href', '')
+                    if href:
+                        entry['href'] = href
+                        entry['member'], entry['fragment'] = self._resolve_toc_href(href, base_dir)
+                elif name == 'ol':
+                    entry['children'] = self._parse_nav_list(child, base_dir)
+            entries.append(entry)
+        return entries
+
+    def _parse_nav_document(self, content: bytes, base_dir: str) -> Optional[List[Dict]]:
+        """解析 EPUB3 導覽文件中 epub:type="toc" 的 nav"""
+        root = ET.fromstring(content)
+        for nav in root.iter():
+            if local_name(nav.tag) != 'nav':
+                continue
+            if 'toc' not in nav.get(f'{{{EPUB_OPS_NAMESPACE}}}type', '').split():
+                continue
+            for child in nav:
+                if local_name(child.tag) == 'ol':
+                    return self._parse_nav_list(child, base_dir)
+        return None
+
+    def _parse_ncx_points(self, parent, base_dir: str) -> List[Dict]:
+        entries = []
+        for point in parent:
+            if local_name(point.tag) != 'navPoint':
+                continue
+            entry = {"title": "", "href": "", "member": None, "fragment": "", "children": []}
+            for child in point:
+                name = local_name(child.tag)
+                if name == 'navLabel':
+                    entry['title'] = ' '.join(''.join(child.itertext()).split())
+                elif name == 'content':
+                    entry['href'] = child.get('src', '')
+                    entry['member'], entry['fragment'] = self._resolve_toc_href(entry['href'], base_dir)
+            entry['children'] = self._parse_ncx_points(point, base_dir)
+            entries.append(entry)
+        return entries
+
+    def _parse_ncx_document(self, content: bytes, base_dir: str) -> Optional[List[Dict]]:
+        """解析 EPUB2 的 NCX 目錄"""
+        root = ET.fromstring(content)
+        for nav_map in root.iter():
+            if local_name(nav_map.tag) == 'navMap':
+                return self._parse_ncx_points(nav_map, base_dir)
+        return None
+
+    def table_of_contents(self) -> Tuple[List[Dict], Optional[str]]:
+        """
+        讀取目錄樹，優先使用 EPUB3 導覽文件，失敗時改用 NCX
+
+        Returns:
+            (目錄樹, 來源成員名稱)；每個節點包含 title、href、member、fragment、children
+        """
+        package = self.package
+        sources = [(item, self._parse_nav_document) for item in package.manifest
+                   if 'nav' in item['properties'].split()]
+        ncx_item = package.manifest_by_id.get(package.toc_id or '')
+        if ncx_item is None:
+            ncx_item = next((item for item in package.manifest
+                             if item['media_type'] == 'application/x-dtbncx+xml'), None)
+        if ncx_item is not None:
+            sources.append((ncx_item, self._parse_ncx_document))
+
+        for item, parse in sources:
+            info = self.resolve_href(item['href'])
+            if info is None:
+                continue
+            try:
+                toc = parse(self.read_member(info), posixpath.dirname(info.filename))
+            except ET.ParseError:
+                continue
+            if toc:
+                return toc, info.filename
+        return [], None
+
+    def sniff_image_extension(self, info: zipfile.ZipInfo) -> str:
+        """只讀取檔頭判斷圖片格式"""
+        with self.open_member(info) as f:
+            header = f.read(SNIFF_BYTES)
+        return sniff_image_extension(header, info.filename)
+
+    def extract_member(self, info: zipfile.ZipInfo, output_path: Path) -> None:
+        """將 zip 成員以串流方式寫入磁碟（先寫暫存檔再取代，不會留下寫到一半的檔案）"""
+        with self.open_member(info) as src, atomic_output(output_path) as dst:
+            shutil.copyfileobj(src, dst)
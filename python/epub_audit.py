@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EPUB 語料檢查工具 - 一次並行掃描整個 epub3/，輸出每本書的結構化診斷報告
+
+取代 inspect_epub.py、inspect_problematic.py 與 check_missing_covers.py：
+container 與 OPF 是否有效、封面由哪個規則選出、圖片清單、manifest 與 zip 不一致的項目、
+超出資源限制的成員以及解析時間。封裝、OPF 與封面的判斷都沿用處理器的程式碼，
+診斷結果與實際處理一致。
+
+使用方式:
+    python epub_audit.py                          # 檢查 ../epub3，輸出 audit-report.json
+    python epub_audit.py --epub-dir DIR -j 8 --output report.json
+"""
+
+import argparse
+import functools
+import os
+import posixpath
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from atomic_io import atomic_write_json
+from cover_probe import probe_image, select_cover
+from epub_archive import IMAGE_EXTENSIONS, EPUBArchive, normalize_member_name
+from resource_limits import DEFAULT_MAX_MEMBER_BYTES, DEFAULT_MAX_RATIO, LimitExceeded, ResourceLimits
+
+# 報告格式改變時遞增
+AUDIT_VERSION = 1
+
+# 不需要列在 manifest 中的成員
+UNLISTED_MEMBERS = {'mimetype', 'META-INF/container.xml'}
+
+# 每本書的問題類型（用於摘要與問題書籍列表）
+ISSUE_LABELS = {
+    "unreadable": "無法讀取檔案",
+    "invalid_zip": "不是有效的 zip",
+    "over_limit": "超出資源限制",
+    "invalid_container": "container.xml 無效",
+    "invalid_opf": "OPF 無效",
+    "missing_metadata": "缺少 metadata",
+    "invalid_images": "無法列出圖片",
+    "missing_cover": "找不到封面",
+    "fallback_cover": "封面由備援規則選出",
+    "missing_from_zip": "manifest 項目不在 zip 中",
+    "not_in_manifest": "zip 成員未列在 manifest",
+    "oversized": "成員超出大小或壓縮比限制",
+}
+
+
+def _image_inventory(archive: EPUBArchive, manifest_members: set) -> List[Dict]:
+    images = []
+    for info in archive.zip.infolist():
+        _, ext = posixpath.splitext(info.filename.lower())
+        if info.is_dir() or ext not in IMAGE_EXTENSIONS:
+            continue
+        with archive.open_member(info) as f:
+            probed = probe_image(f)
+        images.append({
+            "member": info.filename,
+            "format": probed[0] if probed else None,
+            "width": probed[1] if probed else None,
+            "height": probed[2] if probed else None,
+            "bytes": info.file_size,
+            "in_manifest": normalize_member_name(info.filename) in manifest_members,
+        })
+    return images
+
+
+def audit_epub(epub_file: Path, limits: ResourceLimits) -> Dict:
+    """檢查單本 EPUB，回傳結構化報告（不會拋出例外）"""
+    epub_file = Path(epub_file)
+    start = time.perf_counter()
+    report = {
+        "file": epub_file.name,
+        "bytes": None,
+        "container": {"valid": False, "opf_path": None},
+        "opf": {"valid": False, "manifest_items": 0, "spine_items": 0, "parse_ms": None},
+        "metadata": {},
+        "cover": {"method": None, "member": None, "declared_href": None},
+        "images": [],
+        "missing_from_zip": [],
+        "not_in_manifest": [],
+        "oversized": [],
+        "errors": [],
+        "issues": [],
+    }
+
+    def finish() -> Dict:
+        report["seconds"] = round(time.perf_counter() - start, 6)
+        return report
+
+    try:
+        report["bytes"] = epub_file.stat().st_size
+        limits.check_file(epub_file)
+        archive = EPUBArchive(epub_file)
+    except LimitExceeded as e:
+        report["errors"].append(str(e))
+        report["issues"].append("over_limit")
+        return finish()
+    except OSError as e:
+        # 檢查期間檔案被移除或沒有讀取權限
+        report["errors"].append(f"無法讀取檔案: {e}")
+        report["issues"].append("unreadable")
+        return finish()
+    except Exception as e:
+        report["errors"].append(f"無法開啟: {e}")
+        report["issues"].append("invalid_zip")
+        return finish()
+
+    with archive:
+        # 超出大小或壓縮比限制的成員（處理器會略過這本書）
+        for info in archive.zip.infolist():
+            try:
+                limits.check_member(info)
+            except LimitExceeded as e:
+                report["oversized"].append({"member": info.filename, "bytes": info.file_size,
+                                            "compress_size": info.compress_size,
+                                            "reason": str(e)})
+        if report["oversized"]:
+            report["issues"].append("oversized")
+        try:
+            limits.check_archive(archive.zip.infolist())
+        except LimitExceeded as e:
+            report["errors"].append(str(e))
+            report["issues"].append("over_limit")
+
+        try:
+            report["container"]["opf_path"] = archive.opf_path
+            report["container"]["valid"] = bool(archive.opf_path)
+        except Exception as e:
+            report["errors"].append(f"無法讀取 container.xml: {e}")
+        if not report["container"]["valid"]:
+            report["issues"].append("invalid_container")
+            return finish()
+
+        parse_start = time.perf_counter()
+        try:
+            package = archive.package
+        except Exception as e:
+            report["errors"].append(f"解析 OPF 失敗: {e}")
+            report["issues"].append("invalid_opf")
+            return finish()
+        report["opf"].update(valid=True, manifest_items=len(package.manifest),
+                             spine_items=len(package.spine),
+                             parse_ms=round((time.perf_counter() - parse_start) * 1000, 3))
+        report["metadata"] = package.metadata
+        if not package.metadata:
+            report["issues"].append("missing_metadata")
+
+        # manifest 與 zip 內容比對
+        manifest_members = set()
+        for item in package.manifest:
+            info = archive.resolve_href(item['href'])
+            if info is None:
+                report["missing_from_zip"].append(item['href'])
+            else:
+                manifest_members.add(normalize_member_name(info.filename))
+        opf_member = normalize_member_name(archive.opf_member().filename)
+        for name in archive.members:
+            if name not in manifest_members and name not in UNLISTED_MEMBERS and name != opf_member:
+                report["not_in_manifest"].append(name)
+        if report["missing_from_zip"]:
+            report["issues"].append("missing_from_zip")
+        if report["not_in_manifest"]:
+            report["issues"].append("not_in_manifest")
+
+        try:
+            report["images"] = _image_inventory(archive, manifest_members)
+        except Exception as e:
+            report["errors"].append(f"列出圖片失敗: {e}")
+            report["issues"].append("invalid_images")
+
+        try:
+            cover = select_cover(archive)
+        except Exception as e:
+            report["errors"].append(f"查找封面失敗: {e}")
+            report["issues"].append("missing_cover")
+            return finish()
+        report["cover"].update(method=cover['method'], declared_href=cover['href'],
+                               member=cover['info'].filename if cover['info'] else None)
+        if cover['info'] is None:
+            report["issues"].append("missing_cover")
+        elif cover['candidate'] is not None:
+            report["issues"].append("fallback_cover")
+
+    return finish()
+
+
+def audit_corpus(epub_files: List[Path], limits: ResourceLimits, workers: int = 1) -> List[Dict]:
+    """並行檢查所有 EPUB，結果依檔名排序"""
+    audit = functools.partial(audit_epub, limits=limits)
+    if workers > 1 and len(epub_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(epub_files))) as executor:
+            # 每批多本書，減少行程間傳輸的次數
+            chunksize = max(1, len(epub_files) // (workers * 8))
+            return list(executor.map(audit, epub_files, chunksize=chunksize))
+    return [audit(epub_file) for epub_file in epub_files]
+
+
+def summarize(reports: List[Dict]) -> Dict:
+    """彙整各問題類型、封面規則與解析時間"""
+    issues: Dict[str, int] = {}
+    cover_methods: Dict[str, int] = {}
+    for report in reports:
+        for issue in report["issues"]:
+            issues[issue] = issues.get(issue, 0) + 1
+        method = report["cover"]["method"] or "none"
+        cover_methods[method] = cover_methods.get(method, 0) + 1
+    parse_times = [report["opf"]["parse_ms"] for report in reports
+                   if report["opf"]["parse_ms"] is not None]
+    return {
+        "books": len(reports),
+        "books_with_issues": sum(1 for report in reports if report["issues"]),
+        "issues": dict(sorted(issues.items(), key=lambda item: -item[1])),
+        "cover_methods": dict(sorted(cover_methods.items(), key=lambda item: -item[1])),
+        "images": sum(len(report["images"]) for report in reports),
+        "opf_parse_ms_total": round(sum(parse_times), 3),
+        "opf_parse_ms_max": max(parse_times) if parse_times else None,
+    }
+
+
+def format_summary(summary: Dict, reports: List[Dict], limit: int = 50) -> str:
+    """將摘要與有問題的書籍排版成表格"""
+    lines = [f"書籍: {summary['books']}，有問題: {summary['books_with_issues']}，"
+             f"圖片: {summary['images']}，OPF 解析合計 {summary['opf_parse_ms_total']:.1f} ms"]
+    lines.append(f"{'封面規則':<20}{'書籍數':>8}")
+    for method, count in summary["cover_methods"].items():
+        lines.append(f"{method:<24}{count:>8}")
+    if summary["issues"]:
+        lines.append(f"{'問題':<20}{'書籍數':>8}")
+        for issue, count in summary["issues"].items():
+            lines.append(f"{ISSUE_LABELS.get(issue, issue):<20}{count:>8}")
+
+    problems = [report for report in reports if report["issues"]]
+    if problems:
+        lines.append("")
+        lines.append("有問題的書籍:")
+        for report in problems[:limit]:
+            labels = "、".join(ISSUE_LABELS.get(issue, issue) for issue in report["issues"])
+            lines.append(f"  {report['file']}: {labels}")
+            for error in report["errors"]:
+                lines.append(f"      {error}")
+        if len(problems) > limit:
+            lines.append(f"  ……另有 {len(problems) - limit} 本，詳見 JSON 報告")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    default_epub_dir = Path(__file__).parent.parent / "epub3"
+    parser = argparse.ArgumentParser(description="一次並行檢查所有 EPUB，輸出結構化診斷報告")
+    parser.add_argument("--epub-dir", type=Path, default=default_epub_dir,
+                        help=f"EPUB 目錄（預設 {default_epub_dir}）")
+    parser.add_argument("-j", "--jobs", type=int, default=0, metavar="N",
+                        help="並行行程數（預設 0，表示使用全部 CPU 核心）")
+    parser.add_argument("--output", type=Path, default=Path("audit-report.json"),
+                        help="JSON 報告輸出檔案（預設 audit-report.json）")
+    parser.add_argument("--max-member-mb", type=int, default=DEFAULT_MAX_MEMBER_BYTES // (1024 * 1024),
+                        metavar="MB", help="回報超過此大小的成員（與處理器預設相同）")
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO, metavar="N",
+                        help="回報壓縮比超過此值的成員（與處理器預設相同）")
+    parser.add_argument("--limit", type=int, default=50, metavar="N",
+                        help="摘要中最多列出幾本有問題的書籍（預設 50）")
+    args = parser.parse_args(argv)
+
+    epub_files = sorted(args.epub_dir.glob("*.epub"))
+    if not epub_files:
+        print(f"✗ 在 {args.epub_dir} 中沒有找到 EPUB 檔案")
+        return 1
+
+    workers = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    limits = ResourceLimits(max_member_bytes=args.max_member_mb * 1024 * 1024 or None,
+                            max_ratio=args.max_ratio or None)
+    print(f"檢查 {len(epub_files)} 個 EPUB 檔案（{workers} 個行程）")
+    start = time.perf_counter()
+    reports = audit_corpus(epub_files, limits, workers)
+    summary = summarize(reports)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+
+    print(format_summary(summary, reports, args.limit))
+    atomic_write_json(args.output, {"audit_version": AUDIT_VERSION,
+                                    "epub_dir": str(args.epub_dir),
+                                    "summary": summary,
+                                    "books": reports})
+    print(f"✓ 報告已寫入 {args.output}（{summary['seconds']:.2f} 秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
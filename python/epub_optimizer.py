@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EPUB 重新封裝最佳化 - 在不影響閱讀的前提下縮小 EPUB 下載大小
+
+- 所有成員以最高壓縮等級重新 deflate，mimetype 依規範以不壓縮方式放在第一個
+- 移除 manifest 中沒有被 spine、導覽文件、封面或其他文件引用的項目
+- 超過大小預算的 PNG / JPEG 圖片重新壓縮（需要 Pillow），只在結果較小時採用
+"""
+
+import io
+import json
+import posixpath
+import re
+import urllib.parse
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Set
+
+from atomic_io import atomic_output, atomic_write_json
+from build_cache import file_sha256
+from epub_archive import EPUBArchive, normalize_member_name
+from resource_limits import ResourceLimits
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 為可選依賴
+    Image = None
+
+DEFAULT_IMAGE_QUALITY = 85
+DEFAULT_MAX_IMAGE_BYTES = 300 * 1024
+DEFAULT_MAX_IMAGE_DIMENSION = 2048
+
+# 需要掃描其中引用的文件類型
+REFERENCING_MEDIA_TYPES = {'application/xhtml+xml', 'text/html', 'text/css',
+                           'image/svg+xml', 'application/x-dtbncx+xml'}
+
+ATTRIBUTE_REFERENCE_PATTERN = re.compile(
+    r'''(?:href|src|poster|data|xlink:href)\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+CSS_REFERENCE_PATTERN = re.compile(
+    r'''url\(\s*["']?([^"')]+)["']?\s*\)|@import\s+["']([^"']+)["']''', re.IGNORECASE)
+MANIFEST_ITEM_PATTERN = re.compile(
+    r'<(?:\w+:)?item\b[^>]*?(?:/>|>\s*</(?:\w+:)?item>)\s*', re.DOTALL)
+ID_ATTRIBUTE_PATTERN = re.compile(r'''\bid\s*=\s*["']([^"']*)["']''')
+GUIDE_REFERENCE_PATTERN = re.compile(
+    r'''<(?:\w+:)?reference\b[^>]*?\bhref\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+
+# 最佳化結果格式或規則改變時遞增，舊的快取結果會被重新產生
+OPTIMIZER_VERSION = 1
+
+
+def local_references(content: bytes, base_dir: str,
+                     pattern=ATTRIBUTE_REFERENCE_PATTERN) -> Set[str]:
+    """找出文件中引用的本地檔案（已正規化的 zip 成員名稱）"""
+    text = content.decode('utf-8', errors='replace')
+    raw_refs = pattern.findall(text)
+    if pattern is ATTRIBUTE_REFERENCE_PATTERN:
+        for url, imported in CSS_REFERENCE_PATTERN.findall(text):
+            raw_refs.append(url or imported)
+
+    references = set()
+    for ref in raw_refs:
+        ref = ref.strip()
+        parsed = urllib.parse.urlsplit(ref)
+        if parsed.scheme or ref.startswith(('//', '#')) or not parsed.path:
+            continue
+        references.add(normalize_member_name(posixpath.join(base_dir, parsed.path)))
+    return references
+
+
+class EPUBOptimizer:
+    def __init__(self, output_dir: Path, state_dir: Path,
+                 image_quality: int = DEFAULT_IMAGE_QUALITY,
+                 max_image_bytes: int = DEFAULT_MAX_IMAGE_BYTES,
+                 max_image_dimension: int = DEFAULT_MAX_IMAGE_DIMENSION,
+                 limits: Optional[ResourceLimits] = None):
+        """
+        初始化 EPUB 最佳化器
+
+        Args:
+            output_dir: 最佳化後 EPUB 的輸出目錄
+            state_dir: 記錄來源雜湊與最佳化結果的目錄
+            image_quality: 重新壓縮 JPEG 時的品質
+            max_image_bytes: 圖片大小預算，超過時才嘗試重新壓縮
+            max_image_dimension: 重新壓縮時圖片長邊的上限（像素）
+            limits: 讀取 EPUB 時的資源限制
+        """
+        self.output_dir = Path(output_dir)
+        self.state_dir = Path(state_dir)
+        self.image_quality = image_quality
+        self.max_image_bytes = max_image_bytes
+        self.max_image_dimension = max_image_dimension
+        self.limits = limits
+
+    def _settings(self) -> Dict:
+        return {"version": OPTIMIZER_VERSION, "image_quality": self.image_quality,
+                "max_image_bytes": self.max_image_bytes,
+                "max_image_dimension": self.max_image_dimension,
+                "pillow": Image is not None}
+
+    def optimize(self, epub_file: Path) -> Dict:
+        """
+        最佳化單一 EPUB，來源內容與設定皆未變更時沿用上次結果
+
+        Returns:
+            最佳化報告（原始與最佳化後大小、移除的項目、重新壓縮的圖片）
+        """
+        output_file = self.output_dir / epub_file.name
+        state_file = self.state_dir / f"{epub_file.stem}.json"
+        source_hash = file_sha256(epub_file)
+
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('source_sha256') == source_hash
+                    and state.get('settings') == self._settings()
+                    and output_file.exists()
+                    and output_file.stat().st_size == state['report']['optimized_bytes']):
+                return dict(state['report'], cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_output(output_file) as f:
+            report = self._rewrite(epub_file, f)
+
+        report.update({
+            "book": epub_file.name,
+            "original_bytes": epub_file.stat().st_size,
+            "optimized_bytes": output_file.stat().st_size,
+        })
+        report["saved_bytes"] = report["original_bytes"] - report["optimized_bytes"]
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(state_file, {"source_sha256": source_hash, "settings": self._settings(),
+                                       "report": report})
+        return dict(report, cached=False)
+
+    def _referenced_members(self, archive: EPUBArchive) -> Set[str]:
+        """從 spine、導覽文件與封面出發，找出所有被引用到的 zip 成員"""
+        package = archive.package
+        roots = []
+        for idref in package.spine:
+            item = package.manifest_by_id.get(idref)
+            if item is not None:
+                roots.append(item)
+        for item in package.manifest:
+            properties = item['properties'].split()
+            if 'nav' in properties or 'cover-image' in properties:
+                roots.append(item)
+        item = package.manifest_by_id.get(package.toc_id or '')
+        if item is not None:
+            roots.append(item)
+        cover_href, _ = package.find_cover(package.metadata.get('cover_id'))
+        if cover_href:
+            roots.append({"href": cover_href})
+
+        media_types = {}
+        for item in package.manifest:
+            info = archive.resolve_href(item['href'])
+            if info is not None:
+                media_types[normalize_member_name(info.filename)] = item['media_type']
+
+        referenced: Set[str] = set()
+        queue: List[str] = []
+        for item in roots:
+            info = archive.resolve_href(item['href'])
+            if info is not None:
+                queue.append(normalize_member_name(info.filename))
+        # OPF 2.0 guide 中引用的文件（封面頁、目錄頁等）同樣保留
+        opf_content = archive.read_member(archive.get_member(archive.opf_path))
+        queue.extend(local_references(opf_content, archive.opf_dir, GUIDE_REFERENCE_PATTERN))
+
+        while queue:
+            info = archive.get_member(queue.pop())
+            if info is None:
+                continue
+            member = normalize_member_name(info.filename)
+            if member in referenced:
+                continue
+            referenced.add(member)
+            if media_types.get(member) in REFERENCING_MEDIA_TYPES:
+                queue.extend(local_references(archive.read_member(info),
+                                              posixpath.dirname(member)))
+        return referenced
+
+    def _remove_manifest_items(self, opf_content: bytes, item_ids: Set[str]) -> bytes:
+        """以文字方式從 OPF 移除指定 id 的 manifest 項目，保留原有的格式與命名空間前綴"""
+        text = opf_content.decode('utf-8')
+
+        def replace(match):
+            id_match = ID_ATTRIBUTE_PATTERN.search(match.group())
+            return '' if id_match and id_match.group(1) in item_ids else match.group()
+
+        return MANIFEST_ITEM_PATTERN.sub(replace, text).encode('utf-8')
+
+    def _recompress_image(self, data: bytes, ext: str) -> Optional[bytes]:
+        """重新壓縮超過預算的圖片，結果沒有變小時回傳 None"""
+        if Image is None or len(data) <= self.max_image_bytes:
+            return None
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                if max(image.size) > self.max_image_dimension:
+                    image.thumbnail((self.max_image_dimension, self.max_image_dimension),
+                                    Image.LANCZOS)
+                candidates = []
+                if ext in ('.jpg', '.jpeg'):
+                    output = io.BytesIO()
+                    image.convert('RGB').save(output, 'JPEG', quality=self.image_quality,
+                                              optimize=True, progressive=True)
+                    candidates.append(output.getvalue())
+                else:
+                    output = io.BytesIO()
+                    image.save(output, 'PNG', optimize=True)
+                    candidates.append(output.getvalue())
+                    if len(candidates[0]) > self.max_image_bytes and self.image_quality < 100:
+                        # 無損壓縮仍超過預算時，以調色盤量化（有損）再試一次
+                        method = Image.FASTOCTREE if 'A' in image.getbands() else Image.MEDIANCUT
+                        quantized = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                        quantized = quantized.quantize(colors=256, method=method)
+                        output = io.BytesIO()
+                        quantized.save(output, 'PNG', optimize=True)
+                        candidates.append(output.getvalue())
+        except Exception:
+            return None
+
+        best = min(candidates, key=len)
+        return best if len(best) < len(data) else None
+
+    def _rewrite(self, epub_file: Path, output_file: BinaryIO) -> Dict:
+        removed_items: List[str] = []
+        recompressed: List[Dict] = []
+
+        with EPUBArchive(epub_file, self.limits) as archive:
+            package = archive.package
+            opf_member = archive.get_member(archive.opf_path).filename
+            referenced = self._referenced_members(archive)
+
+            removed_members = set()
+            removed_ids = set()
+            for item in package.manifest:
+                info = archive.resolve_href(item['href'])
+                if info is None:
+                    continue
+                member = normalize_member_name(info.filename)
+                if member not in referenced and item['id']:
+                    removed_ids.add(item['id'])
+                    removed_members.add(info.filename)
+                    removed_items.append(item['href'])
+
+            with zipfile.ZipFile(output_file, 'w') as out:
+                # mimetype 必須是第一個成員且不壓縮
+                out.writestr(zipfile.ZipInfo('mimetype'), b'application/epub+zip',
+                             compress_type=zipfile.ZIP_STORED)
+
+                for info in archive.zip.infolist():
+                    if info.is_dir() or info.filename == 'mimetype' or info.filename in removed_members:
+                        continue
+                    data = archive.read_member(info)
+                    if info.filename == opf_member and removed_ids:
+                        data = self._remove_manifest_items(data, removed_ids)
+                    ext = posixpath.splitext(info.filename.lower())[1]
+                    if ext in ('.png', '.jpg', '.jpeg'):
+                        smaller = self._recompress_image(data, ext)
+                        if smaller is not None:
+                            recompressed.append({"member": info.filename,
+                                                 "before": len(data), "after": len(smaller)})
+                            data = smaller
+
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.external_attr = info.external_attr
+                    out.writestr(new_info, data, compress_type=zipfile.ZIP_DEFLATED,
+                                 compresslevel=9)
+
+        return {"removed_items": removed_items, "recompressed_images": recompressed}
+
+
+def format_optimize_report(reports: List[Dict]) -> str:
+    """將各書的最佳化結果排版成表格"""
+    lines = []
+    total_before = total_after = 0
+    for report in sorted(reports, key=lambda report: -report['saved_bytes']):
+        total_before += report['original_bytes']
+        total_after += report['optimized_bytes']
+        ratio = report['saved_bytes'] / report['original_bytes'] if report['original_bytes'] else 0
+        lines.append(f"  {report['book']}: {report['original_bytes']:,} → "
+                     f"{report['optimized_bytes']:,} bytes（節省 {ratio:.1%}，"
+                     f"移除 {len(report['removed_items'])} 項、"
+                     f"重新壓縮 {len(report['recompressed_images'])} 張圖片）"
+                     f"{'（快取）' if report.get('cached') else ''}")
+    saved = total_before - total_after
+    ratio = saved / total_before if total_before else 0
+    lines.append(f"合計: {total_before:,} → {total_after:,} bytes，節省 {saved:,} bytes（{ratio:.1%}）")
+    return "\n".join(lines)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+漸進式書籍封裝 - 將每本書拆成一個小型的開頭封裝與多個章節封裝，APP 下載開頭封裝即可開書
+
+    <書籍ID>/package.json          封裝清單：各封裝的網址、雜湊、大小、成員與 spine 對應
+    <書籍ID>/head.<雜湊>.zip        mimetype、container.xml、OPF、導覽文件、CSS、第一個 spine 文件與其圖片
+                                  （第一個文件是封面頁時再加上下一個文件）
+    <書籍ID>/cover.<雜湊>.zip       封面圖片（與 covers/ 中發布的封面相同）
+    <書籍ID>/chapter.<雜湊>.zip     依閱讀順序的章節（過小的章節與後續章節合併）與第一次引用的圖片
+    <書籍ID>/resources.<雜湊>.zip   其餘成員（CSS 引用的字型與背景圖、未被引用的檔案）
+
+封裝檔名以內容雜湊命名，書籍改版時內容未變的章節檔名不變，APP 快取中的章節可以繼續使用。
+"""
+
+import hashlib
+import io
+import json
+import posixpath
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from atomic_io import atomic_write_bytes, atomic_write_json
+from build_cache import file_sha256
+from epub_archive import IMAGE_EXTENSIONS, EPUBArchive, normalize_member_name
+from epub_optimizer import REFERENCING_MEDIA_TYPES, local_references
+from resource_limits import ResourceLimits
+
+# 封裝格式或拆分規則改變時遞增，舊的封裝會被重新產生
+PACKAGER_VERSION = 1
+
+# 章節封裝的最小大小（解壓縮後），較小的章節與後續章節合併，減少請求次數
+DEFAULT_MIN_CHUNK_BYTES = 32 * 1024
+
+# 封裝檔名中使用的雜湊長度（與資源清單的 8 碼指紋檔名區隔）
+PACKAGE_HASH_LENGTH = 16
+
+# 已壓縮的格式直接儲存，不再 deflate
+STORED_EXTENSIONS = set(IMAGE_EXTENSIONS) | {'.woff', '.woff2', '.mp3', '.mp4', '.m4a'}
+
+MANIFEST_NAME = "package.json"
+
+
+class ProgressivePackager:
+    def __init__(self, output_dir: Path, state_dir: Path,
+                 min_chunk_bytes: int = DEFAULT_MIN_CHUNK_BYTES,
+                 limits: Optional[ResourceLimits] = None):
+        """
+        初始化漸進式封裝器
+
+        Args:
+            output_dir: 封裝輸出目錄（每本書一個子目錄）
+            state_dir: 記錄來源雜湊與封裝結果的目錄
+            min_chunk_bytes: 章節封裝的最小大小（0 表示每個 spine 文件一個封裝）
+            limits: 讀取 EPUB 時的資源限制
+        """
+        self.output_dir = Path(output_dir)
+        self.state_dir = Path(state_dir)
+        self.min_chunk_bytes = min_chunk_bytes
+        self.limits = limits
+
+    def _settings(self) -> Dict:
+        return {"version": PACKAGER_VERSION, "min_chunk_bytes": self.min_chunk_bytes}
+
+    def book_dir(self, book_id: str) -> Path:
+        return self.output_dir / book_id
+
+    def package(self, book_id: str, epub_file: Path) -> Dict:
+        """
+        拆分單本書，來源內容與設定皆未變更時沿用上次結果
+
+        Returns:
+            摘要（封裝數量、開頭封裝與全部封裝的大小）
+        """
+        epub_file = Path(epub_file)
+        book_dir = self.book_dir(book_id)
+        manifest_file = book_dir / MANIFEST_NAME
+        state_file = self.state_dir / f"{book_id}.json"
+        source_hash = file_sha256(epub_file)
+        source_bytes = epub_file.stat().st_size
+
+        previous = None
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('source_sha256') == source_hash
+                    and state.get('settings') == self._settings()
+                    and all((book_dir / package['url']).exists()
+                            for package in previous['packages'])):
+                return dict(state['summary'], cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        book_dir.mkdir(parents=True, exist_ok=True)
+        with EPUBArchive(epub_file, self.limits) as archive:
+            plan = self._plan(archive)
+            packages = [self._write_package(archive, book_dir, entry) for entry in plan]
+            spine_package = {}
+            for index, entry in enumerate(plan):
+                for spine_index in entry['spine']:
+                    spine_package[spine_index] = index
+            spine = [{"idref": item['id'], "href": item['href'], "member": info.filename,
+                      "package": spine_package[spine_index]}
+                     for spine_index, (item, info) in enumerate(archive.spine_documents())]
+            opf_path = archive.opf_path
+
+        manifest = {
+            "version": PACKAGER_VERSION,
+            "id": book_id,
+            "opf": opf_path,
+            "source_sha256": source_hash,
+            "head_bytes": packages[0]['bytes'],
+            "total_bytes": sum(package['bytes'] for package in packages),
+            "packages": packages,
+            "spine": spine,
+        }
+        atomic_write_json(manifest_file, manifest, compact=True)
+
+        # 移除目前與上一版清單都不再引用的封裝，仍在讀取上一版的 APP 不會立即找不到檔案
+        keep = {package['url'] for package in packages}
+        if previous is not None:
+            keep.update(package['url'] for package in previous.get('packages', []))
+        for path in book_dir.glob("*.zip"):
+            if path.name not in keep:
+                path.unlink()
+
+        summary = {"book": book_id, "packages": len(packages),
+                   "head_bytes": manifest['head_bytes'], "total_bytes": manifest['total_bytes'],
+                   "source_bytes": source_bytes}
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(state_file, {"source_sha256": source_hash, "settings": self._settings(),
+                                       "summary": summary})
+        return dict(summary, cached=False)
+
+    def prune(self, book_ids: Iterable[str]) -> int:
+        """刪除已不存在之書籍的封裝目錄與封裝記錄，回傳刪除的書籍數量"""
+        book_ids = set(book_ids)
+        removed = set()
+        if self.output_dir.is_dir():
+            for book_dir in self.output_dir.iterdir():
+                # 只刪除封裝器產生的目錄（含封裝清單，或中斷時只寫出封裝檔）
+                if (book_dir.is_dir() and book_dir.name not in book_ids
+                        and ((book_dir / MANIFEST_NAME).exists() or any(book_dir.glob("*.zip")))):
+                    shutil.rmtree(book_dir)
+                    removed.add(book_dir.name)
+        if self.state_dir.is_dir():
+            for state_file in self.state_dir.glob("*.json"):
+                if state_file.stem not in book_ids:
+                    state_file.unlink()
+                    removed.add(state_file.stem)
+        return len(removed)
+
+    def _plan(self, archive: EPUBArchive) -> List[Dict]:
+        """
+        決定各封裝包含的成員
+
+        Returns:
+            [{"name", "index", "members": [ZipInfo], "spine": [spine 序號],
+              "requires": {引用到的其他封裝序號}, "size": 解壓縮後大小}]；第一個為開頭封裝
+        """
+        package = archive.package
+        documents = archive.spine_documents()
+        spine_members = {normalize_member_name(info.filename) for _, info in documents}
+        media_types = {}
+        for item in package.manifest:
+            info = archive.resolve_href(item['href'])
+            if info is not None:
+                media_types[normalize_member_name(info.filename)] = item['media_type']
+
+        plan: List[Dict] = []
+        owner: Dict[str, int] = {}
+
+        def new_package(name: str) -> Dict:
+            entry = {"name": name, "index": len(plan), "members": [], "spine": [],
+                     "requires": set(), "size": 0}
+            plan.append(entry)
+            return entry
+
+        def add(entry: Dict, info: Optional[zipfile.ZipInfo]) -> bool:
+            if info is None or info.is_dir():
+                return False
+            member = normalize_member_name(info.filename)
+            if member in owner or member == 'mimetype':
+                return False
+            owner[member] = entry['index']
+            entry['members'].append(info)
+            entry['size'] += info.file_size
+            return True
+
+        def add_document(entry: Dict, info: zipfile.ZipInfo) -> Set[str]:
+            """加入 spine 文件與其引用的圖片等資源（其他 spine 文件的連結除外），回傳引用的成員"""
+            add(entry, info)
+            index = entry['index']
+            queue = [normalize_member_name(info.filename)]
+            seen: Set[str] = set()
+            references: Set[str] = set()
+            while queue:
+                member = queue.pop(0)
+                if member in seen:
+                    continue
+                seen.add(member)
+                source = archive.get_member(member)
+                if source is None:
+                    continue
+                for ref in sorted(local_references(archive.read_member(source),
+                                                   posixpath.dirname(member))):
+                    references.add(ref)
+                    if ref in spine_members:
+                        continue
+                    if ref in owner:
+                        # 開頭封裝一定會先下載，不列入依賴
+                        if owner[ref] not in (index, 0):
+                            entry['requires'].add(owner[ref])
+                        continue
+                    if add(entry, archive.get_member(ref)) and \
+                            media_types.get(ref) in REFERENCING_MEDIA_TYPES:
+                        queue.append(ref)
+            return references
+
+        # 開頭封裝：封裝結構、導覽文件與所有 CSS，加上第一個 spine 文件
+        head = new_package("head")
+        add(head, archive.get_member('META-INF/container.xml'))
+        add(head, archive.opf_member())
+        toc_item = package.manifest_by_id.get(package.toc_id or '')
+        for item in package.manifest:
+            if ('nav' in item['properties'].split() or item is toc_item
+                    or item['media_type'] == 'text/css'):
+                add(head, archive.resolve_href(item['href']))
+
+        # 封面圖片單獨成為一個封裝：內容與 covers/ 中發布的封面相同，APP 可先顯示已下載的封面
+        cover_href, _ = package.find_cover(package.metadata.get('cover_id'))
+        cover_info = archive.resolve_href(cover_href) if cover_href else None
+        cover_member = None
+        if cover_info is not None and add(new_package("cover"), cover_info):
+            cover_member = normalize_member_name(cover_info.filename)
+
+        chapter = None
+        head_has_text = False
+        for spine_index, (_, info) in enumerate(documents):
+            member = normalize_member_name(info.filename)
+            if member in owner:
+                # 已放在其他封裝中的文件（例如同時列在 spine 中的導覽文件）
+                plan[owner[member]]['spine'].append(spine_index)
+                continue
+            if not head_has_text:
+                entry = head
+            else:
+                if chapter is None or chapter['size'] >= self.min_chunk_bytes:
+                    chapter = new_package("chapter")
+                entry = chapter
+            references = add_document(entry, info)
+            entry['spine'].append(spine_index)
+            # 第一個文件是封面頁時，開頭封裝再加入下一個文件，開書即有正文
+            if entry is head and (cover_member not in references or len(head['spine']) >= 2):
+                head_has_text = True
+
+        # 其餘成員（CSS 引用的字型與背景圖、未被引用的檔案）
+        rest = [info for info in archive.zip.infolist()
+                if not info.is_dir() and normalize_member_name(info.filename) not in owner
+                and info.filename != 'mimetype']
+        if rest:
+            resources = new_package("resources")
+            for info in rest:
+                add(resources, info)
+        return plan
+
+    def _write_package(self, archive: EPUBArchive, book_dir: Path, entry: Dict) -> Dict:
+        """
+        將成員寫成 zip 並以內容雜湊命名
+
+        沿用原始成員的時間戳記並依固定順序寫入，相同內容產生相同的位元組，
+        章節內容未變時雜湊與檔名也不變。
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as out:
+            if entry['name'] == 'head':
+                # 開頭封裝可直接當作 EPUB 開啟：mimetype 必須是第一個成員且不壓縮
+                out.writestr(zipfile.ZipInfo('mimetype'), b'application/epub+zip',
+                             compress_type=zipfile.ZIP_STORED)
+            for info in entry['members']:
+                new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                new_info.external_attr = info.external_attr
+                ext = posixpath.splitext(info.filename.lower())[1]
+                if ext in STORED_EXTENSIONS:
+                    out.writestr(new_info, archive.read_member(info),
+                                 compress_type=zipfile.ZIP_STORED)
+                else:
+                    out.writestr(new_info, archive.read_member(info),
+                                 compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+        payload = buffer.getvalue()
+        digest = hashlib.sha256(payload).hexdigest()
+        filename = f"{entry['name']}.{digest[:PACKAGE_HASH_LENGTH]}.zip"
+        if not (book_dir / filename).exists():
+            atomic_write_bytes(book_dir / filename, payload)
+        return {
+            "name": entry['name'],
+            "url": filename,
+            "sha256": digest,
+            "bytes": len(payload),
+            "size": entry['size'],
+            "members": [info.filename for info in entry['members']],
+            "requires": sorted(entry['requires']),
+        }
+
+
+def format_package_report(summaries: List[Dict]) -> str:
+    """將各書的封裝結果排版成表格（依開頭封裝佔整本書的比例排序）"""
+    lines = []
+    total_head = total_source = 0
+    for summary in sorted(summaries, key=lambda summary: -summary['head_bytes']):
+        total_head += summary['head_bytes']
+        total_source += summary['source_bytes']
+        ratio = summary['head_bytes'] / summary['source_bytes'] if summary['source_bytes'] else 0
+        lines.append(f"  {summary['book']}: 開頭 {summary['head_bytes']:,} / "
+                     f"{summary['source_bytes']:,} bytes（{ratio:.1%}），{summary['packages']} 個封裝"
+                     f"{'（快取）' if summary.get('cached') else ''}")
+    ratio = total_head / total_source if total_source else 0
+    lines.append(f"合計: 開頭封裝 {total_head:,} / {total_source:,} bytes（{ratio:.1%}）")
+    return "\n".join(lines)
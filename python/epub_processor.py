@@ -5,17 +5,70 @@ EPUB 處理器 - 自動提取書籍元數據和封面圖片
 """
 
 import os
-import json
+import argparse
+import asyncio
+import functools
+import shutil
+import time
 import zipfile
 import xml.etree.ElementTree as ET
 from pathlib import Path
-import shutil
-import urllib.parse
-import hashlib
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from asset_manifest import (ASSET_FIELDS, AssetHasher, apply_asset, build_asset_manifest,
+                            changed_assets, fingerprinted_name, load_asset_manifest,
+                            prune_fingerprinted, publish_fingerprinted, published_record,
+                            published_url)
+from atomic_io import atomic_write_json
+from build_cache import BuildCache, BuildJournal
+from catalog_sort import SortKeyBuilder, build_sort_index
+from catalog_sqlite import write_catalog_sqlite
+from catalog_writer import (diff_books, encoding_report, format_encoding_report,
+                            load_catalog, prune_catalog_deltas, write_catalog_delta,
+                            write_catalog_encodings, write_json, write_sharded_catalog)
+from cover_probe import select_cover
+from cover_thumbnails import (CoverThumbnailer, DEFAULT_FORMATS, DEFAULT_QUALITY,
+                              DEFAULT_WIDTHS, pillow_available)
+from epub_optimizer import (DEFAULT_IMAGE_QUALITY, DEFAULT_MAX_IMAGE_BYTES, EPUBOptimizer,
+                            format_optimize_report)
+from epub_archive import (EPUBArchive, NAMESPACES, SNIFF_BYTES, OPFPackage, local_name,
+                          parse_opf_head, parse_opf_package, sniff_image_extension, xhtml_to_text)
+from epub_packager import (DEFAULT_MIN_CHUNK_BYTES, MANIFEST_NAME, ProgressivePackager,
+                           format_package_report)
+from epub_vertical import VerticalTextConverter, format_vertical_report
+from epub_watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, EPUBWatcher
+from font_subset import (FONT_REPORT_NAME, FONT_SUBSET_VERSION, FontSubsetter, format_font_report,
+                         load_font_report)
+from instrumentation import BOOK_STAGE, Instrumentation
+from resource_limits import (DEFAULT_MAX_ARCHIVE_BYTES, DEFAULT_MAX_MEMBER_BYTES, DEFAULT_MAX_MEMBERS,
+                             DEFAULT_MAX_RATIO, DEFAULT_TIMEOUT, LimitExceeded, ResourceLimits)
+from search_index import SearchIndexBuilder
 
 class EPUBProcessor:
-    def __init__(self, epub_dir: str, covers_dir: str, catalog_dir: str):
+    def __init__(self, epub_dir: str, covers_dir: str, catalog_dir: str,
+                 workers: int = 1, use_cache: bool = True,
+                 thumbnail_widths: Optional[List[int]] = None,
+                 thumbnail_formats: Optional[List[str]] = None,
+                 thumbnail_quality: int = DEFAULT_QUALITY,
+                 page_size: int = 0, delta_retention: int = 10,
+                 report_encodings: bool = False, sqlite_catalog: bool = False,
+                 sort_index: bool = False, unihan_file: Optional[str] = None,
+                 fingerprint_assets: bool = False,
+                 build_search_index: bool = False,
+                 build_toc_index: bool = False, optimize: bool = False,
+                 optimize_dir: Optional[str] = None,
+                 image_quality: int = DEFAULT_IMAGE_QUALITY,
+                 max_image_bytes: int = DEFAULT_MAX_IMAGE_BYTES,
+                 vertical: bool = False, vertical_dir: Optional[str] = None,
+                 vertical_punctuation: bool = True,
+                 packages: bool = False, package_dir: Optional[str] = None,
+                 min_chunk_bytes: int = DEFAULT_MIN_CHUNK_BYTES,
+                 subset_font: Optional[str] = None, font_baseline: Optional[str] = None,
+                 font_dir: Optional[str] = None,
+                 events_file: Optional[str] = None, quiet: bool = False,
+                 limits: Optional[ResourceLimits] = None):
         """
         初始化 EPUB 處理器
         
@@ -23,21 +76,116 @@ class EPUBProcessor:
             epub_dir: EPUB 檔案所在目錄
             covers_dir: 封面圖片輸出目錄 
             catalog_dir: 目錄檔案輸出目錄
+            workers: 並行處理的行程數（1 為逐一處理，0 或負數表示使用全部 CPU 核心）
+            use_cache: 是否使用建置快取，跳過內容未變更的 EPUB
+            thumbnail_widths: 封面縮圖寬度列表（None 表示不產生縮圖）
+            thumbnail_formats: 封面縮圖格式（預設 webp 與 jpeg）
+            thumbnail_quality: 封面縮圖壓縮品質
+            page_size: 分頁目錄每頁的書籍數量（0 表示只輸出 books.json）
+            delta_retention: 保留最近幾個版本的增量更新檔案（0 表示不輸出）
+            report_encodings: 是否輸出各目錄編碼的大小與解碼時間比較
+            sqlite_catalog: 是否另外輸出 SQLite 目錄（books.sqlite，含 FTS5 全文檢索）
+            sort_index: 是否預先計算排序鍵與分面索引（catalog/sort.json）
+            unihan_file: Unihan 資料庫檔案，用於依書名首字筆畫排序（None 表示不輸出筆畫排序）
+            fingerprint_assets: 是否輸出以內容雜湊命名的 EPUB 與封面副本，目錄改用副本的網址
+            build_search_index: 是否建立全文檢索索引（catalog/search）
+            build_toc_index: 是否為每本書輸出章節與目錄索引（catalog/toc）
+            optimize: 是否輸出重新封裝、縮小下載大小的 EPUB
+            optimize_dir: 最佳化 EPUB 的輸出目錄（預設與 epub_dir 同層的 epub3-optimized）
+            image_quality: 最佳化時重新壓縮 JPEG 的品質
+            max_image_bytes: 最佳化時圖片的大小預算，超過才重新壓縮
+            vertical: 是否預先產生直書版本的 EPUB
+            vertical_dir: 直書 EPUB 的輸出目錄（預設與 epub_dir 同層的 epub3-vertical）
+            vertical_punctuation: 直書版本是否將標點與括號換成直書字形
+            packages: 是否將每本書拆成開頭封裝與章節封裝，供 APP 漸進下載
+            package_dir: 漸進式封裝的輸出目錄（預設與 epub_dir 同層的 epub3-packages）
+            min_chunk_bytes: 章節封裝的最小大小，較小的章節與後續章節合併
+            subset_font: 產生罕用字字型子集的來源字型（None 表示不產生）
+            font_baseline: 基準字元檔，檔案中的字元視為系統字型已有（None 表示使用預設的罕用字範圍）
+            font_dir: 字型子集的輸出目錄（預設與 epub_dir 同層的 fonts）
+            events_file: 以 JSON Lines 輸出各階段計時與錯誤事件的檔案（None 表示不輸出）
+            quiet: 安靜模式，不輸出逐本書籍的處理訊息
+            limits: 每本書籍的資源限制，超出時略過該書（None 表示使用預設限制）
         """
         self.epub_dir = Path(epub_dir)
         self.covers_dir = Path(covers_dir)
         self.catalog_dir = Path(catalog_dir)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.use_cache = use_cache
+        self.metrics = Instrumentation(events_file, quiet=quiet)
+        self.limits = limits if limits is not None else ResourceLimits()
+        self.cache_dir = self.catalog_dir / ".build-cache"
+        
+        self.page_size = page_size
+        self.delta_retention = delta_retention
+        self.report_encodings = report_encodings
+        self.sqlite_catalog = sqlite_catalog
+        self.fingerprint_assets = fingerprint_assets
+        self.hashed_epub_dir = self.epub_dir.parent / f"{self.epub_dir.name}-hashed"
+        self.sort_keys: Optional[SortKeyBuilder] = None
+        if sort_index:
+            self.sort_keys = SortKeyBuilder(Path(unihan_file) if unihan_file else None)
+        self.build_toc_index = build_toc_index
+        self.toc_dir = self.catalog_dir / "toc"
+        self.search_indexer: Optional[SearchIndexBuilder] = None
+        if build_search_index:
+            self.search_indexer = SearchIndexBuilder(self.catalog_dir / "search", limits=self.limits)
+        
+        self.optimizer: Optional[EPUBOptimizer] = None
+        if optimize:
+            self.optimizer = EPUBOptimizer(
+                Path(optimize_dir) if optimize_dir else self.epub_dir.parent / "epub3-optimized",
+                self.cache_dir / "optimize",
+                image_quality=image_quality,
+                max_image_bytes=max_image_bytes,
+                limits=self.limits)
+        
+        self.vertical_converter: Optional[VerticalTextConverter] = None
+        if vertical:
+            self.vertical_converter = VerticalTextConverter(
+                Path(vertical_dir) if vertical_dir else self.epub_dir.parent / "epub3-vertical",
+                self.cache_dir / "vertical",
+                punctuation=vertical_punctuation,
+                limits=self.limits)
+        
+        self.packager: Optional[ProgressivePackager] = None
+        if packages:
+            self.packager = ProgressivePackager(
+                Path(package_dir) if package_dir else self.epub_dir.parent / "epub3-packages",
+                self.cache_dir / "packages",
+                min_chunk_bytes=min_chunk_bytes,
+                limits=self.limits)
+        
+        self.font_subsetter: Optional[FontSubsetter] = None
+        if subset_font:
+            self.font_subsetter = FontSubsetter(
+                Path(font_dir) if font_dir else self.epub_dir.parent / "fonts",
+                self.cache_dir / "fonts",
+                Path(subset_font),
+                baseline_file=Path(font_baseline) if font_baseline else None,
+                limits=self.limits)
+        
+        self.thumbnailer: Optional[CoverThumbnailer] = None
+        if thumbnail_widths:
+            self.thumbnailer = CoverThumbnailer(
+                self.covers_dir, self.cache_dir / "thumbnails",
+                widths=thumbnail_widths,
+                formats=thumbnail_formats or DEFAULT_FORMATS,
+                quality=thumbnail_quality)
         
         # 確保目錄存在
         self.covers_dir.mkdir(exist_ok=True)
         self.catalog_dir.mkdir(exist_ok=True)
         
         # XML 命名空間
-        self.namespaces = {
-            'container': 'urn:oasis:names:tc:opendocument:xmlns:container',
-            'opf': 'http://www.idpf.org/2007/opf',
-            'dc': 'http://purl.org/dc/elements/1.1/'
-        }
+        self.namespaces = dict(NAMESPACES)
+
+    def __getstate__(self) -> Dict:
+        # 工作行程以 self 的綁定方法執行各階段；排序鍵（含完整的 Unihan 筆畫表）
+        # 只在主行程輸出目錄時使用，不隨每個工作傳送
+        state = dict(self.__dict__)
+        state['sort_keys'] = None
+        return state
 
     def get_container_path(self, epub_zip: zipfile.ZipFile) -> Optional[str]:
         """從 META-INF/container.xml 獲取 content.opf 路徑"""
@@ -45,135 +193,48 @@ class EPUBProcessor:
             container_data = epub_zip.read('META-INF/container.xml')
             container_root = ET.fromstring(container_data)
             
-            # 查找 rootfile 元素
-            rootfile = container_root.find('.//container:rootfile', self.namespaces)
-            if rootfile is not None:
-                return rootfile.get('full-path')
-            
-            # 備用方法：查找沒有命名空間的 rootfile
+            # 查找 rootfile 元素（有無命名空間皆可）
             for elem in container_root.iter():
-                if elem.tag.endswith('rootfile'):
+                if local_name(elem.tag) == 'rootfile' and elem.get('full-path'):
                     return elem.get('full-path')
                     
         except Exception as e:
-            print(f"無法讀取 container.xml: {e}")
+            self.metrics.log(f"無法讀取 container.xml: {e}")
             
         return None
 
     def parse_opf_metadata(self, opf_content: bytes) -> Dict:
         """解析 OPF 檔案的 metadata 區段"""
         try:
-            root = ET.fromstring(opf_content)
-            metadata = {}
-            
-            # 查找 metadata 元素
-            metadata_elem = root.find('.//opf:metadata', self.namespaces)
-            if metadata_elem is None:
-                # 備用：查找沒有命名空間的 metadata
-                metadata_elem = root.find('.//metadata')
-            
-            if metadata_elem is not None:
-                # 提取基本元數據
-                for elem in metadata_elem:
-                    tag_name = elem.tag.split('}')[-1]  # 移除命名空間前綴
-                    
-                    if tag_name in ['title', 'creator', 'subject', 'description', 
-                                  'publisher', 'date', 'language', 'identifier']:
-                        if elem.text:
-                            metadata[tag_name] = elem.text.strip()
-                    elif tag_name == 'meta':
-                        # 處理 meta 標籤
-                        name = elem.get('name', '')
-                        content = elem.get('content', '')
-                        if name == 'cover' and content:
-                            metadata['cover_id'] = content
-            
-            return metadata
-            
+            return parse_opf_head(opf_content).metadata
         except Exception as e:
-            print(f"解析 OPF metadata 失敗: {e}")
+            self.metrics.log(f"解析 OPF metadata 失敗: {e}")
             return {}
 
     def find_cover_item(self, opf_content: bytes, cover_id: Optional[str] = None) -> Optional[str]:
         """在 manifest 中查找封面檔案路徑"""
         try:
-            root = ET.fromstring(opf_content)
-            
-            # 查找 manifest 元素
-            manifest = root.find('.//opf:manifest', self.namespaces)
-            if manifest is None:
-                manifest = root.find('.//manifest')
-            
-            if manifest is not None:
-                # 方法1: 通過 cover_id 查找
-                if cover_id:
-                    for item in manifest:
-                        if item.tag.endswith('item') and item.get('id') == cover_id:
-                            return item.get('href')
-                
-                # 方法2: 查找 properties="cover-image" 的項目 (EPUB3)
-                for item in manifest:
-                    if item.tag.endswith('item'):
-                        properties = item.get('properties', '')
-                        if 'cover-image' in properties:
-                            return item.get('href')
-                
-                # 方法3: 查找常見的封面檔案名稱或 ID
-                cover_patterns = ['cover', 'Cover', 'COVER']
-                for item in manifest:
-                    if item.tag.endswith('item'):
-                        item_id = item.get('id', '')
-                        href = item.get('href', '')
-                        media_type = item.get('media-type', '')
-                        
-                        # 檢查是否為圖片且檔名包含 cover
-                        if media_type.startswith('image/'):
-                            for pattern in cover_patterns:
-                                if (pattern in item_id or pattern in href):
-                                    return href
-                                
+            cover_href, _ = parse_opf_head(opf_content).find_cover(cover_id)
+            return cover_href
         except Exception as e:
-            print(f"查找封面項目失敗: {e}")
-            
-        return None
+            self.metrics.log(f"查找封面項目失敗: {e}")
+            return None
 
     def extract_cover_image(self, epub_zip: zipfile.ZipFile, opf_path: str, 
                           cover_href: str, output_path: Path) -> bool:
         """提取封面圖片"""
         try:
-            # 計算封面檔案的完整路徑
-            opf_dir = os.path.dirname(opf_path)
-            if opf_dir:
-                cover_path = f"{opf_dir}/{cover_href}"
-            else:
-                cover_path = cover_href
-            
-            # URL 解碼
-            cover_path = urllib.parse.unquote(cover_path)
-            
-            # 嘗試不同的路徑組合
-            possible_paths = [
-                cover_path,
-                cover_href,
-                f"OEBPS/{cover_href}",
-                f"EPUB/{cover_href}"
-            ]
-            
-            for path in possible_paths:
-                try:
-                    cover_data = epub_zip.read(path)
-                    with open(output_path, 'wb') as f:
-                        f.write(cover_data)
-                    print(f"✓ 成功提取封面: {output_path}")
-                    return True
-                except KeyError:
-                    continue
-            
-            print(f"✗ 無法找到封面檔案，嘗試過的路徑: {possible_paths}")
-            return False
+            with EPUBArchive(epub_zip.filename, self.limits) as archive:
+                cover_info = archive.resolve_href(cover_href, os.path.dirname(opf_path))
+                if cover_info is None:
+                    self.metrics.log(f"✗ 無法找到封面檔案: {cover_href}")
+                    return False
+                archive.extract_member(cover_info, output_path)
+            self.metrics.log(f"✓ 成功提取封面: {output_path}")
+            return True
             
         except Exception as e:
-            print(f"提取封面失敗: {e}")
+            self.metrics.log(f"提取封面失敗: {e}")
             return False
 
     def generate_book_id(self, epub_file: Path) -> str:
@@ -184,118 +245,1020 @@ class EPUBProcessor:
         return name
 
     def get_image_extension(self, epub_zip: zipfile.ZipFile, cover_path: str) -> str:
-        """根據檔案內容判斷圖片格式"""
+        """根據檔案開頭判斷圖片格式（只讀取檔頭）"""
         try:
-            # 嘗試讀取檔案開頭來判斷格式
-            cover_data = epub_zip.read(cover_path)
-            if cover_data.startswith(b'\xff\xd8\xff'):
-                return '.jpg'
-            elif cover_data.startswith(b'\x89PNG'):
-                return '.png'
-            elif cover_data.startswith(b'GIF'):
-                return '.gif'
-            elif cover_data.startswith(b'RIFF') and b'WEBP' in cover_data[:12]:
-                return '.webp'
-            else:
-                # 從原檔名推測
-                _, ext = os.path.splitext(cover_path.lower())
-                return ext if ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp'] else '.jpg'
-        except:
+            with epub_zip.open(cover_path) as f:
+                header = f.read(SNIFF_BYTES)
+            return sniff_image_extension(header, cover_path)
+        except Exception:
             return '.jpg'
 
     def process_epub(self, epub_file: Path) -> Optional[Dict]:
         """處理單個 EPUB 檔案"""
-        print(f"\n處理: {epub_file.name}")
+        with self.metrics.span(BOOK_STAGE, epub_file.name):
+            book_info = self._process_epub(epub_file)
+        self.metrics.count("books_ok" if book_info else "books_failed")
+        return book_info
+
+    def _process_epub_with_metrics(self, epub_file: Path) -> Tuple[Optional[Dict], Dict]:
+        """在工作行程中處理 EPUB，並一併回傳收集到的指標"""
+        book_info = self.process_epub(epub_file)
+        return book_info, self.metrics.drain()
+
+    def _process_epub(self, epub_file: Path) -> Optional[Dict]:
+        name = epub_file.name
+        self.metrics.log(f"\n處理: {name}")
         
         try:
-            with zipfile.ZipFile(epub_file, 'r') as epub_zip:
-                # 1. 獲取 content.opf 路徑
-                opf_path = self.get_container_path(epub_zip)
-                if not opf_path:
-                    print(f"✗ 無法找到 content.opf 路徑")
+            # 不需要 spine 時直接從 zip 串流解析 OPF 開頭，不讀出整個 OPF
+            opened = self._read_epub(epub_file, stream=not self.build_toc_index)
+            if opened is None:
+                return None
+            archive, opf_content = opened
+            with archive:
+                with self.metrics.span("opf", name):
+                    package = self._parse_opf(name, opf_content)
+                if package is None:
                     return None
-                
-                # 2. 讀取並解析 OPF 檔案
-                opf_content = epub_zip.read(opf_path)
-                metadata = self.parse_opf_metadata(opf_content)
-                
-                if not metadata:
-                    print(f"✗ 無法解析 metadata")
+                return self._write_book(epub_file, archive, package)
+        except LimitExceeded as e:
+            self._skip_over_limit(name, e)
+            return None
+        except Exception as e:
+            self.metrics.log(f"✗ 處理 {epub_file.name} 時發生錯誤: {e}", name, error=True)
+            return None
+
+    def _skip_over_limit(self, name: str, error: LimitExceeded) -> None:
+        # 安靜模式下同樣輸出，讓維護者知道哪些書籍被略過
+        print(f"✗ 超出資源限制，略過 {name}: {error}")
+        self.metrics.count("books_over_limit")
+        self.metrics.emit("error", book=name, message=f"超出資源限制: {error}")
+
+    def _read_epub(self, epub_file: Path,
+                   stream: bool = False) -> Optional[Tuple[EPUBArchive, Union[bytes, BinaryIO]]]:
+        """
+        讀取階段：開啟 EPUB、找到 content.opf 並讀出其內容
+
+        Returns:
+            (已開啟的 EPUBArchive, OPF 內容；stream 為 True 時是尚未讀取的串流)，
+            失敗時為 None（已關閉封裝）
+        """
+        metrics = self.metrics
+        name = epub_file.name
+        with metrics.span("open", name):
+            archive = EPUBArchive(epub_file, self.limits)
+        try:
+            # 1. 獲取 content.opf 路徑
+            with metrics.span("container", name):
+                try:
+                    opf_path = archive.opf_path
+                except LimitExceeded:
+                    raise
+                except Exception as e:
+                    metrics.log(f"無法讀取 container.xml: {e}")
+                    opf_path = None
+            if not opf_path:
+                metrics.log(f"✗ 無法找到 content.opf 路徑", name, error=True)
+                archive.close()
+                return None
+            
+            try:
+                opf_content = archive.open_opf() if stream else archive.read_opf()
+            except LimitExceeded:
+                raise
+            except Exception as e:
+                metrics.log(f"解析 OPF metadata 失敗: {e}", name, error=True)
+                archive.close()
+                return None
+            metrics.count("bytes_read", archive.get_member(opf_path).compress_size)
+            return archive, opf_content
+        except BaseException:
+            archive.close()
+            raise
+
+    def _opf_parser(self) -> Callable[[bytes], OPFPackage]:
+        # 輸出章節索引需要 spine，否則只需串流解析 metadata 與 manifest
+        return parse_opf_package if self.build_toc_index else parse_opf_head
+
+    def _parse_opf(self, name: str, opf_content: Union[bytes, BinaryIO],
+                   package: Optional[OPFPackage] = None) -> Optional[OPFPackage]:
+        """
+        解析階段：解析 OPF（metadata、manifest，需要時連同 spine）
+
+        opf_content 為串流時以 parse_opf_head 解析並關閉串流。
+        package 不為 None 時表示已在其他執行緒或行程中解析完成，只做檢查。
+        """
+        if package is None:
+            try:
+                if isinstance(opf_content, bytes):
+                    package = self._opf_parser()(opf_content)
+                else:
+                    with opf_content:
+                        package = parse_opf_head(opf_content)
+            except LimitExceeded:
+                raise
+            except Exception as e:
+                self.metrics.log(f"解析 OPF metadata 失敗: {e}", name, error=True)
+                return None
+        if not package.metadata:
+            self.metrics.log(f"✗ 無法解析 metadata", name, error=True)
+            return None
+        return package
+
+    def _write_book(self, epub_file: Path, archive: EPUBArchive,
+                    package: OPFPackage) -> Dict:
+        """寫入階段：生成書籍資訊、提取封面並輸出章節索引"""
+        metrics = self.metrics
+        name = epub_file.name
+        archive.package = package
+        metadata = package.metadata
+        
+        # 3. 生成書籍資訊
+        book_id = self.generate_book_id(epub_file)
+        book_info = {
+            "id": book_id,
+            "title": metadata.get('title', epub_file.stem),
+            "author": metadata.get('creator', '未知作者'),
+            "language": metadata.get('language', 'zh-Hant'),
+            "description": metadata.get('description', ''),
+            "publisher": metadata.get('publisher', ''),
+            "date": metadata.get('date', ''),
+            "epubUrl": f"epub3/{epub_file.name}",
+            "coverUrl": "",  # 稍後設置
+            "metadata": metadata  # 保留完整 metadata 供調試
+        }
+        
+        # 4. 查找並提取封面（封面無法讀取時保留書籍，只是沒有封面）
+        with metrics.span("cover", name):
+            try:
+                self._extract_cover(archive, book_info)
+            except LimitExceeded:
+                raise
+            except Exception as e:
+                metrics.log(f"✗ 封面提取失敗: {e}", name, error=True)
+                book_info["coverUrl"] = ""
+            if not book_info["coverUrl"]:
+                metrics.count("covers_missing")
+        
+        # 5. 輸出章節與目錄索引
+        if self.build_toc_index:
+            with metrics.span("toc_index", name):
+                book_info["tocUrl"] = self.write_book_index(archive, book_id)
+        
+        metrics.log(f"✓ 處理完成: {book_info['title']} - {book_info['author']}")
+        return book_info
+
+    def _extract_cover(self, archive: EPUBArchive, book_info: Dict) -> None:
+        """選出封面並寫入 covers 目錄，成功時設定 coverUrl"""
+        metrics = self.metrics
+        name = archive.epub_file.name
+        cover = select_cover(archive)
+        cover_info, cover_method = cover['info'], cover['method']
+        if cover['href_missing']:
+            metrics.log(f"✗ 封面提取失敗，找不到檔案: {cover['href']}")
+        elif not cover['href']:
+            metrics.log(f"✗ 未找到封面定義")
+        if cover['candidate'] is not None:
+            candidate = cover['candidate']
+            metrics.log(f"✓ 以備援規則（{cover_method}）選出封面: {cover_info.filename}"
+                        f"（{candidate['width']}x{candidate['height']}）")
+        if cover_info is None:
+            return
+        
+        metrics.count(f"covers_by_{cover_method}")
+        metrics.emit("cover", book=name, rule=cover_method, member=cover_info.filename)
+        # 確定封面檔案格式（只讀取檔頭），再以串流方式寫入磁碟
+        ext = archive.sniff_image_extension(cover_info)
+        cover_filename = f"{book_info['id']}{ext}"
+        cover_output_path = self.covers_dir / cover_filename
+        archive.extract_member(cover_info, cover_output_path)
+        metrics.count("bytes_read", cover_info.compress_size)
+        metrics.count("bytes_written", cover_info.file_size)
+        metrics.log(f"✓ 成功提取封面: {cover_output_path}")
+        book_info["coverUrl"] = f"covers/{cover_filename}"
+
+    def write_book_index(self, archive: EPUBArchive, book_id: str) -> str:
+        """
+        輸出單本書的章節與目錄索引，讓閱讀器不必解析整本 EPUB 即可定位章節
+
+        每個 spine 章節記錄 zip 成員名稱、本地檔頭與壓縮資料的位置、
+        壓縮方式與大小及字數，可用一次範圍讀取取得章節內容。
+
+        Returns:
+            索引檔案的 URL（相對於專案根目錄）
+        """
+        spine = []
+        spine_index_by_member = {}
+        for item, info in archive.spine_documents():
+            text = xhtml_to_text(archive.read_member(info))
+            spine_index_by_member.setdefault(info.filename, len(spine))
+            spine.append({
+                "idref": item['id'],
+                "href": item['href'],
+                "member": info.filename,
+                "header_offset": info.header_offset,
+                "data_offset": archive.data_offset(info),
+                "compression": "deflate" if info.compress_type == zipfile.ZIP_DEFLATED else "stored",
+                "compressed_size": info.compress_size,
+                "size": info.file_size,
+                "crc32": info.CRC,
+                "chars": len(''.join(text.split()))
+            })
+        
+        toc, toc_source = archive.table_of_contents()
+        
+        def link_spine(entries: List[Dict]) -> None:
+            for entry in entries:
+                entry["spine_index"] = spine_index_by_member.get(entry['member'])
+                link_spine(entry['children'])
+        link_spine(toc)
+        
+        index = {
+            "id": book_id,
+            "opf": archive.opf_path,
+            "toc_source": toc_source,
+            "spine": spine,
+            "toc": toc
+        }
+        
+        self.toc_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.toc_dir / f"{book_id}.json", index, compact=True)
+        return f"{self.catalog_dir.name}/{self.toc_dir.name}/{book_id}.json"
+
+    def cache_settings(self) -> Dict:
+        """
+        影響書籍資料的設定，記錄在建置快取中，改變時快取結果全部重新處理
+
+        資源限制改變時，先前超出或未超出限制的書籍需要重新處理；
+        停用章節索引時，快取的書籍資料不應再帶有 tocUrl。
+        """
+        return {"limits": self.limits.settings(), "toc_index": self.build_toc_index}
+
+    def prune_toc_index(self, books: List[Dict]) -> int:
+        """刪除目錄中沒有書籍引用的章節索引（書籍已移除或已停用章節索引），回傳刪除數量"""
+        keep = {Path(book_info['tocUrl']).name for book_info in books if book_info.get('tocUrl')}
+        removed = 0
+        if self.toc_dir.is_dir():
+            for toc_file in self.toc_dir.glob("*.json"):
+                if toc_file.name not in keep:
+                    toc_file.unlink()
+                    removed += 1
+        return removed
+
+    def _cached_outputs_complete(self, book_info: Dict) -> bool:
+        """檢查快取結果是否包含目前設定需要的輸出（例如後來才啟用的章節索引）"""
+        if self.build_toc_index:
+            toc_url = book_info.get('tocUrl')
+            if not toc_url or not (self.toc_dir / Path(toc_url).name).exists():
+                return False
+        return True
+
+    def _start_build(self) -> Dict:
+        """
+        列出 EPUB 檔案並查詢快取與檢查點日誌，決定哪些書籍需要處理
+
+        Returns:
+            建置狀態：files、results（依檔案順序，已命中者已填入）、
+            pending（需處理的檔案序號）、cache、journal
+        """
+        # 排序以確保 books.json 的順序不受檔案系統或並行完成順序影響
+        epub_files = sorted(self.epub_dir.glob("*.epub"))
+        
+        print(f"找到 {len(epub_files)} 個 EPUB 檔案")
+        
+        results: List[Optional[Dict]] = [None] * len(epub_files)
+        
+        # 不使用快取時從空快取開始，只用來承接中斷執行的檢查點日誌
+        cache = BuildCache(self.cache_dir, self.covers_dir, load=self.use_cache,
+                           settings=self.cache_settings())
+        pruned = cache.prune(epub_file.name for epub_file in epub_files)
+        
+        # 上次執行中斷時，已完成的書籍記錄在檢查點日誌中，併入快取後即可跳過
+        journal = BuildJournal(self.cache_dir)
+        resumed = journal.replay()
+        if resumed:
+            cache.entries.update(resumed)
+            print(f"從中斷的執行恢復 {len(resumed)} 本已完成的書籍")
+        
+        pending = []
+        for index, epub_file in enumerate(epub_files):
+            book_info = cache.lookup(epub_file)
+            if book_info is not None and self._cached_outputs_complete(book_info):
+                results[index] = book_info
+                self.metrics.count("books_cached")
+            else:
+                pending.append(index)
+        if self.use_cache:
+            print(f"快取命中 {len(epub_files) - len(pending)} 本，"
+                  f"需處理 {len(pending)} 本，移除 {pruned} 筆過期快取")
+        
+        return {"files": epub_files, "results": results, "pending": pending,
+                "cache": cache, "journal": journal}
+
+    def _record_result(self, build: Dict, position: int, book_info: Optional[Dict]) -> None:
+        """記錄第 position 個待處理檔案的結果，成功時寫入快取與檢查點日誌"""
+        index = build['pending'][position]
+        build['results'][index] = book_info
+        if book_info:
+            epub_file = build['files'][index]
+            entry = build['cache'].store(epub_file, book_info)
+            build['journal'].append(epub_file.name, entry)
+
+    def _finish_build(self, build: Dict) -> List[Dict]:
+        """全部處理完成：儲存快取、刪除檢查點日誌，回傳成功的書籍"""
+        if self.use_cache:
+            build['cache'].save()
+        build['journal'].clear()
+        over_limit = self.metrics.counters.get("books_over_limit", 0)
+        if over_limit:
+            print(f"✗ {over_limit} 本書籍超出資源限制而略過")
+        return [book_info for book_info in build['results'] if book_info]
+
+    def process_all_epubs(self) -> List[Dict]:
+        """處理所有 EPUB 檔案"""
+        build = self._start_build()
+        pending_files = [build['files'][index] for index in build['pending']]
+        record = functools.partial(self._record_result, build)
+        try:
+            if self.workers > 1 and len(pending_files) > 1:
+                self._process_parallel(pending_files, on_result=record)
+            else:
+                for position, epub_file in enumerate(pending_files):
+                    record(position, self.process_epub(epub_file))
+        finally:
+            # 中斷時保留日誌（關閉前確實寫入磁碟），下次執行從這裡繼續
+            build['journal'].close()
+            self.metrics.flush()
+        
+        return self._finish_build(build)
+
+    async def aprocess_all_epubs(self, readers: int = 2, parsers: int = 2, writers: int = 2,
+                                 queue_size: int = 8) -> List[Dict]:
+        """
+        以 asyncio 分段管線處理所有 EPUB 檔案
+
+        讀取（開啟封裝、讀出 OPF）、解析（在執行器中解析 OPF）與寫入（提取封面、
+        輸出章節索引）三個階段以有界佇列串接，各階段有各自的並行上限。
+        佇列滿時上游階段會等待，同時在處理中的書籍最多約為佇列大小加上各階段並行數，
+        記憶體用量不隨 EPUB 數量增加。workers > 1 時解析階段使用多行程。
+        """
+        build = self._start_build()
+        pending_files = [build['files'][index] for index in build['pending']]
+        metrics = self.metrics
+        loop = asyncio.get_running_loop()
+        
+        read_queue: asyncio.Queue = asyncio.Queue()
+        parse_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        for position in range(len(pending_files)):
+            read_queue.put_nowait(position)
+        
+        def finish_book(position: int, book_info: Optional[Dict], seconds: float) -> None:
+            name = pending_files[position].name
+            metrics.emit("span", stage=BOOK_STAGE, seconds=round(seconds, 6), book=name)
+            metrics.count("books_ok" if book_info else "books_failed")
+            self._record_result(build, position, book_info)
+        
+        def read(position: int):
+            epub_file = pending_files[position]
+            metrics.log(f"\n處理: {epub_file.name}")
+            try:
+                return self._read_epub(epub_file)
+            except LimitExceeded as e:
+                self._skip_over_limit(epub_file.name, e)
+                return None
+            except Exception as e:
+                metrics.log(f"✗ 處理 {epub_file.name} 時發生錯誤: {e}", epub_file.name, error=True)
+                return None
+        
+        def write(position: int, archive: EPUBArchive, package: OPFPackage) -> Optional[Dict]:
+            epub_file = pending_files[position]
+            with archive:
+                try:
+                    return self._write_book(epub_file, archive, package)
+                except LimitExceeded as e:
+                    self._skip_over_limit(epub_file.name, e)
                     return None
-                
-                # 3. 生成書籍資訊
-                book_id = self.generate_book_id(epub_file)
-                book_info = {
-                    "id": book_id,
-                    "title": metadata.get('title', epub_file.stem),
-                    "author": metadata.get('creator', '未知作者'),
-                    "language": metadata.get('language', 'zh-Hant'),
-                    "description": metadata.get('description', ''),
-                    "publisher": metadata.get('publisher', ''),
-                    "date": metadata.get('date', ''),
-                    "epubUrl": f"epub3/{epub_file.name}",
-                    "coverUrl": "",  # 稍後設置
-                    "metadata": metadata  # 保留完整 metadata 供調試
-                }
-                
-                # 4. 查找並提取封面
-                cover_id = metadata.get('cover_id')
-                cover_href = self.find_cover_item(opf_content, cover_id)
-                
-                if cover_href:
-                    # 確定封面檔案格式
-                    ext = self.get_image_extension(epub_zip, 
-                                                 f"{os.path.dirname(opf_path)}/{cover_href}" if os.path.dirname(opf_path) else cover_href)
-                    cover_filename = f"{book_id}{ext}"
-                    cover_output_path = self.covers_dir / cover_filename
-                    
-                    if self.extract_cover_image(epub_zip, opf_path, cover_href, cover_output_path):
-                        book_info["coverUrl"] = f"covers/{cover_filename}"
+                except Exception as e:
+                    metrics.log(f"✗ 處理 {epub_file.name} 時發生錯誤: {e}",
+                                epub_file.name, error=True)
+                    return None
+        
+        async def reader() -> None:
+            while not read_queue.empty():
+                position = read_queue.get_nowait()
+                start = time.perf_counter()
+                opened = await loop.run_in_executor(io_executor, read, position)
+                if opened is None:
+                    finish_book(position, None, time.perf_counter() - start)
+                else:
+                    # 在佇列中等待的時間不計入處理時間限制
+                    opened[0].pause_clock()
+                    await parse_queue.put((position, start) + opened)
+        
+        async def parser() -> None:
+            while True:
+                item = await parse_queue.get()
+                if item is None:
+                    break
+                position, start, archive, opf_content = item
+                archive.resume_clock()
+                name = pending_files[position].name
+                with metrics.span("opf", name):
+                    try:
+                        package = await loop.run_in_executor(parse_executor, self._opf_parser(),
+                                                             opf_content)
+                    except Exception as e:
+                        metrics.log(f"解析 OPF metadata 失敗: {e}", name, error=True)
+                        package = None
                     else:
-                        print(f"✗ 封面提取失敗")
+                        package = self._parse_opf(name, opf_content, package)
+                if package is None:
+                    archive.close()
+                    finish_book(position, None, time.perf_counter() - start)
                 else:
-                    print(f"✗ 未找到封面定義")
-                
-                print(f"✓ 處理完成: {book_info['title']} - {book_info['author']}")
-                return book_info
-                
+                    archive.pause_clock()
+                    await write_queue.put((position, start, archive, package))
+        
+        async def writer() -> None:
+            while True:
+                item = await write_queue.get()
+                if item is None:
+                    break
+                position, start, archive, package = item
+                archive.resume_clock()
+                book_info = await loop.run_in_executor(io_executor, write, position,
+                                                       archive, package)
+                finish_book(position, book_info, time.perf_counter() - start)
+        
+        async def run_stage(workers: List, downstream: Optional[asyncio.Queue],
+                            downstream_workers: int) -> None:
+            # 一個階段的所有工作者結束後，通知下游階段的每個工作者結束
+            await asyncio.gather(*workers)
+            if downstream is not None:
+                for _ in range(downstream_workers):
+                    await downstream.put(None)
+        
+        readers, parsers, writers = max(1, readers), max(1, parsers), max(1, writers)
+        if self.workers > 1:
+            parse_executor = ProcessPoolExecutor(max_workers=min(self.workers, parsers))
+        else:
+            parse_executor = ThreadPoolExecutor(max_workers=parsers)
+        io_executor = ThreadPoolExecutor(max_workers=readers + writers)
+        print(f"管線處理：讀取 {readers}、解析 {parsers}、寫入 {writers}，佇列上限 {queue_size}")
+        try:
+            await asyncio.gather(
+                run_stage([reader() for _ in range(readers)], parse_queue, parsers),
+                run_stage([parser() for _ in range(parsers)], write_queue, writers),
+                run_stage([writer() for _ in range(writers)], None, 0))
+        finally:
+            io_executor.shutdown(wait=True)
+            parse_executor.shutdown(wait=True)
+            build['journal'].close()
+            metrics.flush()
+        
+        return self._finish_build(build)
+
+    def _process_parallel(self, epub_files: List[Path],
+                          on_result: Optional[Callable[[int, Optional[Dict]], None]] = None
+                          ) -> List[Optional[Dict]]:
+        """
+        使用多行程並行處理 EPUB 檔案，結果依輸入順序回傳
+
+        on_result(序號, 書籍資訊) 依完成順序在每本書處理完成時呼叫（例如寫入檢查點日誌），
+        較慢的書籍不會延後其他已完成書籍的記錄。
+        """
+        workers = min(self.workers, len(epub_files))
+        print(f"使用 {workers} 個行程並行處理")
+        
+        results: List[Optional[Dict]] = [None] * len(epub_files)
+        crashed: List[int] = []
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._process_epub_with_metrics, epub_file): index
+                       for index, epub_file in enumerate(epub_files)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index], payload = future.result()
+                    self.metrics.merge(payload)
+                    if on_result is not None:
+                        on_result(index, results[index])
+                except BrokenProcessPool:
+                    # 某個工作行程異常終止（例如記憶體不足），整個行程池失效
+                    crashed.append(index)
+                except Exception as e:
+                    self.metrics.log(f"✗ 處理 {epub_files[index].name} 時發生錯誤: {e}",
+                                     epub_files[index].name, error=True)
+                    self.metrics.count("books_failed")
+        
+        # 行程池失效時，將未完成的檔案各自放到獨立行程中重試，
+        # 讓真正造成崩潰的檔案只影響自己
+        for index in sorted(crashed):
+            epub_file = epub_files[index]
+            try:
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    future = executor.submit(self._process_epub_with_metrics, epub_file)
+                    results[index], payload = future.result()
+                self.metrics.merge(payload)
+                if on_result is not None:
+                    on_result(index, results[index])
+            except BrokenProcessPool:
+                self.metrics.log(f"✗ 處理 {epub_file.name} 時工作行程異常終止",
+                                 epub_file.name, error=True)
+                self.metrics.count("books_failed")
+            except Exception as e:
+                self.metrics.log(f"✗ 處理 {epub_file.name} 時發生錯誤: {e}",
+                                 epub_file.name, error=True)
+                self.metrics.count("books_failed")
+        
+        return results
+
+    def generate_cover_thumbnails(self, book_info: Dict) -> Dict:
+        """為單本書的封面產生縮圖，並將縮圖資訊記錄到書籍資訊中"""
+        cover_url = book_info.get('coverUrl')
+        if not cover_url:
+            return book_info
+        
+        try:
+            cover_path = self.covers_dir / Path(cover_url).name
+            book_info["coverThumbnails"] = self.thumbnailer.generate(book_info['id'], cover_path)
         except Exception as e:
-            print(f"✗ 處理 {epub_file.name} 時發生錯誤: {e}")
+            self.metrics.log(f"✗ 產生 {book_info['id']} 的封面縮圖失敗: {e}",
+                             book_info['id'], error=True)
+        return book_info
+
+    def generate_all_cover_thumbnails(self, books: List[Dict]) -> List[Dict]:
+        """為所有書籍產生封面縮圖（來源封面未變更者沿用既有縮圖）"""
+        if not pillow_available():
+            print("✗ 未安裝 Pillow，略過封面縮圖產生")
+            return books
+        
+        if self.workers > 1 and len(books) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(books))) as executor:
+                books = list(executor.map(self.generate_cover_thumbnails, books))
+        else:
+            books = [self.generate_cover_thumbnails(book_info) for book_info in books]
+        
+        thumbnail_count = sum(len(book_info.get('coverThumbnails', [])) for book_info in books)
+        print(f"✓ 封面縮圖: {thumbnail_count} 個")
+        return books
+
+    def optimize_epub(self, book_info: Dict) -> Optional[Dict]:
+        """重新封裝單本書的 EPUB，回傳最佳化報告（失敗時為 None）"""
+        epub_file = self.epub_dir / Path(book_info['epubUrl']).name
+        try:
+            return self.optimizer.optimize(epub_file)
+        except Exception as e:
+            self.metrics.log(f"✗ 最佳化 {epub_file.name} 失敗: {e}", epub_file.name, error=True)
             return None
 
-    def process_all_epubs(self) -> List[Dict]:
-        """處理所有 EPUB 檔案"""
-        books = []
-        epub_files = list(self.epub_dir.glob("*.epub"))
+    def optimize_all_epubs(self, books: List[Dict]) -> List[Dict]:
+        """重新封裝所有 EPUB（來源未變更者沿用既有結果），並記錄最佳化後的下載位置"""
+        if self.workers > 1 and len(books) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(books))) as executor:
+                reports = list(executor.map(self.optimize_epub, books))
+        else:
+            reports = [self.optimize_epub(book_info) for book_info in books]
         
-        print(f"找到 {len(epub_files)} 個 EPUB 檔案")
+        output_dir = self.optimizer.output_dir
+        for book_info, report in zip(books, reports):
+            if report is not None:
+                book_info["optimizedEpubUrl"] = f"{output_dir.name}/{report['book']}"
+                book_info["optimizedBytes"] = report['optimized_bytes']
+        
+        reports = [report for report in reports if report is not None]
+        output_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(output_dir / "optimize_report.json", reports)
+        print(f"✓ EPUB 最佳化: {len(reports)} 本（快取 {sum(1 for r in reports if r['cached'])} 本）")
+        print(format_optimize_report(reports))
+        return books
+
+    def convert_vertical(self, book_info: Dict) -> Optional[Dict]:
+        """產生單本書的直書版本（有最佳化結果時以最佳化後的 EPUB 為來源），失敗時為 None"""
+        if book_info.get('optimizedEpubUrl') and self.optimizer is not None:
+            epub_file = self.optimizer.output_dir / Path(book_info['optimizedEpubUrl']).name
+        else:
+            epub_file = self.epub_dir / Path(book_info['epubUrl']).name
+        try:
+            return self.vertical_converter.convert(epub_file)
+        except Exception as e:
+            self.metrics.log(f"✗ 產生 {epub_file.name} 的直書版本失敗: {e}", epub_file.name, error=True)
+            return None
+
+    def convert_all_vertical(self, books: List[Dict]) -> List[Dict]:
+        """產生所有書籍的直書版本（來源未變更者沿用既有結果），並記錄直書版本的下載位置"""
+        if self.workers > 1 and len(books) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(books))) as executor:
+                reports = list(executor.map(self.convert_vertical, books))
+        else:
+            reports = [self.convert_vertical(book_info) for book_info in books]
         
-        for epub_file in epub_files:
-            book_info = self.process_epub(epub_file)
-            if book_info:
-                books.append(book_info)
+        output_dir = self.vertical_converter.output_dir
+        for book_info, report in zip(books, reports):
+            if report is not None:
+                book_info["verticalEpubUrl"] = f"{output_dir.name}/{report['book']}"
+                book_info["verticalBytes"] = report['vertical_bytes']
         
+        reports = [report for report in reports if report is not None]
+        output_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(output_dir / "vertical_report.json", reports)
+        print(f"✓ 直書版本: {len(reports)} 本（快取 {sum(1 for r in reports if r['cached'])} 本）")
+        if reports:
+            print(format_vertical_report(reports))
         return books
 
-    def generate_catalog(self, books: List[Dict]) -> None:
-        """生成 books.json 目錄檔案"""
+    def package_book(self, book_info: Dict) -> Optional[Dict]:
+        """將單本書拆成漸進式封裝（有最佳化結果時以最佳化後的 EPUB 為來源），失敗時為 None"""
+        if book_info.get('optimizedEpubUrl') and self.optimizer is not None:
+            epub_file = self.optimizer.output_dir / Path(book_info['optimizedEpubUrl']).name
+        else:
+            epub_file = self.epub_dir / Path(book_info['epubUrl']).name
+        try:
+            return self.packager.package(book_info['id'], epub_file)
+        except Exception as e:
+            self.metrics.log(f"✗ 封裝 {book_info['id']} 失敗: {e}", book_info['id'], error=True)
+            return None
+
+    def package_all_books(self, books: List[Dict]) -> List[Dict]:
+        """為所有書籍輸出漸進式封裝（來源未變更者沿用既有結果），並記錄封裝清單的位置"""
+        if self.workers > 1 and len(books) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(books))) as executor:
+                summaries = list(executor.map(self.package_book, books))
+        else:
+            summaries = [self.package_book(book_info) for book_info in books]
+        
+        output_dir = self.packager.output_dir
+        for book_info, summary in zip(books, summaries):
+            if summary is not None:
+                book_info["packageUrl"] = f"{output_dir.name}/{book_info['id']}/{MANIFEST_NAME}"
+                book_info["packageHeadBytes"] = summary['head_bytes']
+        
+        # 移除已不存在之書籍的封裝目錄與封裝記錄
+        removed = self.packager.prune(book_info['id'] for book_info in books)
+        
+        summaries = [summary for summary in summaries if summary is not None]
+        print(f"✓ 漸進式封裝: {len(summaries)} 本（快取 {sum(1 for s in summaries if s['cached'])} 本）"
+              f"{f'，刪除 {removed} 本已移除書籍的封裝' if removed else ''}")
+        if summaries:
+            print(format_package_report(summaries))
+        return books
+
+    def scan_font_characters(self, book_info: Dict) -> Optional[Dict]:
+        """找出單本書正文中需要字型子集的字元，失敗時為 None"""
+        epub_file = self.epub_dir / Path(book_info['epubUrl']).name
+        try:
+            return self.font_subsetter.scan(epub_file)
+        except Exception as e:
+            self.metrics.log(f"✗ 掃描 {epub_file.name} 的罕用字失敗: {e}", epub_file.name, error=True)
+            return None
+
+    def build_font_subset(self, subset: Tuple[str, List[int]]) -> Optional[Dict]:
+        """建立一個字型子集，失敗時為 None"""
+        name, codepoints = subset
+        try:
+            return self.font_subsetter.build(name, codepoints)
+        except Exception as e:
+            self.metrics.log(f"✗ 建立字型子集 {name} 失敗: {e}", name, error=True)
+            return None
+
+    def subset_all_fonts(self, books: List[Dict]) -> List[Dict]:
+        """
+        為使用罕用字的書籍建立字型子集（相同字元集合的書籍共用一個子集），並記錄字型的下載位置
+
+        掃描結果以來源雜湊快取，子集以字元集合的雜湊命名，已存在時不會重新產生。
+        """
+        subsetter = self.font_subsetter
+        if not subsetter.available:
+            print("✗ 未安裝 fontTools，略過字型子集")
+            return books
+        
+        if self.workers > 1 and len(books) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(books))) as executor:
+                reports = list(executor.map(self.scan_font_characters, books))
+        else:
+            reports = [self.scan_font_characters(book_info) for book_info in books]
+        
+        try:
+            subsets = subsetter.plan([report for report in reports if report is not None])
+        except Exception as e:
+            self.metrics.log(f"✗ 讀取來源字型 {subsetter.source_font} 失敗: {e}",
+                             subsetter.source_font.name, error=True)
+            return books
+        
+        pending = [(name, subset['codepoints']) for name, subset in subsets.items()]
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                results = list(executor.map(self.build_font_subset, pending))
+        else:
+            results = [self.build_font_subset(item) for item in pending]
+        built = {result['name']: result for result in results if result is not None}
+        
+        output_dir = subsetter.output_dir
+        for book_info, report in zip(books, reports):
+            if report is not None and report['font'] in built:
+                book_info["fontUrl"] = f"{output_dir.name}/{report['font']}"
+                book_info["fontGlyphs"] = len(subsets[report['font']]['codepoints'])
+        
+        report_file = output_dir / FONT_REPORT_NAME
+        previous = load_font_report(report_file)
+        font_report = {
+            "version": FONT_SUBSET_VERSION,
+            "source_font": subsetter.source_font.name,
+            "source_sha256": subsetter.font_sha256,
+            "subsets": {name: {"characters": ''.join(map(chr, subsets[name]['codepoints'])),
+                               "bytes": result['bytes'], "books": subsets[name]['books']}
+                        for name, result in sorted(built.items())},
+            "missing": {report['book']: report['missing'] for report in reports
+                        if report is not None and report['missing']},
+        }
+        output_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(report_file, font_report)
+        
+        # 保留上一版目錄引用的子集，仍在讀取上一版目錄的 APP 不會立即找不到檔案
+        removed = subsetter.prune(set(built) | set(previous['subsets']))
+        
+        print(f"✓ 字型子集: {len(built)} 個（新建 {sum(1 for r in built.values() if not r['cached'])} 個），"
+              f"{sum(1 for book_info in books if book_info.get('fontUrl'))} 本書使用"
+              f"{f'，刪除 {removed} 個不再使用的子集' if removed else ''}")
+        if built or font_report['missing']:
+            print(format_font_report(font_report))
+        return books
+
+    def build_book_search_index(self, book_info: Dict) -> Optional[Dict]:
+        """建立單本書的全文檢索分片，回傳 EPUB 指紋（失敗時為 None）"""
+        epub_file = self.epub_dir / Path(book_info['epubUrl']).name
+        try:
+            return self.search_indexer.build_book(book_info['id'], epub_file)
+        except Exception as e:
+            self.metrics.log(f"✗ 建立 {book_info['id']} 的全文檢索索引失敗: {e}",
+                             book_info['id'], error=True)
+            return None
+
+    def build_search_index(self, books: List[Dict]) -> None:
+        """為新增或變更的書籍建立全文檢索分片，再合併為全域詞典"""
+        indexer = self.search_indexer
+        pending = [book_info for book_info in books
+                   if not indexer.is_current(book_info['id'],
+                                             self.epub_dir / Path(book_info['epubUrl']).name)]
+        
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                fingerprints = list(executor.map(self.build_book_search_index, pending))
+        else:
+            fingerprints = [self.build_book_search_index(book_info) for book_info in pending]
+        
+        for book_info, fingerprint in zip(pending, fingerprints):
+            if fingerprint is not None:
+                indexer.record(book_info['id'], fingerprint)
+        
+        summary = indexer.merge(book_info['id'] for book_info in books)
+        print(f"✓ 全文檢索索引: 重建 {sum(1 for f in fingerprints if f)} 本，"
+              f"共 {len(summary['books'])} 本、{summary['term_count']} 個詞彙")
+
+    def _book_assets(self, book_info: Dict) -> List[Dict]:
+        """
+        書籍的發布檔案：EPUB、最佳化 EPUB、直書 EPUB、封裝清單、字型子集、封面與各縮圖
+
+        Returns:
+            [{"book", "kind", "record"（寫回雜湊的書籍資料或縮圖資訊）, "path",
+              "publish_dir"（指紋副本目錄）, "url_dir"（副本網址目錄，None 表示與原始檔案相同）}]
+        """
+        book_id = book_info['id']
+        assets = [{"book": book_id, "kind": "epub", "record": book_info,
+                   "path": self.epub_dir / Path(book_info['epubUrl']).name,
+                   # epub_dir 是輸入目錄，副本放在同層的 epub3-hashed，避免被當成新書處理
+                   "publish_dir": self.hashed_epub_dir, "url_dir": self.hashed_epub_dir.name}]
+        if book_info.get('optimizedEpubUrl') and self.optimizer is not None:
+            path = self.optimizer.output_dir / Path(book_info['optimizedEpubUrl']).name
+            assets.append({"book": book_id, "kind": "optimized", "record": book_info,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        if book_info.get('verticalEpubUrl') and self.vertical_converter is not None:
+            path = self.vertical_converter.output_dir / Path(book_info['verticalEpubUrl']).name
+            assets.append({"book": book_id, "kind": "vertical", "record": book_info,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        if book_info.get('packageUrl') and self.packager is not None:
+            # 封裝清單；各封裝檔名已包含內容雜湊，由清單記錄
+            path = self.packager.book_dir(book_id) / MANIFEST_NAME
+            assets.append({"book": book_id, "kind": "package", "record": book_info,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        if book_info.get('fontUrl') and self.font_subsetter is not None:
+            # 字型子集由多本書共用，檔名已包含字元集合的雜湊
+            path = self.font_subsetter.output_dir / Path(book_info['fontUrl']).name
+            assets.append({"book": book_id, "kind": "font", "record": book_info,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        if book_info.get('coverUrl'):
+            path = self.covers_dir / Path(book_info['coverUrl']).name
+            assets.append({"book": book_id, "kind": "cover", "record": book_info,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        for thumbnail in book_info.get('coverThumbnails', []):
+            path = self.covers_dir / "thumbs" / Path(thumbnail['url']).name
+            assets.append({"book": book_id, "kind": "thumbnail", "record": thumbnail,
+                           "path": path, "publish_dir": path.parent, "url_dir": None})
+        return assets
+
+    def publish_assets(self, books: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        計算所有發布檔案的 SHA-256 與大小並輸出資源清單 assets.json
+
+        啟用指紋命名時複製為 <名稱>.<雜湊前 8 碼>.<副檔名> 並改用副本的網址，
+        不再被目前與上一版清單引用的舊副本會被刪除。
+        雜湊與網址只寫入書籍資料的副本，傳入的書籍資料保持不變。
+
+        Returns:
+            (寫入雜湊與發布網址的書籍資料副本, 記錄在目錄 metadata 中的摘要)
+        """
+        books = [published_record(book_info) for book_info in books]
+        hasher = AssetHasher(self.cache_dir / "assets.json", load=self.use_cache)
+        manifest_file = self.catalog_dir / "assets.json"
+        previous = load_asset_manifest(manifest_file)
+        
+        assets = []
+        for book_info in books:
+            for asset in self._book_assets(book_info):
+                if asset['path'].exists():
+                    assets.append(asset)
+                else:
+                    self.metrics.log(f"✗ 找不到發布檔案: {asset['path']}", asset['book'], error=True)
+        
+        # 讀取檔案計算雜湊時會釋放 GIL，以執行緒並行
+        paths = [asset['path'] for asset in assets]
+        if self.workers > 1 and len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                digests = list(executor.map(hasher.hash, paths))
+        else:
+            digests = [hasher.hash(path) for path in paths]
+        
+        entries = {}
+        for asset, digest in zip(assets, digests):
+            url = asset['record'][ASSET_FIELDS[asset['kind']][0]]
+            entry = {"url": url, "kind": asset['kind'], "book": asset['book']}
+            entry.update(digest)
+            if self.fingerprint_assets:
+                entry["url"] = published_url(url, digest['sha256'], asset['url_dir'])
+                publish_fingerprinted(asset['path'], asset['publish_dir']
+                                      / fingerprinted_name(asset['path'].name, digest['sha256']))
+            entries[url] = entry
+            apply_asset(asset['record'], asset['kind'], entry)
+        hasher.save(paths)
+        
+        manifest = build_asset_manifest(entries, self.fingerprint_assets)
+        changed = changed_assets(previous, manifest)
+        size = write_json(manifest_file, manifest, compact=True)
+        
+        # 停用指紋命名後，舊副本在下一次執行時全部刪除
+        keep = {Path(url).name for url in entries}
+        for manifest_entries in (entries, previous.get('assets', {})):
+            keep.update(Path(entry['url']).name for entry in manifest_entries.values())
+        directories = {asset['publish_dir'] for asset in assets}
+        directories.update((self.hashed_epub_dir, self.covers_dir, self.covers_dir / "thumbs"))
+        removed = prune_fingerprinted(directories, keep)
+        if removed:
+            print(f"✓ 刪除 {removed} 個不再使用的指紋副本")
+        
+        self.metrics.count("assets_hashed", hasher.hashed)
+        print(f"✓ 資源清單: {manifest['total_assets']} 個檔案，共 {manifest['total_bytes']:,} 位元組"
+              f"（重新計算雜湊 {hasher.hashed} 個，內容變動 {len(changed)} 個）")
+        return books, {"url": manifest_file.name, "bytes": size,
+                       "fingerprinted": self.fingerprint_assets,
+                       "total_assets": manifest['total_assets'], "total_bytes": manifest['total_bytes']}
+
+    def generate_catalog(self, books: List[Dict], assets: Optional[Dict] = None) -> None:
+        """
+        生成 books.json 目錄檔案
+
+        Args:
+            books: 書籍資料列表
+            assets: 資源清單摘要（見 publish_assets），記錄在 metadata 中
+        """
+        catalog_file = self.catalog_dir / "books.json"
+        
+        sort_index = None
+        if self.sort_keys is not None:
+            # 每本書加上 sortKeys，須在比較前後版本之前完成
+            sort_index = build_sort_index(books, self.sort_keys)
+        
+        # 與上一版目錄比較：書籍有變動時遞增版本號並輸出增量更新檔案
+        previous = load_catalog(catalog_file) or {}
+        previous_version = previous.get('metadata', {}).get('version')
+        version = previous_version or 1
+        if previous_version:
+            changes = diff_books(previous.get('books', []), books)
+            if changes['added'] or changes['updated'] or changes['removed']:
+                version = previous_version + 1
+                if self.delta_retention > 0:
+                    delta_file = write_catalog_delta(self.catalog_dir, previous_version,
+                                                     version, changes)
+                    print(f"✓ 生成增量更新檔案: {delta_file}"
+                          f"（新增 {len(changes['added'])}、更新 {len(changes['updated'])}、"
+                          f"刪除 {len(changes['removed'])}）")
+        deltas = prune_catalog_deltas(self.catalog_dir, self.delta_retention)
+        
         catalog = {
             "metadata": {
                 "title": "書苑閱讀器書目",
                 "description": "自動生成的書籍目錄",
                 "generated_at": "2025-11-05",
-                "total_books": len(books)
+                "total_books": len(books),
+                "version": version,
+                "deltas": deltas
             },
             "books": books
         }
         
-        catalog_file = self.catalog_dir / "books.json"
-        with open(catalog_file, 'w', encoding='utf-8') as f:
-            json.dump(catalog, f, ensure_ascii=False, indent=2)
+        if assets is not None:
+            catalog["metadata"]["assets"] = assets
+        if sort_index is not None:
+            # 各排序方式的書籍順序與分面索引，APP 不必在裝置上排序
+            size = write_json(self.catalog_dir / "sort.json", sort_index, compact=True)
+            catalog["metadata"]["sort_index"] = {"url": "sort.json", "bytes": size,
+                                                 "orders": list(sort_index["orders"])}
+            print(f"✓ 生成排序與分面索引: {self.catalog_dir / 'sort.json'}"
+                  f"（排序方式: {', '.join(sort_index['orders'])}）")
+            if not sort_index["readings"]:
+                print("✗ 未安裝 pypinyin，略過注音與拼音排序")
+        
+        # 同一份資料的精簡 JSON、預先壓縮檔與二進位編碼，校驗和記錄在 metadata 中
+        # （metadata 除了 encodings 本身都須在此之前設定，各編碼才與 books.json 內容一致）
+        encodings = write_catalog_encodings(self.catalog_dir, catalog)
+        if self.report_encodings:
+            print("\n=== 目錄編碼比較 ===")
+            print(format_encoding_report(encoding_report(catalog)))
+        if self.sqlite_catalog:
+            # 正規化的 SQLite 目錄（含 FTS5 全文檢索），APP 可直接以索引查詢
+            encodings["sqlite"] = write_catalog_sqlite(self.catalog_dir / "books.sqlite", catalog)
+            print(f"✓ 生成 SQLite 目錄: {self.catalog_dir / 'books.sqlite'}"
+                  f"（{encodings['sqlite']['bytes']:,} 位元組）")
+        catalog["metadata"]["encodings"] = encodings
+        
+        # 先寫暫存檔再取代，讀取端不會看到寫到一半的 books.json
+        write_json(catalog_file, catalog)
+        
+        print(f"\n✓ 生成目錄檔案: {catalog_file}（版本 {version}）")
+        
+        if self.page_size > 0:
+            index = write_sharded_catalog(self.catalog_dir, catalog["metadata"], books,
+                                          self.page_size)
+            print(f"✓ 生成分頁目錄: {self.catalog_dir / 'index.json'}"
+                  f"（{index['total_pages']} 頁，每頁 {self.page_size} 本）")
         
-        print(f"\n✓ 生成目錄檔案: {catalog_file}")
         print(f"✓ 共處理 {len(books)} 本書籍")
 
+    def publish(self, books: List[Dict]) -> List[Dict]:
+        """
+        對處理完成的書籍執行後續階段（最佳化、直書版本、漸進式封裝、字型子集、縮圖、全文檢索、資源清單）並輸出目錄
+
+        各階段皆以來源雜湊判斷是否需要重做，只有新增或變更的書籍會實際處理。
+        各階段在書籍資料的副本上加入欄位，建置快取與監看模式保留的書籍資料不受影響。
+
+        Returns:
+            目錄中發布的書籍資料
+        """
+        metrics = self.metrics
+        books = [published_record(book_info) for book_info in books]
+        
+        if self.optimizer is not None:
+            # 重新封裝 EPUB 以縮小下載大小
+            with metrics.span("optimize"):
+                books = self.optimize_all_epubs(books)
+        
+        if self.vertical_converter is not None:
+            # 預先產生直書版本，APP 不必在閱讀時注入樣式
+            with metrics.span("vertical"):
+                books = self.convert_all_vertical(books)
+        
+        if self.packager is not None:
+            # 拆成開頭封裝與章節封裝
+            with metrics.span("packages"):
+                books = self.package_all_books(books)
+        
+        if self.font_subsetter is not None:
+            # 罕用字字型子集，APP 不必內建完整的 CJK 字型
+            with metrics.span("fonts"):
+                books = self.subset_all_fonts(books)
+        
+        if self.thumbnailer is not None:
+            # 產生封面縮圖
+            with metrics.span("thumbnails"):
+                books = self.generate_all_cover_thumbnails(books)
+        
+        if self.search_indexer is not None:
+            # 建立全文檢索索引
+            with metrics.span("search_index"):
+                self.build_search_index(books)
+        
+        # 計算發布檔案的雜湊並輸出資源清單
+        with metrics.span("assets"):
+            books, assets = self.publish_assets(books)
+        
+        # 生成目錄檔案
+        with metrics.span("catalog"):
+            removed = self.prune_toc_index(books)
+            if removed:
+                print(f"✓ 刪除 {removed} 個不再使用的章節索引")
+            self.generate_catalog(books, assets)
+        return books
+
     def run(self):
         """執行完整的處理流程"""
         print("=== EPUB 處理器開始執行 ===")
@@ -304,20 +1267,261 @@ class EPUBProcessor:
             print(f"✗ EPUB 目錄不存在: {self.epub_dir}")
             return
         
+        metrics = self.metrics
+        metrics.start()
+        
         # 處理所有 EPUB 檔案
-        books = self.process_all_epubs()
+        with metrics.span("process_all"):
+            books = self.process_all_epubs()
+        
+        self._publish_and_report(books)
+
+    async def arun(self, readers: int = 2, parsers: int = 2, writers: int = 2,
+                   queue_size: int = 8) -> None:
+        """以 asyncio 分段管線執行完整的處理流程（參數見 aprocess_all_epubs）"""
+        print("=== EPUB 處理器開始執行（管線模式） ===")
+        
+        if not self.epub_dir.exists():
+            print(f"✗ EPUB 目錄不存在: {self.epub_dir}")
+            return
+        
+        metrics = self.metrics
+        metrics.start()
         
+        with metrics.span("process_all"):
+            books = await self.aprocess_all_epubs(readers=readers, parsers=parsers,
+                                                  writers=writers, queue_size=queue_size)
+        
+        self._publish_and_report(books)
+
+    def _publish_and_report(self, books: List[Dict]) -> None:
+        metrics = self.metrics
         if books:
-            # 生成目錄檔案
-            self.generate_catalog(books)
+            self.publish(books)
         else:
             print("✗ 沒有成功處理任何書籍")
         
+        metrics.finish()
+        print("\n=== 執行統計 ===")
+        print(metrics.summary())
+        if metrics.events_file is not None:
+            print(f"✓ 事件記錄: {metrics.events_file}")
+        
         print("\n=== 處理完成 ===")
 
 
-def main():
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def _str_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def processor_options(args: argparse.Namespace) -> Dict:
+    """將命令列參數轉換為 EPUBProcessor 的關鍵字參數"""
+    return {
+        "workers": args.jobs,
+        "use_cache": not args.no_cache,
+        "thumbnail_widths": args.thumbnail_widths if args.thumbnails else None,
+        "thumbnail_formats": args.thumbnail_formats,
+        "thumbnail_quality": args.thumbnail_quality,
+        "page_size": args.page_size,
+        "delta_retention": args.delta_retention,
+        "report_encodings": args.encoding_report,
+        "sqlite_catalog": args.sqlite,
+        "sort_index": args.sort_index,
+        "unihan_file": args.unihan,
+        "fingerprint_assets": args.fingerprint,
+        "build_search_index": args.search_index,
+        "build_toc_index": args.toc_index,
+        "optimize": args.optimize,
+        "optimize_dir": args.optimize_dir,
+        "image_quality": args.image_quality,
+        "max_image_bytes": args.max_image_kb * 1024,
+        "vertical": args.vertical,
+        "vertical_dir": args.vertical_dir,
+        "vertical_punctuation": not args.no_vertical_punctuation,
+        "subset_font": args.subset_font,
+        "font_baseline": args.font_baseline,
+        "font_dir": args.font_dir,
+        "packages": args.packages,
+        "package_dir": args.package_dir,
+        "min_chunk_bytes": args.package_chunk_kb * 1024,
+        "events_file": args.events,
+        "quiet": args.quiet,
+        "limits": resource_limits(args),
+    }
+
+
+def resource_limits(args: argparse.Namespace) -> ResourceLimits:
+    """由命令列參數建立資源限制（0 表示該項不限制）"""
+    if args.no_limits:
+        return ResourceLimits(None, None, None, None, None)
+    return ResourceLimits(
+        max_member_bytes=args.max_member_mb * 1024 * 1024 or None,
+        max_archive_bytes=args.max_book_mb * 1024 * 1024 or None,
+        max_ratio=args.max_ratio or None,
+        max_members=args.max_members or None,
+        timeout=args.book_timeout or None)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """建立命令列參數解析器"""
+    parser = argparse.ArgumentParser(description="EPUB 處理器 - 自動提取書籍元數據和封面圖片")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, metavar="N",
+        help="並行處理的行程數（預設 1；0 表示使用全部 CPU 核心）")
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="忽略建置快取，重新處理所有 EPUB 檔案")
+    parser.add_argument(
+        "--thumbnails", action="store_true",
+        help="產生封面縮圖（需要 Pillow）")
+    parser.add_argument(
+        "--thumbnail-widths", type=_int_list, default=DEFAULT_WIDTHS, metavar="W,W,...",
+        help=f"封面縮圖寬度（預設 {','.join(map(str, DEFAULT_WIDTHS))}）")
+    parser.add_argument(
+        "--thumbnail-formats", type=_str_list, default=DEFAULT_FORMATS, metavar="FMT,...",
+        help=f"封面縮圖格式（預設 {','.join(DEFAULT_FORMATS)}）")
+    parser.add_argument(
+        "--thumbnail-quality", type=int, default=DEFAULT_QUALITY, metavar="Q",
+        help=f"封面縮圖壓縮品質 1-100（預設 {DEFAULT_QUALITY}）")
+    parser.add_argument(
+        "--page-size", type=int, default=0, metavar="N",
+        help="額外輸出分頁目錄 index.json + pages/，每頁 N 本書（預設 0 不輸出）")
+    parser.add_argument(
+        "--delta-retention", type=int, default=10, metavar="N",
+        help="保留最近 N 個版本的增量更新檔案（預設 10；0 表示不輸出）")
+    parser.add_argument(
+        "--encoding-report", action="store_true",
+        help="比較各目錄編碼（JSON、gzip、brotli、MessagePack）的大小與解碼時間")
+    parser.add_argument(
+        "--sqlite", action="store_true",
+        help="另外輸出 SQLite 目錄 books.sqlite（正規化資料表、排序索引與 FTS5 全文檢索）")
+    parser.add_argument(
+        "--sort-index", action="store_true",
+        help="預先計算排序鍵、各排序方式的書籍順序與作者／語言／主題分面索引 sort.json"
+             "（注音與拼音需要 pypinyin）")
+    parser.add_argument(
+        "--unihan", metavar="FILE",
+        help="Unihan.zip 或 Unihan_IRGSources.txt，搭配 --sort-index 依書名首字筆畫排序")
+    parser.add_argument(
+        "--fingerprint", action="store_true",
+        help="輸出以內容雜湊命名的 EPUB 與封面副本（例如 covers/<書籍ID>.<雜湊>.jpg），目錄改用副本網址")
+    parser.add_argument(
+        "--search-index", action="store_true",
+        help="建立全文檢索索引 catalog/search（可用 search_index.py 查詢）")
+    parser.add_argument(
+        "--toc-index", action="store_true",
+        help="為每本書輸出章節位置與目錄樹索引 catalog/toc/<書籍ID>.json")
+    parser.add_argument(
+        "--optimize", action="store_true",
+        help="輸出重新壓縮、移除未引用資源的 EPUB（圖片重新壓縮需要 Pillow）")
+    parser.add_argument(
+        "--optimize-dir", metavar="DIR",
+        help="最佳化 EPUB 的輸出目錄（預設 epub3-optimized）")
+    parser.add_argument(
+        "--image-quality", type=int, default=DEFAULT_IMAGE_QUALITY, metavar="Q",
+        help=f"最佳化時重新壓縮 JPEG 的品質 1-100（預設 {DEFAULT_IMAGE_QUALITY}）")
+    parser.add_argument(
+        "--max-image-kb", type=int, default=DEFAULT_MAX_IMAGE_BYTES // 1024, metavar="KB",
+        help=f"最佳化時超過此大小的圖片才重新壓縮（預設 {DEFAULT_MAX_IMAGE_BYTES // 1024}）")
+    parser.add_argument(
+        "--vertical", action="store_true",
+        help="預先產生直書版本的 EPUB（epub3-vertical）：直書樣式、由右至左翻頁、直書標點")
+    parser.add_argument(
+        "--vertical-dir", metavar="DIR",
+        help="直書 EPUB 的輸出目錄（預設 epub3-vertical）")
+    parser.add_argument(
+        "--no-vertical-punctuation", action="store_true",
+        help="直書版本保留原本的標點與括號字形")
+    parser.add_argument(
+        "--packages", action="store_true",
+        help="將每本書拆成開頭封裝與章節封裝（epub3-packages/<書籍ID>/），APP 下載開頭封裝即可開書")
+    parser.add_argument(
+        "--package-dir", metavar="DIR",
+        help="漸進式封裝的輸出目錄（預設 epub3-packages）")
+    parser.add_argument(
+        "--package-chunk-kb", type=int, default=DEFAULT_MIN_CHUNK_BYTES // 1024, metavar="KB",
+        help=f"章節封裝的最小大小，較小的章節與後續章節合併（預設 {DEFAULT_MIN_CHUNK_BYTES // 1024}；0 表示每章一個封裝）")
+    parser.add_argument(
+        "--subset-font", metavar="FONT",
+        help="以此字型（TTF / OTF）為使用罕用字的書籍產生 WOFF2 字型子集（fonts/，需要 fontTools）")
+    parser.add_argument(
+        "--font-baseline", metavar="FILE",
+        help="基準字元檔（UTF-8 文字），檔案中的字元視為系統字型已有（預設為 CJK 擴充區與相容表意文字）")
+    parser.add_argument(
+        "--font-dir", metavar="DIR",
+        help="字型子集的輸出目錄（預設 fonts）")
+    parser.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="安靜模式：不輸出逐本書籍的處理訊息，只顯示各階段摘要與執行統計")
+    parser.add_argument(
+        "--events", metavar="FILE",
+        help="以 JSON Lines 格式輸出各階段計時、計數器與錯誤事件")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="監看模式：持續監看 epub3/，有檔案新增、修改或刪除時只重新處理這些書籍")
+    parser.add_argument(
+        "--debounce", type=float, default=DEFAULT_DEBOUNCE, metavar="SEC",
+        help=f"監看模式下最後一個檔案事件後等待幾秒才處理（預設 {DEFAULT_DEBOUNCE}）")
+    parser.add_argument(
+        "--poll", type=float, nargs="?", const=DEFAULT_POLL_INTERVAL, metavar="SEC",
+        help=f"監看模式下不使用 inotify，改為每 SEC 秒輪詢（預設 {DEFAULT_POLL_INTERVAL}）")
+    parser.add_argument(
+        "--max-member-mb", type=int, default=DEFAULT_MAX_MEMBER_BYTES // (1024 * 1024), metavar="MB",
+        help=f"單一 zip 成員解壓縮後的大小上限（預設 {DEFAULT_MAX_MEMBER_BYTES // (1024 * 1024)} MB）")
+    parser.add_argument(
+        "--max-book-mb", type=int, default=DEFAULT_MAX_ARCHIVE_BYTES // (1024 * 1024), metavar="MB",
+        help=f"每本書所有成員解壓縮後的大小上限（預設 {DEFAULT_MAX_ARCHIVE_BYTES // (1024 * 1024)} MB）")
+    parser.add_argument(
+        "--max-ratio", type=float, default=DEFAULT_MAX_RATIO, metavar="N",
+        help=f"1 MB 以上成員的壓縮比上限（預設 {DEFAULT_MAX_RATIO:g}）")
+    parser.add_argument(
+        "--max-members", type=int, default=DEFAULT_MAX_MEMBERS, metavar="N",
+        help=f"每本書的 zip 成員數量上限（預設 {DEFAULT_MAX_MEMBERS}）")
+    parser.add_argument(
+        "--book-timeout", type=float, default=DEFAULT_TIMEOUT, metavar="SEC",
+        help=f"每本書的處理時間上限（預設 {DEFAULT_TIMEOUT:g} 秒）")
+    parser.add_argument(
+        "--no-limits", action="store_true",
+        help="不限制每本書的資源用量")
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="以 asyncio 分段管線處理（讀取、解析、寫入重疊進行，適合慢速或網路磁碟）")
+    parser.add_argument(
+        "--readers", type=int, default=2, metavar="N",
+        help="管線模式下讀取階段的並行數（預設 2）")
+    parser.add_argument(
+        "--parsers", type=int, default=2, metavar="N",
+        help="管線模式下解析階段的並行數（預設 2；搭配 -j 時使用多行程）")
+    parser.add_argument(
+        "--writers", type=int, default=2, metavar="N",
+        help="管線模式下寫入階段的並行數（預設 2）")
+    parser.add_argument(
+        "--queue-size", type=int, default=8, metavar="N",
+        help="管線模式下階段之間的佇列上限（預設 8）")
+    return parser
+
+
+def run_processor(processor: EPUBProcessor, args: argparse.Namespace) -> None:
+    """依命令列參數執行一次完整處理（逐一或管線模式），或進入監看模式"""
+    if args.watch:
+        EPUBWatcher(processor, debounce=args.debounce,
+                    poll_interval=args.poll or DEFAULT_POLL_INTERVAL,
+                    force_polling=args.poll is not None).run()
+    elif args.pipeline:
+        asyncio.run(processor.arun(readers=args.readers, parsers=args.parsers,
+                                   writers=args.writers, queue_size=args.queue_size))
+    else:
+        processor.run()
+
+
+def main(argv: Optional[List[str]] = None):
     """主函數"""
+    args = build_arg_parser().parse_args(argv)
+    
     # 設定路徑（相對於專案根目錄）
     project_root = Path(__file__).parent.parent
     epub_dir = project_root / "epub3"
@@ -325,8 +1529,8 @@ def main():
     catalog_dir = project_root / "catalog"
     
     # 創建處理器並執行
-    processor = EPUBProcessor(epub_dir, covers_dir, catalog_dir)
-    processor.run()
+    processor = EPUBProcessor(epub_dir, covers_dir, catalog_dir, **processor_options(args))
+    run_processor(processor, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直書版本 - 建置時預先產生每本書的直書（vertical-rl）EPUB，APP 不必在每次翻頁時注入與覆寫樣式
+
+（見 doc/epub_vertical_text_research.md 方案 1：修改 EPUB 源文件）
+
+- 移除所有 CSS、<style> 與 style 屬性中會互相衝突的 writing-mode / text-orientation 宣告
+- 加入統一的直書樣式表 tategaki.css，並在每個 XHTML 文件中引用
+- OPF spine 設定 page-progression-direction="rtl"，metadata 加上 primary-writing-mode
+- 正文中的標點與括號換成直書字形（︐︒「→﹁ 等），不支援直書字形旋轉的渲染器也能正確顯示
+"""
+
+import json
+import posixpath
+import re
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from atomic_io import atomic_output, atomic_write_json
+from build_cache import file_sha256
+from epub_archive import EPUBArchive, normalize_member_name
+from resource_limits import ResourceLimits
+
+# 轉換結果格式或規則改變時遞增，舊的快取結果會被重新產生
+VERTICAL_VERSION = 2
+
+STYLESHEET_NAME = "tategaki.css"
+STYLESHEET_ID = "tategaki-css"
+
+VERTICAL_CSS = """@charset "utf-8";
+/* 直書樣式（由 epub_vertical.py 產生） */
+/* text-orientation 維持預設的 mixed：中文字直立，英文單字與多位數字橫躺，不會被拆成逐字直排 */
+html, body {
+    writing-mode: vertical-rl;
+    -webkit-writing-mode: vertical-rl;
+    -epub-writing-mode: vertical-rl;
+}
+img, svg {
+    max-height: 100%;
+    max-width: 100%;
+}
+"""
+
+# 橫書標點與括號對應的直書字形（CJK Vertical Forms 與 CJK Compatibility Forms）
+VERTICAL_PUNCTUATION = {
+    '，': '︐', '、': '︑', '。': '︒', '：': '︓', '；': '︔',
+    '！': '︕', '？': '︖', '〖': '︗', '〗': '︘', '…': '︙',
+    '‥': '︰', '—': '︱', '–': '︲', '＿': '︳',
+    '（': '︵', '）': '︶', '｛': '︷', '｝': '︸',
+    '〔': '︹', '〕': '︺', '【': '︻', '】': '︼',
+    '《': '︽', '》': '︾', '〈': '︿', '〉': '﹀',
+    '「': '﹁', '」': '﹂', '『': '﹃', '』': '﹄',
+    '［': '﹇', '］': '﹈', '─': '│',
+}
+PUNCTUATION_PATTERN = re.compile('[' + re.escape(''.join(VERTICAL_PUNCTUATION)) + ']')
+
+# 與直書樣式衝突的宣告（含瀏覽器前綴）
+CONFLICTING_DECLARATION_PATTERN = re.compile(
+    r'(?<![\w-])(?:-(?:webkit|epub|ms)-)?(?:writing-mode|text-orientation)\s*:[^;}"]*;?',
+    re.IGNORECASE)
+
+# 標籤、註解與 CDATA；其餘為正文（只替換正文中的標點）
+MARKUP_PATTERN = re.compile(r'(<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[^>]*>)', re.DOTALL)
+RAW_TEXT_START_PATTERN = re.compile(r'<(?:\w+:)?(script|style)\b', re.IGNORECASE)
+STYLE_ELEMENT_PATTERN = re.compile(
+    r'(<(?:\w+:)?style\b[^>]*>)(.*?)(</(?:\w+:)?style\s*>)', re.IGNORECASE | re.DOTALL)
+STYLE_ATTRIBUTE_PATTERN = re.compile(r'''(\s)style\s*=\s*(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+HEAD_END_PATTERN = re.compile(r'</(?:\w+:)?head\s*>', re.IGNORECASE)
+
+SPINE_TAG_PATTERN = re.compile(r'<(?:\w+:)?spine\b[^>]*>')
+PROGRESSION_ATTRIBUTE_PATTERN = re.compile(r'''\spage-progression-direction\s*=\s*["'][^"']*["']''')
+METADATA_END_PATTERN = re.compile(r'</((?:\w+:)?)metadata\s*>')
+MANIFEST_END_PATTERN = re.compile(r'</((?:\w+:)?)manifest\s*>')
+WRITING_MODE_META_PATTERN = re.compile(r'''name\s*=\s*["']primary-writing-mode["']''')
+
+
+def strip_conflicting_declarations(css: str) -> Tuple[str, int]:
+    """移除 writing-mode 與 text-orientation 宣告，回傳 (CSS, 移除數量)"""
+    return CONFLICTING_DECLARATION_PATTERN.subn('', css)
+
+
+def substitute_punctuation(text: str) -> Tuple[str, int]:
+    """將正文中的標點與括號換成直書字形，回傳 (文字, 替換數量)"""
+    return PUNCTUATION_PATTERN.subn(lambda match: VERTICAL_PUNCTUATION[match.group()], text)
+
+
+class VerticalTextConverter:
+    def __init__(self, output_dir: Path, state_dir: Path, punctuation: bool = True,
+                 limits: Optional[ResourceLimits] = None):
+        """
+        初始化直書轉換器
+
+        Args:
+            output_dir: 直書 EPUB 的輸出目錄
+            state_dir: 記錄來源雜湊與轉換結果的目錄
+            punctuation: 是否將標點與括號換成直書字形
+            limits: 讀取 EPUB 時的資源限制
+        """
+        self.output_dir = Path(output_dir)
+        self.state_dir = Path(state_dir)
+        self.punctuation = punctuation
+        self.limits = limits
+
+    def _settings(self) -> Dict:
+        return {"version": VERTICAL_VERSION, "punctuation": self.punctuation}
+
+    def convert(self, epub_file: Path) -> Dict:
+        """
+        轉換單一 EPUB，來源內容與設定皆未變更時沿用上次結果
+
+        Returns:
+            轉換報告（大小、改寫的樣式表與文件數、移除的宣告與替換的標點數量）
+        """
+        epub_file = Path(epub_file)
+        output_file = self.output_dir / epub_file.name
+        state_file = self.state_dir / f"{epub_file.stem}.json"
+        source_hash = file_sha256(epub_file)
+
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('source_sha256') == source_hash
+                    and state.get('settings') == self._settings()
+                    and output_file.exists()
+                    and output_file.stat().st_size == state['report']['vertical_bytes']):
+                return dict(state['report'], cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_output(output_file) as f:
+            report = self._rewrite(epub_file, f)
+
+        report.update({
+            "book": epub_file.name,
+            "source_bytes": epub_file.stat().st_size,
+            "vertical_bytes": output_file.stat().st_size,
+        })
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(state_file, {"source_sha256": source_hash, "settings": self._settings(),
+                                       "report": report})
+        return dict(report, cached=False)
+
+    def _rewrite_document(self, html: str, stylesheet_href: str, report: Dict) -> str:
+        """改寫單一 XHTML 文件：清除衝突的樣式、替換正文標點並引用直書樣式表"""
+        def strip_element(match):
+            css, count = strip_conflicting_declarations(match.group(2))
+            report["declarations_removed"] += count
+            return match.group(1) + css + match.group(3)
+
+        def strip_attribute(match):
+            css, count = strip_conflicting_declarations(match.group(3))
+            report["declarations_removed"] += count
+            if not css.strip(' ;\t\r\n'):
+                return ''
+            return f"{match.group(1)}style={match.group(2)}{css}{match.group(2)}"
+
+        html = STYLE_ELEMENT_PATTERN.sub(strip_element, html)
+
+        parts = MARKUP_PATTERN.split(html)
+        raw_text = False
+        for index, part in enumerate(parts):
+            if index % 2:
+                # 標籤：清除 style 屬性中的衝突宣告；<script> / <style> 的內容不替換標點
+                if 'style' in part:
+                    parts[index] = STYLE_ATTRIBUTE_PATTERN.sub(strip_attribute, part)
+                if RAW_TEXT_START_PATTERN.match(part) and not part.endswith('/>'):
+                    raw_text = True
+                elif part.startswith('</'):
+                    raw_text = False
+            elif self.punctuation and part and not raw_text:
+                parts[index], count = substitute_punctuation(part)
+                report["punctuation_substituted"] += count
+        html = ''.join(parts)
+
+        link = f'<link href="{stylesheet_href}" rel="stylesheet" type="text/css"/>'
+        html, count = HEAD_END_PATTERN.subn(lambda match: link + match.group(), html, count=1)
+        return html
+
+    def _rewrite_opf(self, opf: str, manifest_href: str) -> str:
+        """spine 設定由右至左翻頁，metadata 標示直書，manifest 加入直書樣式表"""
+        def set_progression(match):
+            tag = PROGRESSION_ATTRIBUTE_PATTERN.sub('', match.group())
+            return tag[:-1].rstrip() + ' page-progression-direction="rtl">'
+
+        opf = SPINE_TAG_PATTERN.sub(set_progression, opf, count=1)
+        if not WRITING_MODE_META_PATTERN.search(opf):
+            opf = METADATA_END_PATTERN.sub(
+                lambda match: f'<{match.group(1)}meta name="primary-writing-mode" '
+                              f'content="vertical-rl"/>\n' + match.group(), opf, count=1)
+        opf = MANIFEST_END_PATTERN.sub(
+            lambda match: f'<{match.group(1)}item id="{STYLESHEET_ID}" href="{manifest_href}" '
+                          f'media-type="text/css"/>\n' + match.group(), opf, count=1)
+        return opf
+
+    def _rewrite(self, epub_file: Path, output_file: BinaryIO) -> Dict:
+        report = {"stylesheets": 0, "documents": 0, "declarations_removed": 0,
+                  "punctuation_substituted": 0, "not_utf8": []}
+
+        with EPUBArchive(epub_file, self.limits) as archive:
+            package = archive.package
+            opf_member = archive.opf_member().filename
+            opf_dir = archive.opf_dir
+            stylesheet_member = normalize_member_name(
+                posixpath.join(opf_dir, STYLESHEET_NAME))
+            media_types = {}
+            for item in package.manifest:
+                info = archive.resolve_href(item['href'])
+                if info is not None:
+                    media_types[normalize_member_name(info.filename)] = item['media_type']
+
+            with zipfile.ZipFile(output_file, 'w') as out:
+                # mimetype 必須是第一個成員且不壓縮
+                out.writestr(zipfile.ZipInfo('mimetype'), b'application/epub+zip',
+                             compress_type=zipfile.ZIP_STORED)
+
+                for info in archive.zip.infolist():
+                    if info.is_dir() or info.filename == 'mimetype':
+                        continue
+                    data = archive.read_member(info)
+                    media_type = media_types.get(normalize_member_name(info.filename))
+                    try:
+                        if info.filename == opf_member:
+                            data = self._rewrite_opf(
+                                data.decode('utf-8'),
+                                posixpath.relpath(stylesheet_member, opf_dir or '.')
+                            ).encode('utf-8')
+                        elif media_type == 'text/css':
+                            css, count = strip_conflicting_declarations(data.decode('utf-8'))
+                            data = css.encode('utf-8')
+                            report["stylesheets"] += 1
+                            report["declarations_removed"] += count
+                        elif media_type in ('application/xhtml+xml', 'text/html'):
+                            href = posixpath.relpath(stylesheet_member,
+                                                     posixpath.dirname(info.filename) or '.')
+                            data = self._rewrite_document(data.decode('utf-8'), href,
+                                                          report).encode('utf-8')
+                            report["documents"] += 1
+                    except UnicodeDecodeError:
+                        # 不是 UTF-8 的文件維持原樣，記錄在報告中
+                        report["not_utf8"].append(info.filename)
+
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.external_attr = info.external_attr
+                    out.writestr(new_info, data, compress_type=zipfile.ZIP_DEFLATED,
+                                 compresslevel=9)
+
+                out.writestr(zipfile.ZipInfo(stylesheet_member), VERTICAL_CSS.encode('utf-8'),
+                             compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+
+        return report
+
+
+def format_vertical_report(reports) -> str:
+    """將各書的直書轉換結果排版成表格"""
+    lines = []
+    for report in sorted(reports, key=lambda report: report['book']):
+        lines.append(f"  {report['book']}: {report['documents']} 個文件、"
+                     f"{report['stylesheets']} 個樣式表，移除 {report['declarations_removed']} 個衝突宣告，"
+                     f"替換 {report['punctuation_substituted']:,} 個標點"
+                     f"{'（快取）' if report.get('cached') else ''}")
+        for member in report['not_utf8']:
+            lines.append(f"    ✗ 不是 UTF-8，未轉換: {member}")
+    total = sum(report['punctuation_substituted'] for report in reports)
+    not_utf8 = sum(len(report['not_utf8']) for report in reports)
+    lines.append(f"合計: {len(reports)} 本，替換 {total:,} 個標點"
+                 f"{f'，{not_utf8} 個文件不是 UTF-8 而未轉換' if not_utf8 else ''}")
+    return "\n".join(lines)
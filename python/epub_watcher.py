@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+監看模式 - 持續監看 epub3/，有 EPUB 新增、修改或刪除時只重新處理這些檔案並更新目錄
+
+Linux 上使用 inotify（透過 ctypes，不需額外套件），其他平台或 inotify 無法使用時
+改為定期比對檔案大小與修改時間。短時間內的多個事件會合併（debounce）後一次處理。
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from build_cache import BuildCache
+
+# inotify 事件遮罩（見 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# 事件佇列溢位時回傳的標記，表示需要重新掃描整個目錄
+RESCAN = '*'
+
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def _is_epub(name: str) -> bool:
+    # 忽略編輯器或複製工具產生的隱藏暫存檔
+    return name.lower().endswith('.epub') and not name.startswith('.')
+
+
+class InotifyWatch:
+    def __init__(self, directory: Path):
+        """以 inotify 監看目錄，無法使用時拋出 OSError"""
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError("此平台不支援 inotify")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch 失敗")
+
+    def read(self, timeout: float) -> Set[str]:
+        """等待最多 timeout 秒，回傳有變動的 EPUB 檔名"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                names.add(RESCAN)
+            elif _is_epub(name):
+                names.add(name)
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatch:
+    def __init__(self, directory: Path, interval: float = DEFAULT_POLL_INTERVAL):
+        """定期比對目錄中 EPUB 的大小與修改時間"""
+        self.directory = Path(directory)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for epub_file in self.directory.glob("*.epub"):
+            if not _is_epub(epub_file.name):
+                continue
+            try:
+                stat = epub_file.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[epub_file.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def read(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        names = {name for name in current.keys() | self.snapshot.keys()
+                 if current.get(name) != self.snapshot.get(name)}
+        self.snapshot = current
+        return names
+
+    def close(self) -> None:
+        pass
+
+
+def open_watch(directory: Path, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               force_polling: bool = False):
+    """優先使用 inotify，無法使用時改為輪詢"""
+    if not force_polling:
+        try:
+            return InotifyWatch(directory)
+        except (OSError, AttributeError) as e:
+            print(f"✗ 無法使用 inotify（{e}），改為每 {poll_interval} 秒輪詢")
+    return PollingWatch(directory, poll_interval)
+
+
+class EPUBWatcher:
+    def __init__(self, processor, debounce: float = DEFAULT_DEBOUNCE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, force_polling: bool = False):
+        """
+        初始化監看模式
+
+        Args:
+            processor: 已設定好的 EPUBProcessor
+            debounce: 最後一個檔案事件後等待幾秒才開始處理
+            poll_interval: 輪詢模式下的檢查間隔（秒）
+            force_polling: 不使用 inotify，一律輪詢
+        """
+        self.processor = processor
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.force_polling = force_polling
+        self.books: Dict[str, Dict] = {}
+        self.cache: Optional[BuildCache] = None
+
+    def catalog_books(self) -> List[Dict]:
+        # 與完整執行相同，依檔名排序
+        return [self.books[name] for name in sorted(self.books)]
+
+    def initial_build(self) -> None:
+        """啟動時先完整處理一次（有建置快取時只處理變更過的書籍）"""
+        processor = self.processor
+        books = processor.process_all_epubs()
+        self.books = {Path(book_info['epubUrl']).name: book_info for book_info in books}
+        if processor.use_cache:
+            self.cache = BuildCache(processor.cache_dir, processor.covers_dir,
+                                    settings=processor.cache_settings())
+        if books:
+            processor.publish(self.catalog_books())
+        processor.metrics.flush()
+
+    def _remove_outputs(self, old_info: Dict, new_info: Optional[Dict]) -> None:
+        """移除已刪除書籍的封面與章節索引，或修改後不再使用的舊封面（例如格式改變）"""
+        processor = self.processor
+        for key, directory in (("coverUrl", processor.covers_dir), ("tocUrl", processor.toc_dir)):
+            old_url = old_info.get(key)
+            if old_url and (new_info is None or new_info.get(key) != old_url):
+                try:
+                    (directory / Path(old_url).name).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def apply_changes(self, names: Set[str]) -> Dict:
+        """
+        重新處理有變動的 EPUB，並重新輸出目錄
+
+        Returns:
+            {"added", "updated", "removed", "failed"} 各自的檔名列表
+        """
+        processor = self.processor
+        if RESCAN in names:
+            names = (names - {RESCAN}) | set(self.books)
+            names |= {epub_file.name for epub_file in processor.epub_dir.glob("*.epub")
+                      if _is_epub(epub_file.name)}
+
+        result = {"added": [], "updated": [], "removed": [], "failed": []}
+        for name in sorted(names):
+            epub_file = processor.epub_dir / name
+            old_info = self.books.get(name)
+            new_info = processor.process_epub(epub_file) if epub_file.exists() else None
+
+            if new_info is not None:
+                self.books[name] = new_info
+                result["updated" if old_info else "added"].append(name)
+                if self.cache is not None:
+                    self.cache.store(epub_file, new_info)
+            elif epub_file.exists():
+                self.books.pop(name, None)
+                result["failed"].append(name)
+            elif old_info is not None:
+                del self.books[name]
+                result["removed"].append(name)
+            if old_info is not None:
+                self._remove_outputs(old_info, new_info)
+
+        if self.cache is not None:
+            self.cache.prune(self.books)
+            self.cache.save()
+        processor.publish(self.catalog_books())
+        processor.metrics.flush()
+        return result
+
+    def run(self) -> None:
+        """持續監看直到 Ctrl-C"""
+        processor = self.processor
+        processor.epub_dir.mkdir(parents=True, exist_ok=True)
+        processor.metrics.start()
+
+        print("=== 監看模式 ===")
+        # 先開始監看再做初次處理，處理期間放進來的檔案不會被漏掉
+        watch = open_watch(processor.epub_dir, self.poll_interval, self.force_polling)
+        self.initial_build()
+        print(f"\n監看 {processor.epub_dir}（按 Ctrl-C 結束）")
+
+        pending: Set[str] = set()
+        deadline = 0.0
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if pending else self.poll_interval
+                names = watch.read(timeout)
+                now = time.monotonic()
+                if names:
+                    pending |= names
+                    deadline = now + self.debounce
+                elif pending and now >= deadline:
+                    start = time.perf_counter()
+                    try:
+                        result = self.apply_changes(pending)
+                    except Exception as e:
+                        # 輸出目錄失敗（例如磁碟已滿、沒有寫入權限）時保留待處理的檔案，
+                        # 下一次防抖結束時重試，不中止監看
+                        print(f"✗ 更新目錄失敗，稍後重試: {e}")
+                        processor.metrics.emit("error", message=f"更新目錄失敗: {e}")
+                        deadline = time.monotonic() + self.debounce
+                        continue
+                    pending = set()
+                    print(f"✓ 已更新目錄（{(time.perf_counter() - start) * 1000:.0f} ms）："
+                          f"新增 {len(result['added'])}、更新 {len(result['updated'])}、"
+                          f"刪除 {len(result['removed'])}、失敗 {len(result['failed'])}")
+        except KeyboardInterrupt:
+            print("\n停止監看")
+        finally:
+            watch.close()
+            processor.metrics.finish()
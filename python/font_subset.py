@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+罕用字字型子集 - 為每本書產生只包含罕用字字形的 WOFF2 字型，APP 不必內建完整的 CJK 字型
+
+1. 掃描每本書 spine 文件的正文，找出系統字型可能缺少的字元
+   （預設為 CJK 擴充區 A 至 H、相容表意文字與私用區；指定基準字元檔時為檔案以外的所有字元）
+2. 以設定的來源字型（例如 TW-Kai、花園明朝）建立只包含這些字元的子集
+3. 子集檔名由來源字型與字元集合的雜湊決定，使用相同罕用字的書籍共用同一個字型檔
+
+    fonts/<雜湊前 16 碼>.woff2     字型子集
+    fonts/font_report.json        各子集的字元、書籍，以及來源字型也沒有的字元
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from atomic_io import atomic_output, atomic_write_json
+from build_cache import file_sha256
+from epub_archive import EPUBArchive, xhtml_to_text
+from resource_limits import ResourceLimits
+
+try:
+    from fontTools import subset as font_subsetter
+    from fontTools.ttLib import TTFont
+except ImportError:  # fontTools 為可選依賴，未安裝時不輸出字型子集
+    font_subsetter = None
+    TTFont = None
+
+try:
+    import brotli
+except ImportError:  # brotli 為可選依賴，未安裝時改輸出 WOFF（zlib 壓縮）
+    brotli = None
+
+# 掃描規則或子集設定改變時遞增，舊的快取結果與字型會被重新產生
+FONT_SUBSET_VERSION = 1
+
+# 字型檔名中使用的雜湊長度（與資源清單的 8 碼指紋檔名區隔）
+FONT_HASH_LENGTH = 16
+
+FONT_FLAVOR = 'woff2' if brotli is not None else 'woff'
+
+SUBSET_NAME_PATTERN = re.compile(r'^[0-9a-f]{%d}\.woff2?$' % FONT_HASH_LENGTH)
+
+FONT_REPORT_NAME = "font_report.json"
+
+# 未指定基準字元檔時，視為手機系統字型可能缺少的範圍
+RARE_RANGES = [
+    (0x3400, 0x4DBF),    # CJK 擴充區 A
+    (0xE000, 0xF8FF),    # 私用區（造字）
+    (0xF900, 0xFAFF),    # CJK 相容表意文字
+    (0x20000, 0x3FFFF),  # CJK 擴充區 B 至 H、相容表意文字補充
+]
+
+# 直書字形需要的 OpenType 功能（與 epub_vertical.py 搭配）
+LAYOUT_FEATURES = ['vert', 'vrt2', 'vkrn', 'vpal']
+
+
+def is_rare(codepoint: int) -> bool:
+    return any(start <= codepoint <= end for start, end in RARE_RANGES)
+
+
+def load_baseline(path: Path) -> FrozenSet[int]:
+    """讀取基準字元檔（UTF-8 文字檔，檔案中出現的字元視為系統字型已有）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return frozenset(ord(ch) for ch in f.read() if not ch.isspace())
+
+
+def subset_name(font_sha256: str, codepoints: Iterable[int]) -> str:
+    """子集檔名：來源字型、字元集合與設定相同時檔名相同"""
+    digest = hashlib.sha256(f"{FONT_SUBSET_VERSION}:{FONT_FLAVOR}:{font_sha256}:".encode('ascii'))
+    digest.update(','.join(f"{cp:x}" for cp in sorted(codepoints)).encode('ascii'))
+    return f"{digest.hexdigest()[:FONT_HASH_LENGTH]}.{FONT_FLAVOR}"
+
+
+class FontSubsetter:
+    def __init__(self, output_dir: Path, state_dir: Path, source_font: Path,
+                 baseline_file: Optional[Path] = None,
+                 limits: Optional[ResourceLimits] = None):
+        """
+        初始化字型子集產生器
+
+        Args:
+            output_dir: 字型子集的輸出目錄
+            state_dir: 記錄各書來源雜湊與掃描結果的目錄
+            source_font: 來源字型（TTF / OTF）
+            baseline_file: 基準字元檔（None 表示使用預設的罕用字範圍）
+            limits: 讀取 EPUB 時的資源限制
+        """
+        self.output_dir = Path(output_dir)
+        self.state_dir = Path(state_dir)
+        self.source_font = Path(source_font)
+        self.baseline_file = Path(baseline_file) if baseline_file else None
+        self.limits = limits
+        self._baseline: Optional[FrozenSet[int]] = None
+        self._font_sha256: Optional[str] = None
+        self._font_codepoints: Optional[Set[int]] = None
+
+    @property
+    def available(self) -> bool:
+        return TTFont is not None
+
+    @property
+    def baseline(self) -> Optional[FrozenSet[int]]:
+        if self._baseline is None and self.baseline_file is not None:
+            self._baseline = load_baseline(self.baseline_file)
+        return self._baseline
+
+    @property
+    def font_sha256(self) -> str:
+        if self._font_sha256 is None:
+            self._font_sha256 = file_sha256(self.source_font)
+        return self._font_sha256
+
+    def font_codepoints(self) -> Set[int]:
+        """來源字型 cmap 中的所有字元"""
+        if self._font_codepoints is None:
+            font = TTFont(self.source_font, lazy=True, fontNumber=0)
+            try:
+                self._font_codepoints = set(font.getBestCmap() or {})
+            finally:
+                font.close()
+        return self._font_codepoints
+
+    def _settings(self) -> Dict:
+        baseline = self.baseline
+        if baseline is not None:
+            baseline = hashlib.sha256(''.join(map(chr, sorted(baseline))).encode('utf-8')).hexdigest()
+        return {"version": FONT_SUBSET_VERSION, "baseline_sha256": baseline}
+
+    def _needs_glyph(self, ch: str) -> bool:
+        if ch.isspace():
+            return False
+        if self.baseline is not None:
+            return ord(ch) not in self.baseline
+        return is_rare(ord(ch))
+
+    def scan(self, epub_file: Path) -> Dict:
+        """
+        找出單本書正文中系統字型可能缺少的字元，來源內容與設定皆未變更時沿用上次結果
+
+        Returns:
+            {"book", "characters"（排序後的字元字串）, "cached"}
+        """
+        epub_file = Path(epub_file)
+        state_file = self.state_dir / f"{epub_file.stem}.json"
+        source_hash = file_sha256(epub_file)
+
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('source_sha256') == source_hash
+                    and state.get('settings') == self._settings()):
+                return dict(state['report'], cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        used: Set[str] = set()
+        with EPUBArchive(epub_file, self.limits) as archive:
+            for item, info in archive.spine_documents():
+                used.update(xhtml_to_text(archive.read_member(info)))
+        report = {"book": epub_file.name,
+                  "characters": ''.join(sorted(ch for ch in used if self._needs_glyph(ch)))}
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(state_file, {"source_sha256": source_hash, "settings": self._settings(),
+                                       "report": report})
+        return dict(report, cached=False)
+
+    def build(self, name: str, codepoints: List[int]) -> Dict:
+        """
+        以來源字型建立子集（檔名已包含字元集合的雜湊，檔案已存在時直接沿用）
+
+        Returns:
+            {"name", "bytes", "cached"}
+        """
+        output_file = self.output_dir / name
+        if output_file.exists():
+            return {"name": name, "bytes": output_file.stat().st_size, "cached": True}
+
+        options = font_subsetter.Options()
+        options.flavor = FONT_FLAVOR
+        options.layout_features = sorted(set(options.layout_features) | set(LAYOUT_FEATURES))
+        options.hinting = False
+        options.desubroutinize = True
+        font = font_subsetter.load_font(str(self.source_font), options, dontLoadGlyphNames=True)
+        try:
+            subsetter = font_subsetter.Subsetter(options)
+            subsetter.populate(unicodes=codepoints)
+            subsetter.subset(font)
+            # 保留來源字型的修改時間，相同輸入產生相同的檔案
+            font.recalcTimestamp = False
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            with atomic_output(output_file) as f:
+                font_subsetter.save_font(font, f, options)
+        finally:
+            font.close()
+        return {"name": name, "bytes": output_file.stat().st_size, "cached": False}
+
+    def plan(self, reports: List[Dict]) -> Dict[str, Dict]:
+        """
+        依字元集合將書籍分組，相同集合共用一個子集
+
+        各報告另外記錄 font（子集檔名，沒有需要的字元時為 None）與 missing（來源字型也沒有的字元）
+
+        Returns:
+            {子集檔名: {"codepoints", "books"}}
+        """
+        covered = self.font_codepoints()
+        subsets: Dict[str, Dict] = {}
+        for report in reports:
+            codepoints = sorted(ord(ch) for ch in report['characters'] if ord(ch) in covered)
+            report['missing'] = ''.join(ch for ch in report['characters'] if ord(ch) not in covered)
+            if not codepoints:
+                report['font'] = None
+                continue
+            name = subset_name(self.font_sha256, codepoints)
+            report['font'] = name
+            subset = subsets.setdefault(name, {"codepoints": codepoints, "books": []})
+            subset['books'].append(report['book'])
+        return subsets
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """刪除不再被引用的子集，回傳刪除數量"""
+        keep = set(keep)
+        removed = 0
+        if self.output_dir.is_dir():
+            for path in self.output_dir.iterdir():
+                if path.is_file() and SUBSET_NAME_PATTERN.match(path.name) and path.name not in keep:
+                    path.unlink()
+                    removed += 1
+        return removed
+
+
+def load_font_report(report_file: Path) -> Dict:
+    try:
+        with open(report_file, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        if report.get('version') == FONT_SUBSET_VERSION:
+            return report
+    except (OSError, ValueError):
+        pass
+    return {"version": FONT_SUBSET_VERSION, "subsets": {}}
+
+
+def format_font_report(report: Dict) -> str:
+    """將各子集的字元數、大小與共用書籍排版成表格"""
+    lines = []
+    for name, subset in sorted(report['subsets'].items()):
+        lines.append(f"  {name}: {len(subset['characters'])} 字，{subset['bytes']:,} 位元組，"
+                     f"{len(subset['books'])} 本書")
+    for book, missing in sorted(report['missing'].items()):
+        lines.append(f"  ✗ {book}: 來源字型缺少 {missing}")
+    return "\n".join(lines)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+執行指標 - 各階段計時、計數器與 JSON Lines 事件輸出
+
+事件格式（每行一個 JSON 物件）：
+    {"ts": 1730790000.123, "event": "span", "stage": "cover", "book": "論語", "seconds": 0.0042}
+    {"ts": 1730790000.456, "event": "error", "book": "論語", "message": "..."}
+    {"ts": 1730790009.000, "event": "summary", "counters": {...}, "stages": {...}}
+"""
+
+import contextlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# 以整本書為單位的計時階段名稱，用於找出最慢的書籍
+BOOK_STAGE = "book"
+
+
+class Instrumentation:
+    def __init__(self, events_file: Optional[Path] = None, quiet: bool = False):
+        """
+        初始化執行指標收集器
+
+        Args:
+            events_file: JSON Lines 事件輸出檔案（None 表示不輸出）
+            quiet: 是否略過逐本書籍的終端機訊息
+        """
+        self.events_file = Path(events_file) if events_file else None
+        self.quiet = quiet
+        self._reset()
+
+    def _reset(self) -> None:
+        # 管線模式下讀取與寫入階段在多個執行緒中回報指標
+        self._lock = threading.Lock()
+        self.pending: List[Dict] = []
+        self.counters: Dict[str, int] = {}
+        self.stages: Dict[str, Dict] = {}
+        self.book_seconds: Dict[str, float] = {}
+
+    def __getstate__(self) -> Dict:
+        # 傳送到工作行程時只帶設定，不帶已收集的事件與統計
+        return {"events_file": self.events_file, "quiet": self.quiet}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.events_file = state['events_file']
+        self.quiet = state['quiet']
+        self._reset()
+
+    def start(self) -> None:
+        """開始新的執行：清空統計並截斷事件檔案"""
+        self._reset()
+        if self.events_file is not None:
+            self.events_file.parent.mkdir(parents=True, exist_ok=True)
+            self.events_file.write_text('', encoding='utf-8')
+        self.emit("start")
+
+    def log(self, message: str, book: Optional[str] = None, error: bool = False) -> None:
+        """逐本書籍的訊息：安靜模式下不輸出到終端機，錯誤另外記錄為事件"""
+        if not self.quiet:
+            print(message)
+        if error:
+            self.emit("error", book=book,
+                      message=message[2:] if message.startswith('✗ ') else message)
+
+    def emit(self, event: str, **fields) -> None:
+        record = {"ts": round(time.time(), 3), "event": event}
+        record.update(fields)
+        self._record(record)
+
+    def _record(self, record: Dict) -> None:
+        with self._lock:
+            self._record_locked(record)
+
+    def _record_locked(self, record: Dict) -> None:
+        if record['event'] == 'span':
+            stage = self.stages.setdefault(record['stage'],
+                                           {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stage['count'] += 1
+            stage['seconds'] += record['seconds']
+            stage['max_seconds'] = max(stage['max_seconds'], record['seconds'])
+            if record['stage'] == BOOK_STAGE and record.get('book'):
+                self.book_seconds[record['book']] = record['seconds']
+        self.pending.append(record)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def span(self, stage: str, book: Optional[str] = None) -> Iterator[None]:
+        """計時一個處理階段（發生例外時同樣記錄）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            fields = {"stage": stage, "seconds": round(time.perf_counter() - start, 6)}
+            if book is not None:
+                fields["book"] = book
+            self.emit("span", **fields)
+
+    def drain(self) -> Dict:
+        """取出工作行程中收集的事件與計數器，交由主行程 merge()"""
+        payload = {"events": self.pending, "counters": self.counters}
+        self._reset()
+        return payload
+
+    def merge(self, payload: Dict) -> None:
+        """合併工作行程回傳的事件與計數器"""
+        for record in payload['events']:
+            self._record(record)
+        for name, amount in payload['counters'].items():
+            self.count(name, amount)
+
+    def flush(self) -> None:
+        """將尚未寫出的事件附加到事件檔案"""
+        if self.events_file is not None and self.pending:
+            with open(self.events_file, 'a', encoding='utf-8') as f:
+                for record in self.pending:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.pending = []
+
+    def finish(self) -> None:
+        """記錄最終統計並寫出所有事件"""
+        self.emit("summary", counters=dict(sorted(self.counters.items())), stages=self.stages)
+        self.flush()
+
+    def summary(self, limit: int = 5) -> str:
+        """排版計數器、各階段耗時與最慢的書籍"""
+        lines = ["計數器:"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name:<24}{value:>14,}")
+
+        lines.append(f"{'階段':<22}{'次數':>8}{'合計 (s)':>12}{'平均 (ms)':>12}{'最長 (ms)':>12}")
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:<22}{stage['count']:>8}{stage['seconds']:>12.3f}"
+                         f"{stage['seconds'] * 1000 / stage['count']:>12.2f}"
+                         f"{stage['max_seconds'] * 1000:>12.2f}")
+
+        slowest = sorted(self.book_seconds.items(), key=lambda item: -item[1])[:limit]
+        if slowest:
+            lines.append(f"最慢的 {len(slowest)} 本書:")
+            for book, seconds in slowest:
+                lines.append(f"  {seconds * 1000:>10.2f} ms  {book}")
+        return "\n".join(lines)
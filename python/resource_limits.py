@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資源限制 - 每本書籍的解壓縮大小、壓縮比、成員數量與處理時間上限
+
+開啟 EPUB 時先以 zip 中央目錄記載的大小檢查（不解壓縮），讀取成員時再以串流方式
+累計實際讀出的位元組並檢查時間，超出任一限制即拋出 LimitExceeded，
+由處理器記錄後略過該書，整批處理的記憶體用量因此有固定上限。
+"""
+
+import io
+import os
+import struct
+import time
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional
+
+DEFAULT_MAX_MEMBER_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_RATIO = 100.0
+DEFAULT_MAX_MEMBERS = 10000
+DEFAULT_TIMEOUT = 60.0
+
+# 小於此大小的成員不檢查壓縮比（少量重複內容本來就能壓得很小）
+RATIO_MIN_BYTES = 1024 * 1024
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# zip 中央目錄結尾記錄（end of central directory）
+END_RECORD_SIGNATURE = b'PK\x05\x06'
+END_RECORD_FORMAT = '<4s4H2LH'
+END_RECORD_SIZE = struct.calcsize(END_RECORD_FORMAT)
+MAX_COMMENT_SIZE = 0xFFFF
+
+
+class LimitExceeded(Exception):
+    """EPUB 超出資源限制"""
+
+
+def count_members(epub_file: Path) -> Optional[int]:
+    """
+    從中央目錄結尾記錄讀出成員數量，不載入整個中央目錄
+
+    Returns:
+        成員數量；找不到記錄或為 ZIP64 時為 None
+    """
+    with open(epub_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        tail_size = min(size, END_RECORD_SIZE + MAX_COMMENT_SIZE)
+        f.seek(size - tail_size)
+        tail = f.read(tail_size)
+    offset = tail.rfind(END_RECORD_SIGNATURE)
+    if offset < 0 or len(tail) - offset < END_RECORD_SIZE:
+        return None
+    total = struct.unpack_from(END_RECORD_FORMAT, tail, offset)[4]
+    return None if total == 0xFFFF else total
+
+
+class ResourceLimits:
+    def __init__(self, max_member_bytes: Optional[int] = DEFAULT_MAX_MEMBER_BYTES,
+                 max_archive_bytes: Optional[int] = DEFAULT_MAX_ARCHIVE_BYTES,
+                 max_ratio: Optional[float] = DEFAULT_MAX_RATIO,
+                 max_members: Optional[int] = DEFAULT_MAX_MEMBERS,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT):
+        """
+        每本書籍的資源限制（None 表示不限制）
+
+        Args:
+            max_member_bytes: 單一成員解壓縮後的大小上限
+            max_archive_bytes: 整本書所有成員解壓縮後的大小總和上限
+            max_ratio: 單一成員的壓縮比上限（解壓縮大小 / 壓縮大小）
+            max_members: zip 成員數量上限
+            timeout: 單本書籍的處理時間上限（秒）
+        """
+        self.max_member_bytes = max_member_bytes
+        self.max_archive_bytes = max_archive_bytes
+        self.max_ratio = max_ratio
+        self.max_members = max_members
+        self.timeout = timeout
+
+    def settings(self) -> Dict:
+        """目前的限制設定（記錄在建置快取中，設定改變時快取的結果不再沿用）"""
+        return {"max_member_bytes": self.max_member_bytes, "max_archive_bytes": self.max_archive_bytes,
+                "max_ratio": self.max_ratio, "max_members": self.max_members, "timeout": self.timeout}
+
+    def check_file(self, epub_file: Path) -> None:
+        """開啟 zip 之前檢查成員數量，避免載入過大的中央目錄"""
+        if self.max_members is None:
+            return
+        total = count_members(epub_file)
+        if total is not None and total > self.max_members:
+            raise LimitExceeded(f"成員數量 {total:,} 超過上限 {self.max_members:,}")
+
+    def check_archive(self, infos: List[zipfile.ZipInfo]) -> None:
+        """以中央目錄記載的大小檢查整個封裝（不解壓縮）"""
+        if self.max_members is not None and len(infos) > self.max_members:
+            raise LimitExceeded(f"成員數量 {len(infos):,} 超過上限 {self.max_members:,}")
+        total = 0
+        for info in infos:
+            self.check_member(info)
+            total += info.file_size
+        if self.max_archive_bytes is not None and total > self.max_archive_bytes:
+            raise LimitExceeded(f"解壓縮後總大小 {total:,} 位元組超過上限 {self.max_archive_bytes:,}")
+
+    def check_member(self, info: zipfile.ZipInfo) -> None:
+        if self.max_member_bytes is not None and info.file_size > self.max_member_bytes:
+            raise LimitExceeded(f"{info.filename} 解壓縮後 {info.file_size:,} 位元組"
+                                f"超過上限 {self.max_member_bytes:,}")
+        if (self.max_ratio is not None and info.file_size >= RATIO_MIN_BYTES
+                and info.file_size > self.max_ratio * max(info.compress_size, 1)):
+            raise LimitExceeded(f"{info.filename} 壓縮比 "
+                                f"{info.file_size / max(info.compress_size, 1):.0f} 超過上限 {self.max_ratio:g}")
+
+    def budget(self) -> 'ResourceBudget':
+        return ResourceBudget(self)
+
+
+class ResourceBudget:
+    def __init__(self, limits: ResourceLimits):
+        """單本書籍處理期間的用量：累計讀出的位元組與經過的時間"""
+        self.limits = limits
+        self.bytes_read = 0
+        self.start = time.monotonic()
+        self.paused_at: Optional[float] = None
+
+    def pause(self) -> None:
+        """暫停計時（例如在管線佇列中等待下游階段時）"""
+        if self.paused_at is None:
+            self.paused_at = time.monotonic()
+
+    def resume(self) -> None:
+        if self.paused_at is not None:
+            self.start += time.monotonic() - self.paused_at
+            self.paused_at = None
+
+    def check_time(self) -> None:
+        timeout = self.limits.timeout
+        if timeout is not None and time.monotonic() - self.start > timeout:
+            raise LimitExceeded(f"處理時間超過 {timeout:g} 秒")
+
+    def consume(self, info: zipfile.ZipInfo, member_bytes: int, amount: int) -> None:
+        """記錄從成員讀出的 amount 位元組（member_bytes 為此成員目前累計讀出的大小）"""
+        self.bytes_read += amount
+        limits = self.limits
+        if limits.max_member_bytes is not None and member_bytes > limits.max_member_bytes:
+            raise LimitExceeded(f"{info.filename} 解壓縮後超過 {limits.max_member_bytes:,} 位元組")
+        if limits.max_archive_bytes is not None and self.bytes_read > limits.max_archive_bytes:
+            raise LimitExceeded(f"讀出的資料超過 {limits.max_archive_bytes:,} 位元組")
+        self.check_time()
+
+    def open(self, source: BinaryIO, info: zipfile.ZipInfo) -> 'LimitedReader':
+        return LimitedReader(source, info, self)
+
+
+class LimitedReader(io.RawIOBase):
+    """逐段讀取 zip 成員並將用量計入 ResourceBudget 的串流"""
+
+    def __init__(self, source: BinaryIO, info: zipfile.ZipInfo, budget: ResourceBudget):
+        super().__init__()
+        self.source = source
+        self.info = info
+        self.budget = budget
+        self.member_bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is not None and size >= 0:
+            data = self.source.read(min(size, READ_CHUNK_SIZE))
+            self._consume(len(data))
+            return data
+        # 讀取全部時仍逐段讀取，超過限制時不必先配置整個成員的記憶體
+        chunks = []
+        while True:
+            data = self.source.read(READ_CHUNK_SIZE)
+            if not data:
+                return b''.join(chunks)
+            self._consume(len(data))
+            chunks.append(data)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _consume(self, amount: int) -> None:
+        self.member_bytes += amount
+        self.budget.consume(self.info, self.member_bytes, amount)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.source.close()
+        super().close()
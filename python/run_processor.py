@@ -11,10 +11,12 @@ from pathlib import Path
 # 添加 python 目錄到路徑
 sys.path.append(str(Path(__file__).parent))
 
-from epub_processor import EPUBProcessor
+from epub_processor import EPUBProcessor, build_arg_parser, processor_options, run_processor
 
-def main():
+def main(argv=None):
     """快速執行主函數"""
+    args = build_arg_parser().parse_args(argv)
+    
     print("=== 書苑閱讀器 EPUB 批次處理工具 ===\n")
     
     # 設定路徑
@@ -36,20 +38,21 @@ def main():
     epub_count = len(list(epub_dir.glob("*.epub")))
     print(f"\n📚 找到 {epub_count} 個 EPUB 檔案")
     
-    if epub_count == 0:
+    if epub_count == 0 and not args.watch:
         print("❌ 沒有找到任何 EPUB 檔案")
         return 1
     
-    # 詢問是否繼續
-    response = input(f"\n是否開始處理這些 EPUB 檔案？(y/N): ").strip().lower()
-    if response not in ['y', 'yes', '是']:
-        print("已取消處理")
-        return 0
+    # 詢問是否繼續（監看模式為長時間執行的服務，不需確認）
+    if not args.watch:
+        response = input(f"\n是否開始處理這些 EPUB 檔案？(y/N): ").strip().lower()
+        if response not in ['y', 'yes', '是']:
+            print("已取消處理")
+            return 0
     
     # 執行處理
     try:
-        processor = EPUBProcessor(epub_dir, covers_dir, catalog_dir)
-        processor.run()
+        processor = EPUBProcessor(epub_dir, covers_dir, catalog_dir, **processor_options(args))
+        run_processor(processor, args)
         
         print(f"\n🎉 處理完成！")
         print(f"📁 封面圖片已保存到: {covers_dir}")
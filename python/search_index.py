@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文檢索索引 - 依閱讀順序讀取每本書的正文，建立可離線查詢的倒排索引
+
+索引結構：
+    search/books/<書籍ID>.json  每本書一個分片，記錄各詞彙在各章節中的位置
+    search/terms.json          全域詞典，記錄各詞彙出現在哪些書籍與次數
+    search/manifest.json       各分片對應的 EPUB 指紋，用於增量重建
+
+中文以字元二元組（bigram）切分，遇到標點、空白或非中文字元即斷開；
+英數字以整個單字為一個詞彙。
+"""
+
+import argparse
+import json
+import re
+import sys
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from atomic_io import atomic_write_json
+from build_cache import file_fingerprint, fingerprint_matches
+from epub_archive import EPUBArchive, xhtml_to_text
+from resource_limits import ResourceLimits
+
+# 索引格式版本，結構或切詞規則改變時遞增，舊分片會被重建
+INDEX_VERSION = 1
+
+# CJK 統一表意文字（含擴充區與相容字）
+CJK_PATTERN = re.compile(
+    '[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0003134f]+')
+WORD_PATTERN = re.compile(r'[0-9a-z]+')
+TOKEN_PATTERN = re.compile(CJK_PATTERN.pattern + '|' + WORD_PATTERN.pattern)
+
+
+def normalize_text(text: str) -> str:
+    """全形英數轉半形、相容字轉標準字，並統一為小寫"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, int]]:
+    """
+    將已正規化的文字切分為 (詞彙, 字元位置)
+
+    中文連續字串產生重疊的二元組（只有一個字時產生單字），
+    標點與其他字元作為斷點，二元組不會跨越標點。
+    """
+    for match in TOKEN_PATTERN.finditer(text):
+        segment = match.group()
+        start = match.start()
+        if not CJK_PATTERN.match(segment):
+            yield segment, start
+        elif len(segment) == 1:
+            yield segment, start
+        else:
+            for offset in range(len(segment) - 1):
+                yield segment[offset:offset + 2], start + offset
+
+
+def delta_encode(positions: List[int]) -> List[int]:
+    return [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+
+
+def delta_decode(deltas: List[int]) -> List[int]:
+    positions = []
+    current = 0
+    for delta in deltas:
+        current += delta
+        positions.append(current)
+    return positions
+
+
+def build_book_index(epub_file: Path, limits: Optional[ResourceLimits] = None) -> Dict:
+    """
+    為單本書建立倒排索引（limits 為讀取 EPUB 時的資源限制）
+
+    Returns:
+        {"chapters": [{"href", "chars"}], "terms": {詞彙: [[章節, 位置差分...], ...]}}
+    """
+    chapters = []
+    postings: Dict[str, Dict[int, List[int]]] = {}
+
+    with EPUBArchive(epub_file, limits) as archive:
+        for chapter, (item, info) in enumerate(archive.spine_documents()):
+            text = normalize_text(xhtml_to_text(archive.read_member(info)))
+            chapters.append({"href": item['href'], "chars": len(text)})
+            for term, position in tokenize(text):
+                postings.setdefault(term, {}).setdefault(chapter, []).append(position)
+
+    terms = {
+        term: [[chapter] + delta_encode(positions)
+               for chapter, positions in sorted(by_chapter.items())]
+        for term, by_chapter in sorted(postings.items())
+    }
+    return {"chapters": chapters, "terms": terms}
+
+
+class SearchIndexBuilder:
+    def __init__(self, search_dir: Path, limits: Optional[ResourceLimits] = None):
+        """
+        初始化全文檢索索引建立器
+
+        各書分片對應的 EPUB 指紋記錄在 manifest.json，
+        判斷分片是否需要重建時不必讀取分片本身。
+
+        Args:
+            search_dir: 索引輸出目錄（例如 catalog/search）
+            limits: 讀取 EPUB 時的資源限制
+        """
+        self.search_dir = Path(search_dir)
+        self.limits = limits
+        self.books_dir = self.search_dir / "books"
+        self.manifest_file = self.search_dir / "manifest.json"
+        self.manifest = self._load_manifest()
+        self.dirty = False
+
+    def shard_path(self, book_id: str) -> Path:
+        return self.books_dir / f"{book_id}.json"
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == INDEX_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": INDEX_VERSION, "books": [], "sources": {}, "term_count": 0}
+
+    def _load_shard(self, book_id: str) -> Optional[Dict]:
+        try:
+            with open(self.shard_path(book_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, book_id: str, epub_file: Path) -> bool:
+        """檢查書籍分片是否存在且對應目前的 EPUB 內容"""
+        fingerprint = self.manifest['sources'].get(book_id)
+        return (fingerprint is not None and self.shard_path(book_id).exists()
+                and fingerprint_matches(epub_file, fingerprint))
+
+    def build_book(self, book_id: str, epub_file: Path) -> Dict:
+        """
+        建立單本書的索引分片（可在工作行程中執行）
+
+        Returns:
+            EPUB 的檔案指紋，交由 record() 記錄
+        """
+        fingerprint = file_fingerprint(epub_file)
+        shard = {"version": INDEX_VERSION, "book_id": book_id}
+        shard.update(build_book_index(epub_file, self.limits))
+
+        self.books_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.shard_path(book_id), shard, compact=True)
+        return fingerprint
+
+    def record(self, book_id: str, fingerprint: Dict) -> None:
+        """記錄重建後分片對應的 EPUB 指紋"""
+        self.manifest['sources'][book_id] = fingerprint
+        self.dirty = True
+
+    def merge(self, book_ids: Iterable[str]) -> Dict:
+        """
+        合併各書分片為全域詞典，並移除已不在目錄中的書籍分片
+
+        沒有分片重建且書籍列表不變時，沿用既有的詞典。
+        詞典格式：{"books": [書籍ID], "terms": {詞彙: [書籍序號, 出現次數, ...]}}
+
+        Returns:
+            索引摘要（books、term_count）
+        """
+        book_ids = [book_id for book_id in book_ids if self.shard_path(book_id).exists()]
+        terms_file = self.search_dir / "terms.json"
+        if not self.dirty and book_ids == self.manifest['books'] and terms_file.exists():
+            return {"books": book_ids, "term_count": self.manifest['term_count']}
+
+        wanted = set(book_ids)
+        for shard_file in self.books_dir.glob("*.json"):
+            if shard_file.stem not in wanted:
+                shard_file.unlink()
+
+        dictionary: Dict[str, List[int]] = {}
+        for book_index, book_id in enumerate(book_ids):
+            shard = self._load_shard(book_id) or {"terms": {}}
+            for term, chapters in shard['terms'].items():
+                count = sum(len(chapter) - 1 for chapter in chapters)
+                dictionary.setdefault(term, []).extend([book_index, count])
+
+        terms = {"version": INDEX_VERSION, "books": book_ids,
+                 "terms": dict(sorted(dictionary.items()))}
+        self.search_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(terms_file, terms, compact=True)
+
+        self.manifest['books'] = book_ids
+        self.manifest['sources'] = {book_id: self.manifest['sources'][book_id]
+                                    for book_id in book_ids if book_id in self.manifest['sources']}
+        self.manifest['term_count'] = len(dictionary)
+        atomic_write_json(self.manifest_file, self.manifest)
+        self.dirty = False
+        return {"books": book_ids, "term_count": len(dictionary)}
+
+
+class SearchIndex:
+    def __init__(self, search_dir: Path):
+        """
+        載入預先建立的全文檢索索引
+
+        Args:
+            search_dir: 索引目錄（例如 catalog/search）
+        """
+        self.search_dir = Path(search_dir)
+        with open(self.search_dir / "terms.json", 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.books: List[str] = data['books']
+        self.terms: Dict[str, List[int]] = data['terms']
+        self._shards: Dict[str, Dict] = {}
+
+    def _shard(self, book_id: str) -> Dict:
+        if book_id not in self._shards:
+            with open(self.search_dir / "books" / f"{book_id}.json", 'r', encoding='utf-8') as f:
+                self._shards[book_id] = json.load(f)
+        return self._shards[book_id]
+
+    def _candidate_books(self, term: str) -> set:
+        postings = self.terms.get(term, [])
+        return {self.books[postings[i]] for i in range(0, len(postings), 2)}
+
+    def _positions(self, book_id: str, term: str) -> Dict[int, set]:
+        chapters = self._shard(book_id)['terms'].get(term, [])
+        return {chapter[0]: set(delta_decode(chapter[1:])) for chapter in chapters}
+
+    def _single_char_positions(self, book_id: str, char: str) -> Dict[int, set]:
+        """單一中文字：合併單字詞彙、以該字開頭與結尾的二元組位置"""
+        result: Dict[int, set] = {}
+        for term in self._shard(book_id)['terms']:
+            if term == char or term[0] == char:
+                shift = 0
+            elif len(term) == 2 and term[1] == char:
+                shift = 1
+            else:
+                continue
+            for chapter, positions in self._positions(book_id, term).items():
+                result.setdefault(chapter, set()).update(p + shift for p in positions)
+        return result
+
+    def search(self, query: str) -> List[Dict]:
+        """
+        查詢詞語，回傳每個出現位置（書籍 ID、章節序號、章節 href、字元位置）
+
+        查詢字串中的每個片段都必須以相鄰位置出現（片語比對）。
+        """
+        tokens = list(tokenize(normalize_text(query)))
+        if not tokens:
+            return []
+
+        # 單一中文字無法直接對應二元組，需要掃描書內詞彙
+        single_char = len(tokens) == 1 and len(tokens[0][0]) == 1 and CJK_PATTERN.match(tokens[0][0])
+
+        if single_char:
+            char = tokens[0][0]
+            candidates = {self.books[postings[i]]
+                          for term, postings in self.terms.items() if char in term
+                          for i in range(0, len(postings), 2)}
+        else:
+            candidates = None
+            for term, _ in tokens:
+                books = self._candidate_books(term)
+                candidates = books if candidates is None else candidates & books
+
+        results = []
+        for book_id in self.books:
+            if book_id not in candidates:
+                continue
+            if single_char:
+                matches = self._single_char_positions(book_id, tokens[0][0])
+            else:
+                base_offset = tokens[0][1]
+                matches = None
+                for term, offset in tokens:
+                    shifted = {chapter: {p - (offset - base_offset) for p in positions}
+                               for chapter, positions in self._positions(book_id, term).items()}
+                    if matches is None:
+                        matches = shifted
+                    else:
+                        matches = {chapter: matches[chapter] & shifted[chapter]
+                                   for chapter in matches.keys() & shifted.keys()}
+            chapters = self._shard(book_id)['chapters']
+            for chapter in sorted(matches or {}):
+                for position in sorted(matches[chapter]):
+                    results.append({"book_id": book_id, "chapter": chapter,
+                                    "href": chapters[chapter]['href'], "position": position})
+        return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列查詢：python search_index.py 關鍵字"""
+    parser = argparse.ArgumentParser(description="查詢預先建立的全文檢索索引")
+    parser.add_argument("query", help="查詢字詞")
+    parser.add_argument("--index-dir", type=Path,
+                        default=Path(__file__).parent.parent / "catalog" / "search",
+                        help="索引目錄（預設 catalog/search）")
+    parser.add_argument("--limit", type=int, default=20, help="最多列出幾筆結果")
+    args = parser.parse_args(argv)
+
+    results = SearchIndex(args.index_dir).search(args.query)
+    books = sorted({result['book_id'] for result in results})
+    print(f"「{args.query}」共 {len(results)} 處，出現在 {len(books)} 本書中")
+    for result in results[:args.limit]:
+        print(f"  {result['book_id']}  第 {result['chapter'] + 1} 章 "
+              f"({result['href']})  位置 {result['position']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試資源清單的指紋網址在重複發布時保持不變
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from asset_manifest import fingerprinted_name
+from benchmark import generate_corpus
+from epub_processor import EPUBProcessor
+
+
+def test_publish_assets_twice_keeps_urls(tmp_path):
+    """同一份書籍資料發布兩次，指紋網址相同且來源資料維持原始網址"""
+    generate_corpus(tmp_path / "epub3", books=3, chapters=2, cover_bytes=2048)
+    processor = EPUBProcessor(tmp_path / "epub3", tmp_path / "covers", tmp_path / "catalog",
+                              use_cache=False, quiet=True, fingerprint_assets=True)
+    books = processor.process_all_epubs()
+    source = json.loads(json.dumps(books))
+
+    first, _ = processor.publish_assets(books)
+    second, _ = processor.publish_assets(books)
+
+    assert books == source
+    assert [book['epubUrl'] for book in first] == [book['epubUrl'] for book in second]
+    assert [book['coverUrl'] for book in first] == [book['coverUrl'] for book in second]
+    for original, book in zip(source, second):
+        expected = fingerprinted_name(Path(original['epubUrl']).name, book['epubSha256'])
+        assert Path(book['epubUrl']).name == expected
+
+    with open(tmp_path / "catalog" / "assets.json", 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert set(manifest['assets']) == ({book['epubUrl'] for book in source}
+                                       | {book['coverUrl'] for book in source if book['coverUrl']})
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試目錄的各種編碼與 books.json 內容一致
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark import generate_corpus
+from epub_processor import EPUBProcessor
+
+
+def test_encodings_match_books_json(tmp_path):
+    """精簡 JSON 與 books.json 的 metadata 只差在 encodings 本身"""
+    generate_corpus(tmp_path / "epub3", books=3, chapters=2, cover_bytes=2048)
+    processor = EPUBProcessor(tmp_path / "epub3", tmp_path / "covers", tmp_path / "catalog",
+                              use_cache=False, quiet=True, sort_index=True)
+    processor.publish(processor.process_all_epubs())
+
+    with open(tmp_path / "catalog" / "books.json", 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    with open(tmp_path / "catalog" / "books.min.json", 'r', encoding='utf-8') as f:
+        minified = json.load(f)
+
+    metadata = dict(catalog['metadata'])
+    del metadata['encodings']
+    assert 'assets' in metadata and 'sort_index' in metadata
+    assert minified['metadata'] == metadata
+    assert minified['books'] == catalog['books']
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試作者名稱正規化與排序鍵產生器
+"""
+
+import pickle
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import pytest
+
+from catalog_sort import normalize_author
+from epub_processor import EPUBProcessor
+
+
+@pytest.mark.parametrize("author, expected", [
+    ("淨空法師講述", "淨空法師"),
+    ("知性法師述", "知性法師"),
+    ("姚秦三藏鳩摩羅什譯", "姚秦三藏鳩摩羅什"),
+    ("清朝‧懷西居士周安士著述", "清朝‧懷西居士周安士"),
+    ("見月老人自述", "見月老人自述"),
+    ("千華寺繼任主持 見月老人自述", "千華寺繼任主持 見月老人自述"),
+    ("聖一老和尚講述 弟子衍輪恭錄", "聖一老和尚 弟子衍輪"),
+    ("清淨散人著 妙光譯註", "清淨散人 妙光"),
+    ("儒童　素一老人　著", "儒童 素一老人"),
+    ("後漢安息國三藏安世高譯\n凡夫白話譯", "後漢安息國三藏安世高 凡夫白話"),
+    ("王著", "王著"),
+    ("班昭", "班昭"),
+    ("著", "著"),
+    ("", ""),
+])
+def test_normalize_author(author, expected):
+    assert normalize_author(author) == expected
+
+
+def test_sort_keys_not_sent_to_workers(tmp_path):
+    """傳送到工作行程的處理器不帶排序鍵（Unihan 筆畫表），主行程保留"""
+    unihan_file = tmp_path / "Unihan_IRGSources.txt"
+    unihan_file.write_text("U+4E00\tkTotalStrokes\t1\n", encoding='utf-8')
+    processor = EPUBProcessor(tmp_path / "epub3", tmp_path / "covers", tmp_path / "catalog",
+                              quiet=True, sort_index=True, unihan_file=unihan_file)
+    assert processor.sort_keys.has_strokes
+
+    worker = pickle.loads(pickle.dumps(processor.generate_cover_thumbnails)).__self__
+    assert worker.sort_keys is None
+    assert processor.sort_keys is not None
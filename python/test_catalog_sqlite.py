@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試 SQLite 目錄的查詢（含沒有 FTS5 時的 LIKE 查詢）
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import pytest
+
+import catalog_sqlite
+from catalog_sqlite import fts5_available, search_books, write_catalog_sqlite
+
+CATALOG = {
+    "metadata": {"title": "測試書目", "version": 1},
+    "books": [
+        {"id": "論語", "title": "論語", "author": "孔子弟子", "description": "儒家經典"},
+        {"id": "印光大師文鈔", "title": "印光大師文鈔", "author": "印光大師",
+         "description": "淨土法門 100% 念佛"},
+        {"id": "孔子傳", "title": "孔子傳", "author": "錢穆", "description": "孔子生平"},
+    ],
+}
+
+
+@pytest.mark.skipif(not fts5_available(), reason="SQLite 未編入 FTS5")
+def test_search_with_fts(tmp_path):
+    db_path = tmp_path / "books.sqlite"
+    assert write_catalog_sqlite(db_path, CATALOG)["fts"]
+    assert [book["id"] for book in search_books(db_path, "孔子")] in (["論語", "孔子傳"],
+                                                                    ["孔子傳", "論語"])
+    assert [book["id"] for book in search_books(db_path, "印光 淨土")] == ["印光大師文鈔"]
+
+
+def test_search_without_fts(tmp_path, monkeypatch):
+    """建置環境沒有 FTS5 時改以 LIKE 查詢書名、作者與簡介，依目錄順序排列"""
+    monkeypatch.setattr(catalog_sqlite, "fts5_available", lambda: False)
+    db_path = tmp_path / "books.sqlite"
+    assert not write_catalog_sqlite(db_path, CATALOG)["fts"]
+
+    assert [book["id"] for book in search_books(db_path, "孔子")] == ["論語", "孔子傳"]
+    assert [book["id"] for book in search_books(db_path, "印光 淨土")] == ["印光大師文鈔"]
+    assert [book["id"] for book in search_books(db_path, "100%")] == ["印光大師文鈔"]
+    assert search_books(db_path, "孔子 淨土") == []
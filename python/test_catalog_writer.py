@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試目錄的增量更新檔案：前後版本比較、輸出與保留數量
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from catalog_writer import (diff_books, list_catalog_deltas, prune_catalog_deltas,
+                            write_catalog_delta)
+
+OLD_BOOKS = [
+    {"id": "論語", "title": "論語", "author": "孔子弟子", "coverUrl": "covers/論語.jpg",
+     "metadata": {"raw": 1}},
+    {"id": "孟子", "title": "孟子", "author": "孟軻"},
+]
+NEW_BOOKS = [
+    {"id": "論語", "title": "論語集注", "author": "孔子弟子", "metadata": {"raw": 2}},
+    {"id": "大學", "title": "大學", "author": "曾子", "metadata": {"raw": 3}},
+]
+
+
+def test_diff_books():
+    """只記錄有變動的欄位，移除的欄位為 None，調試用 metadata 不列入比較"""
+    changes = diff_books(OLD_BOOKS, NEW_BOOKS)
+    assert changes["added"] == [{"id": "大學", "title": "大學", "author": "曾子"}]
+    assert changes["removed"] == ["孟子"]
+    assert changes["updated"] == [{"id": "論語",
+                                   "changes": {"title": "論語集注", "coverUrl": None}}]
+
+
+def test_diff_ignores_metadata_only_changes():
+    old = [{"id": "論語", "title": "論語", "metadata": {"raw": 1}}]
+    new = [{"id": "論語", "title": "論語", "metadata": {"raw": 2}}]
+    assert diff_books(old, new) == {"added": [], "updated": [], "removed": []}
+
+
+def test_write_and_prune_deltas(tmp_path):
+    changes = diff_books(OLD_BOOKS, NEW_BOOKS)
+    for version in range(1, 5):
+        write_catalog_delta(tmp_path, version, version + 1, changes)
+
+    with open(tmp_path / "books.delta.1-2.json", 'r', encoding='utf-8') as f:
+        delta = json.load(f)
+    assert (delta["from_version"], delta["to_version"]) == (1, 2)
+    assert delta["changes"] == changes
+    assert delta["summary"] == {"added_count": 1, "updated_count": 1, "removed_count": 1}
+
+    # 不符合檔名格式的檔案不列入
+    (tmp_path / "books.delta.latest.json").write_text("{}", encoding='utf-8')
+    assert [d["to_version"] for d in list_catalog_deltas(tmp_path)] == [2, 3, 4, 5]
+
+    kept = prune_catalog_deltas(tmp_path, 2)
+    assert [d["url"] for d in kept] == ["books.delta.3-4.json", "books.delta.4-5.json"]
+    assert sorted(path.name for path in tmp_path.glob("books.delta.*-*.json")) == [
+        "books.delta.3-4.json", "books.delta.4-5.json"]
+
+    assert prune_catalog_deltas(tmp_path, 0) == []
+    assert not list_catalog_deltas(tmp_path)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試只讀檔頭的圖片尺寸判斷與封面備援評分
+"""
+
+import io
+import struct
+import sys
+import zipfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from cover_probe import PROBE_BYTES, probe_image, rank_cover_candidates, select_cover
+from epub_archive import EPUBArchive
+
+
+class CountingReader(io.BytesIO):
+    """記錄實際讀取的位元組數"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def png_header(width: int, height: int) -> bytes:
+    """只有簽章與 IHDR 的 PNG，後面接上無法解碼的資料"""
+    ihdr = struct.pack('>II5B', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+            + b'\0' * 4 + b'\xaa' * 4096)
+
+
+def jpeg_header(width: int, height: int, exif_bytes: int = 0) -> bytes:
+    """SOI、（可選的）大型 APP1 區段與 SOF0，後面接上無法解碼的資料"""
+    data = b'\xff\xd8'
+    if exif_bytes:
+        data += b'\xff\xe1' + struct.pack('>H', exif_bytes + 2) + b'\0' * exif_bytes
+    data += b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, height, width, 3) + b'\0' * 9
+    return data + b'\xaa' * 4096
+
+
+def test_probe_png_reads_header_only():
+    reader = CountingReader(png_header(600, 900))
+    assert probe_image(reader) == ('.png', 600, 900)
+    assert reader.bytes_read <= PROBE_BYTES
+
+
+def test_probe_jpeg_skips_segments_before_sof():
+    assert probe_image(io.BytesIO(jpeg_header(640, 960))) == ('.jpg', 640, 960)
+
+    # SOF 在大型 EXIF 區段之後：繼續讀取到 SOF 為止，不讀完整個檔案
+    data = jpeg_header(1200, 1600, exif_bytes=20000)
+    reader = CountingReader(data)
+    assert probe_image(reader) == ('.jpg', 1200, 1600)
+    assert reader.bytes_read < len(data)
+
+
+def test_probe_unrecognized_or_truncated():
+    assert probe_image(io.BytesIO(b'not an image' * 100)) is None
+    # 壓縮資料（SOS）之前沒有 SOF
+    assert probe_image(io.BytesIO(b'\xff\xd8\xff\xda\x00\x02' + b'\0' * 100)) is None
+    # SOF 超出讀取上限
+    assert probe_image(io.BytesIO(jpeg_header(100, 100, exif_bytes=20000)), max_bytes=4096) is None
+
+
+def make_epub(path: Path, images, first_page_images) -> Path:
+    """沒有標示封面的 EPUB；first_page_images 為第一個 spine 文件引用的圖片"""
+    manifest = ''.join(f'<item id="img{index}" href="Images/{name}" media-type="image/png"/>'
+                       for index, (name, _) in enumerate(images))
+    opf = ('<?xml version="1.0" encoding="utf-8"?>'
+           '<package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+           '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>書</dc:title></metadata>'
+           f'<manifest><item id="p1" href="Text/p1.xhtml" media-type="application/xhtml+xml"/>'
+           f'{manifest}</manifest><spine><itemref idref="p1"/></spine></package>')
+    page = ('<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+            + ''.join(f'<img src="../Images/{name}"/>' for name in first_page_images)
+            + '</body></html>')
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('mimetype', 'application/epub+zip')
+        z.writestr('META-INF/container.xml',
+                   '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                   '<rootfiles><rootfile full-path="OEBPS/content.opf"/></rootfiles></container>')
+        z.writestr('OEBPS/content.opf', opf)
+        z.writestr('OEBPS/Text/p1.xhtml', page)
+        for name, data in images:
+            z.writestr(f'OEBPS/Images/{name}', data)
+    return path
+
+
+def test_rank_prefers_first_page_portrait(tmp_path):
+    epub_file = make_epub(tmp_path / "書.epub", [
+        ("icon.png", png_header(48, 48)),
+        ("wide.png", png_header(1200, 600)),
+        ("plate.png", png_header(600, 900)),
+        ("p001.png", png_header(600, 900)),
+    ], first_page_images=["p001.png"])
+
+    with EPUBArchive(epub_file) as archive:
+        candidates = rank_cover_candidates(archive)
+        cover = select_cover(archive)
+
+    # 圖示太小不列入候選；第一頁的直式圖片優先於同尺寸的其他圖片與橫式圖片
+    assert [c["member"] for c in candidates] == [
+        "OEBPS/Images/p001.png", "OEBPS/Images/plate.png", "OEBPS/Images/wide.png"]
+    assert candidates[0]["rule"] == "first_page"
+    assert candidates[1]["rule"] == "probe"
+    assert cover["href"] is None
+    assert (cover["method"], cover["info"].filename) == ("first_page", "OEBPS/Images/p001.png")
+
+
+def test_rank_uses_filename_hint(tmp_path):
+    """檔名含「封面」（OPF 的名稱規則只比對 cover）時由備援評分的檔名規則選出"""
+    epub_file = make_epub(tmp_path / "書.epub", [
+        ("plate.png", png_header(600, 900)),
+        ("封面.png", png_header(600, 900)),
+    ], first_page_images=[])
+
+    with EPUBArchive(epub_file) as archive:
+        cover = select_cover(archive)
+    assert (cover["method"], cover["info"].filename) == ("filename", "OEBPS/Images/封面.png")
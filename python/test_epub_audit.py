@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試語料檢查對無法讀取的檔案與圖片的分類
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import epub_audit
+from benchmark import generate_corpus
+from epub_audit import audit_epub
+from resource_limits import ResourceLimits
+
+
+def test_missing_file_is_reported(tmp_path):
+    """檢查期間被移除的檔案回報為無法讀取，不拋出例外"""
+    report = audit_epub(tmp_path / "不存在.epub", ResourceLimits())
+    assert report["issues"] == ["unreadable"]
+    assert report["bytes"] is None
+
+
+def test_image_inventory_failure_keeps_cover(tmp_path, monkeypatch):
+    """列出圖片失敗時另外回報，仍繼續查找封面"""
+    generate_corpus(tmp_path / "epub3", books=1, chapters=2, cover_bytes=2048)
+    epub_file = next((tmp_path / "epub3").glob("*.epub"))
+
+    def broken_inventory(archive, manifest_members):
+        raise ValueError("壞掉的圖片")
+
+    monkeypatch.setattr(epub_audit, "_image_inventory", broken_inventory)
+    report = audit_epub(epub_file, ResourceLimits())
+    assert "invalid_images" in report["issues"]
+    assert "missing_cover" not in report["issues"]
+    assert report["cover"]["member"]
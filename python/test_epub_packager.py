@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試漸進式封裝的快取與已移除書籍的清理
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark import generate_corpus
+from epub_packager import MANIFEST_NAME, ProgressivePackager
+
+
+def test_package_prune_removed_books(tmp_path):
+    generate_corpus(tmp_path / "epub3", books=2, chapters=2, cover_bytes=2048)
+    epub_files = sorted((tmp_path / "epub3").glob("*.epub"))
+    packager = ProgressivePackager(tmp_path / "packages", tmp_path / "state")
+
+    summaries = [packager.package(epub_file.stem, epub_file) for epub_file in epub_files]
+    assert [summary["source_bytes"] for summary in summaries] == [
+        epub_file.stat().st_size for epub_file in epub_files]
+    assert packager.package(epub_files[0].stem, epub_files[0])["cached"]
+
+    # 中斷時只留下封裝檔的目錄也會被清理；不是封裝器產生的目錄不動
+    (tmp_path / "packages" / "中斷").mkdir()
+    (tmp_path / "packages" / "中斷" / "head.0.zip").write_bytes(b"")
+    (tmp_path / "packages" / "其他").mkdir()
+
+    assert packager.prune([epub_files[0].stem]) == 2
+    assert (packager.book_dir(epub_files[0].stem) / MANIFEST_NAME).exists()
+    assert not packager.book_dir(epub_files[1].stem).exists()
+    assert not (tmp_path / "packages" / "中斷").exists()
+    assert (tmp_path / "packages" / "其他").exists()
+    assert [path.stem for path in (tmp_path / "state").glob("*.json")] == [epub_files[0].stem]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試直書轉換的樣式表與非 UTF-8 文件的回報
+"""
+
+import sys
+import zipfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark import generate_corpus
+from epub_vertical import STYLESHEET_NAME, VerticalTextConverter, format_vertical_report
+
+GBK_MEMBER = 'OEBPS/Text/ch0001.xhtml'
+
+
+def make_book(tmp_path) -> Path:
+    """合成一本書，並把其中一章改為 GBK 編碼"""
+    generate_corpus(tmp_path / "corpus", books=1, chapters=2, cover_bytes=2048)
+    source = next((tmp_path / "corpus").glob("*.epub"))
+    epub_file = tmp_path / "書.epub"
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(epub_file, 'w') as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            if info.filename == GBK_MEMBER:
+                data = data.decode('utf-8').encode('gbk')
+            zout.writestr(info, data)
+    return epub_file
+
+
+def test_convert_reports_non_utf8_documents(tmp_path):
+    epub_file = make_book(tmp_path)
+    converter = VerticalTextConverter(tmp_path / "vertical", tmp_path / "state")
+    report = converter.convert(epub_file)
+
+    assert report["not_utf8"] == [GBK_MEMBER]
+    assert report["documents"] == 2
+    assert GBK_MEMBER in format_vertical_report([report])
+
+    with zipfile.ZipFile(tmp_path / "vertical" / epub_file.name) as z:
+        css = z.read(f"OEBPS/{STYLESHEET_NAME}").decode('utf-8')
+        assert z.read(GBK_MEMBER) == zipfile.ZipFile(epub_file).read(GBK_MEMBER)
+    assert "writing-mode: vertical-rl" in css
+    # 英文與數字維持預設的 mixed，不逐字直立
+    assert "upright" not in css
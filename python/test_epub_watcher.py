@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試監看模式在輸出目錄失敗時保留變動並重試
+"""
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import epub_watcher
+from epub_processor import EPUBProcessor
+from epub_watcher import EPUBWatcher
+
+
+class ScriptedWatch:
+    """依序回傳預先安排的事件，用完後模擬 Ctrl-C"""
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.closed = False
+
+    def read(self, timeout):
+        if not self.events:
+            raise KeyboardInterrupt
+        return self.events.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+def test_apply_failure_keeps_pending(tmp_path, monkeypatch):
+    """第一次輸出目錄失敗時不中止監看，同一批變動在下一次防抖結束時重試"""
+    processor = EPUBProcessor(tmp_path / "epub3", tmp_path / "covers", tmp_path / "catalog",
+                              use_cache=False, quiet=True)
+    watch = ScriptedWatch([{"新書.epub"}, set(), set()])
+    monkeypatch.setattr(epub_watcher, "open_watch", lambda *args: watch)
+
+    watcher = EPUBWatcher(processor, debounce=0)
+    monkeypatch.setattr(watcher, "initial_build", lambda: None)
+    applied = []
+
+    def apply_changes(names):
+        applied.append(set(names))
+        if len(applied) == 1:
+            raise OSError(28, "No space left on device")
+        return {"added": sorted(names), "updated": [], "removed": [], "failed": []}
+
+    monkeypatch.setattr(watcher, "apply_changes", apply_changes)
+    watcher.run()
+
+    assert applied == [{"新書.epub"}, {"新書.epub"}]
+    assert watch.closed
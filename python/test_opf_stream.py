@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試串流 OPF 解析（parse_opf_head）的結果與提前停止
+"""
+
+import io
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import pytest
+
+import epub_archive
+from epub_archive import OPF_CHUNK_SIZE, parse_opf_head, parse_opf_package
+
+METADATA = """<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:title>論語</dc:title>
+    <dc:creator>孔子弟子</dc:creator>
+    <dc:language>zh-TW</dc:language>
+    <meta name="cover" content="cover-img"/>
+  </metadata>"""
+MANIFEST = """<manifest>
+    <item id="cover-img" href="Images/cover.jpg" media-type="image/jpeg"/>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="ch1" href="Text/ch1.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>"""
+SPINE = """<spine toc="ncx"><itemref idref="nav"/><itemref idref="ch1"/></spine>"""
+
+
+def opf(*sections: str) -> bytes:
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0">\n  '
+            + '\n  '.join(sections) + '\n</package>').encode('utf-8')
+
+
+class CountingReader(io.BytesIO):
+    """記錄實際讀取的位元組數"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+@pytest.fixture(params=["lxml", "stdlib"])
+def parser_backend(request, monkeypatch):
+    """分別以 lxml（有安裝時）與標準函式庫測試"""
+    if request.param == "lxml":
+        if epub_archive.lxml_etree is None:
+            pytest.skip("未安裝 lxml")
+    else:
+        monkeypatch.setattr(epub_archive, "lxml_etree", None)
+    return request.param
+
+
+def test_head_matches_full_parse(parser_backend):
+    content = opf(METADATA, MANIFEST, SPINE)
+    head = parse_opf_head(content)
+    full = parse_opf_package(content)
+
+    assert head.partial and not full.partial
+    assert head.metadata == full.metadata
+    assert head.metadata["cover_id"] == "cover-img"
+    assert head.manifest == full.manifest
+    assert head.spine == [] and full.spine == ["nav", "ch1"]
+    assert head.find_cover(head.metadata["cover_id"]) == ("Images/cover.jpg", "meta")
+
+
+def test_head_stops_after_manifest(parser_backend):
+    """manifest 結束後不再讀取：後面的大型 spine 不被讀入，格式錯誤也不影響結果"""
+    itemrefs = ''.join(f'<itemref idref="ch{index}"/>' for index in range(20000))
+    content = opf(METADATA, MANIFEST, f'<spine>{itemrefs}<broken></spine>')
+    reader = CountingReader(content)
+
+    head = parse_opf_head(reader)
+    assert [item["id"] for item in head.manifest] == ["cover-img", "nav", "ch1"]
+    assert reader.bytes_read <= OPF_CHUNK_SIZE < len(content)
+
+
+def test_unusual_order_reads_to_end(parser_backend):
+    """spine 在 manifest 之前時讀到檔尾，結果與完整解析相同"""
+    content = opf(SPINE, METADATA, MANIFEST)
+    head = parse_opf_head(io.BytesIO(content))
+    full = parse_opf_package(content)
+
+    assert (head.metadata, head.manifest, head.toc_id) == (full.metadata, full.manifest, "ncx")
+    assert head.spine == full.spine == ["nav", "ch1"]
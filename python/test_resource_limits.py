@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試資源限制：中央目錄檢查、串流讀取的用量、處理時間與建置快取的設定
+"""
+
+import io
+import sys
+import zipfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+import pytest
+
+import resource_limits
+from build_cache import BuildCache
+from epub_archive import EPUBArchive
+from resource_limits import (RATIO_MIN_BYTES, LimitExceeded, ResourceBudget, ResourceLimits,
+                             count_members)
+
+
+def write_zip(path: Path, members) -> Path:
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        for name, data in members:
+            z.writestr(name, data)
+    return path
+
+
+def member_info(name: str = 'OEBPS/a.xhtml') -> zipfile.ZipInfo:
+    return zipfile.ZipInfo(name)
+
+
+def test_check_member_rejects_over_ratio(tmp_path):
+    """高度重複的大型成員（zip bomb）在解壓縮前就被拒絕；小型成員不檢查壓縮比"""
+    epub_file = write_zip(tmp_path / "bomb.epub", [
+        ('mimetype', b'application/epub+zip'),
+        ('OEBPS/small.xhtml', b'\0' * 1024),
+        ('OEBPS/bomb.xhtml', b'\0' * (RATIO_MIN_BYTES * 2)),
+    ])
+    limits = ResourceLimits(max_ratio=100)
+    with zipfile.ZipFile(epub_file) as z:
+        limits.check_member(z.getinfo('OEBPS/small.xhtml'))
+        with pytest.raises(LimitExceeded, match="壓縮比"):
+            limits.check_member(z.getinfo('OEBPS/bomb.xhtml'))
+        ResourceLimits(max_ratio=None).check_archive(z.infolist())
+
+    with pytest.raises(LimitExceeded):
+        EPUBArchive(epub_file, limits)
+
+
+def test_member_count_checked_before_opening(tmp_path):
+    epub_file = write_zip(tmp_path / "many.epub", [(f'm{index}', b'x') for index in range(5)])
+    assert count_members(epub_file) == 5
+    ResourceLimits(max_members=5).check_file(epub_file)
+    with pytest.raises(LimitExceeded, match="成員數量"):
+        ResourceLimits(max_members=4).check_file(epub_file)
+
+
+def test_budget_limits_streamed_bytes():
+    """串流讀取時累計實際讀出的位元組：單一成員與整本書的上限"""
+    budget = ResourceBudget(ResourceLimits(max_member_bytes=1000, max_archive_bytes=1500,
+                                           timeout=None))
+    with budget.open(io.BytesIO(b'a' * 800), member_info()) as f:
+        assert len(f.read()) == 800
+
+    with pytest.raises(LimitExceeded, match="讀出的資料"):
+        with budget.open(io.BytesIO(b'b' * 800), member_info('OEBPS/b.xhtml')) as f:
+            f.read()
+
+    budget = ResourceBudget(ResourceLimits(max_member_bytes=1000, timeout=None))
+    reader = budget.open(io.BytesIO(b'c' * 1200), member_info())
+    assert len(reader.read(1000)) == 1000
+    with pytest.raises(LimitExceeded, match="解壓縮後超過"):
+        reader.read(1000)
+
+
+def test_budget_timeout_excludes_paused_time(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resource_limits.time, "monotonic", lambda: clock[0])
+    budget = ResourceBudget(ResourceLimits(timeout=10))
+
+    clock[0] += 5
+    budget.pause()
+    clock[0] += 60
+    budget.resume()
+    budget.check_time()
+
+    clock[0] += 6
+    with pytest.raises(LimitExceeded, match="處理時間"):
+        budget.check_time()
+
+
+def test_cache_discarded_when_limits_change(tmp_path):
+    """建置快取記錄資源限制，設定相同時命中，改變時整個捨棄"""
+    epub_file = write_zip(tmp_path / "book.epub", [('mimetype', b'application/epub+zip')])
+    cache_dir = tmp_path / "cache"
+    settings = {"limits": ResourceLimits().settings()}
+
+    cache = BuildCache(cache_dir, tmp_path, settings=settings)
+    cache.store(epub_file, {"id": "book", "coverUrl": ""})
+    cache.save()
+
+    assert BuildCache(cache_dir, tmp_path, settings=settings).lookup(epub_file) == {
+        "id": "book", "coverUrl": ""}
+    changed = {"limits": ResourceLimits(max_member_bytes=1024).settings()}
+    assert BuildCache(cache_dir, tmp_path, settings=changed).lookup(epub_file) is None
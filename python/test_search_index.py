@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試全文檢索的斷詞與片語查詢
+"""
+
+import sys
+import zipfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from search_index import SearchIndex, SearchIndexBuilder, tokenize
+
+BOOKS = {
+    "甲": ["<p>深信因果報應，念佛求生淨土。</p>", "<p>因果。報應不爽</p>"],
+    "乙": ["<p>報應與因果並列，Hello ＥＰＵＢ world</p>"],
+}
+
+
+def make_epub(path: Path, chapters) -> Path:
+    manifest = ''.join(f'<item id="c{index}" href="Text/c{index}.xhtml" '
+                       f'media-type="application/xhtml+xml"/>' for index in range(len(chapters)))
+    spine = ''.join(f'<itemref idref="c{index}"/>' for index in range(len(chapters)))
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('mimetype', 'application/epub+zip')
+        z.writestr('META-INF/container.xml',
+                   '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                   '<rootfiles><rootfile full-path="OEBPS/content.opf"/></rootfiles></container>')
+        z.writestr('OEBPS/content.opf',
+                   '<package xmlns="http://www.idpf.org/2007/opf" version="3.0"><metadata/>'
+                   f'<manifest>{manifest}</manifest><spine>{spine}</spine></package>')
+        for index, body in enumerate(chapters):
+            z.writestr(f'OEBPS/Text/c{index}.xhtml',
+                       f'<html xmlns="http://www.w3.org/1999/xhtml"><body>{body}</body></html>')
+    return path
+
+
+def build_index(tmp_path) -> SearchIndex:
+    builder = SearchIndexBuilder(tmp_path / "search")
+    for book_id, chapters in BOOKS.items():
+        epub_file = make_epub(tmp_path / f"{book_id}.epub", chapters)
+        builder.record(book_id, builder.build_book(book_id, epub_file))
+    builder.merge(BOOKS)
+    return SearchIndex(tmp_path / "search")
+
+
+def hits(index: SearchIndex, query: str):
+    return [(r["book_id"], r["chapter"], r["position"]) for r in index.search(query)]
+
+
+def test_tokenize_bigrams_stop_at_punctuation():
+    assert list(tokenize("因果。報應")) == [("因果", 0), ("報應", 3)]
+    assert list(tokenize("佛 epub2")) == [("佛", 0), ("epub2", 2)]
+
+
+def test_phrase_query_requires_adjacent_terms(tmp_path):
+    """只有各二元組在相鄰位置出現時才算符合；被標點隔開或順序不同的不算
+
+    位置為章節正文中的字元位置（區塊標籤產生的換行也計入）
+    """
+    index = build_index(tmp_path)
+    assert hits(index, "因果報應") == [("甲", 0, 3)]
+    assert hits(index, "果報") == [("甲", 0, 4)]
+    assert hits(index, "報應") == [("甲", 0, 5), ("甲", 1, 4), ("乙", 0, 1)]
+    assert hits(index, "應與因果") == [("乙", 0, 2)]
+    assert hits(index, "因果不爽") == []
+
+
+def test_single_character_and_normalized_query(tmp_path):
+    index = build_index(tmp_path)
+    # 單一中文字：由以該字開頭或結尾的二元組還原位置
+    assert hits(index, "佛") == [("甲", 0, 9)]
+    assert hits(index, "爽") == [("甲", 1, 7)]
+    # 全形英文與大小寫正規化後比對
+    assert hits(index, "epub") == [("乙", 0, 15)]
+    assert hits(index, "ＨＥＬＬＯ Epub") == [("乙", 0, 9)]
+    assert index.search("。") == []
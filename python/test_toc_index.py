@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+測試章節索引與建置快取、目錄清理的互動
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark import generate_corpus
+from epub_processor import EPUBProcessor
+
+
+def run_build(tmp_path, **options):
+    processor = EPUBProcessor(tmp_path / "epub3", tmp_path / "covers", tmp_path / "catalog",
+                              quiet=True, **options)
+    processor.publish(processor.process_all_epubs())
+    with open(tmp_path / "catalog" / "books.json", 'r', encoding='utf-8') as f:
+        return json.load(f)['books']
+
+
+def test_toc_index_toggle_and_prune(tmp_path):
+    """停用章節索引後快取的書籍不再帶 tocUrl；移除書籍後其章節索引被刪除"""
+    generate_corpus(tmp_path / "epub3", books=3, chapters=2, cover_bytes=2048)
+    toc_dir = tmp_path / "catalog" / "toc"
+
+    books = run_build(tmp_path, build_toc_index=True)
+    assert all(book['tocUrl'] for book in books)
+    assert len(list(toc_dir.glob("*.json"))) == 3
+
+    sorted((tmp_path / "epub3").glob("*.epub"))[0].unlink()
+    books = run_build(tmp_path, build_toc_index=True)
+    assert sorted(toc_dir.glob("*.json")) == sorted(toc_dir / Path(book['tocUrl']).name
+                                                    for book in books)
+
+    books = run_build(tmp_path)
+    assert not any('tocUrl' in book for book in books)
+    assert not list(toc_dir.glob("*.json"))